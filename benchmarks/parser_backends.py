@@ -0,0 +1,111 @@
+"""
+Compare the html parser backends on a corpus of saved recipe pages
+For every backend that is installed, report the time to build the soup and extract the recipe per page,
+and check that the extracted recipe matches the html.parser baseline exactly
+
+Usage: python benchmarks/parser_backends.py [corpus dir] [--repeat N]
+The corpus dir holds saved pages (*.html) and/or HttpCache entries (defaults to benchmarks/corpus/pages)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import FeatureNotFound
+from recipe_page import RecipePage, make_soup, HTML_PARSERS
+from fitmencook_search import FitMenCook
+from http_cache import HttpCache
+from meal import Meal
+
+
+def load_corpus(corpus_dir):
+    """
+    Load the saved pages of a corpus directory
+    :param corpus_dir: directory of *.html files and/or HttpCache *.json entries (searched recursively)
+    :return: list of (url, html) tuples
+    """
+    pages = []
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(".html"):
+                with open(path, 'r', encoding="utf-8") as f:
+                    pages.append((path, f.read()))
+            elif name.endswith(".json"):
+                with open(path, 'r', encoding="utf-8") as f:
+                    entry = json.load(f)
+                if "body" in entry and "url" in entry:
+                    pages.append((entry["url"], entry["body"]))
+    return pages
+
+
+def extract(url, html, parser):
+    """
+    Run every FitMenCook extractor on one page
+    :return: the extracted recipe (dict), or the error raised
+    """
+    page = RecipePage(url, html)
+    page._soup = make_soup(html, parser)
+    meal = Meal(name=url)
+    search = FitMenCook(meal, http_cache=HttpCache(offline=True))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ingredients = search.extract_recipe(meal, page)
+        return {"ingredients": ingredients, "description": meal.description, "servings": meal.servings,
+                "serving_size": meal.serving_size, "serving_unit": meal.serving_unit}
+    except Exception as e:
+        return repr(e)
+
+
+def benchmark(pages, parser, repeat):
+    """
+    Time building the soup and extracting the recipe of every page
+    :return: seconds per page spent parsing, seconds per page spent extracting, the extracted recipes
+    """
+    parse_time = extract_time = 0.0
+    make_soup(pages[0][1], parser)  # warm up
+    for _ in range(repeat):
+        for url, html in pages:
+            start = time.perf_counter()
+            make_soup(html, parser)
+            parse_time += time.perf_counter() - start
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(url, html, parser) for url, html in pages]
+    extract_time = time.perf_counter() - start
+    runs = repeat * len(pages)
+    return parse_time / runs, extract_time / runs, results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compare html parser backends on saved recipe pages")
+    arg_parser.add_argument("corpus", nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                      "corpus", "pages"),
+                            help="directory of saved pages (e.g. the HTTP cache directory)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="times each page is parsed")
+    args = arg_parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        sys.exit(f"No saved pages in {args.corpus}")
+    print(f"{len(pages)} pages from {args.corpus}")
+    baseline = None
+    for parser in reversed(HTML_PARSERS):  # html.parser first, as the baseline
+        try:
+            make_soup("", parser)
+        except FeatureNotFound:
+            print(f"{parser:12} not installed")
+            continue
+        parse_time, extract_time, results = benchmark(pages, parser, args.repeat)
+        if baseline is None:
+            baseline = (parse_time, extract_time, results)
+        mismatches = sum(a != b for a, b in zip(results, baseline[2]))
+        print(f"{parser:12} parse {parse_time * 1000:8.2f} ms/page ({baseline[0] / parse_time:5.2f}x)   "
+              f"parse+extract {extract_time * 1000:8.2f} ms/page ({baseline[1] / extract_time:5.2f}x)   "
+              f"{mismatches} pages differ from html.parser")
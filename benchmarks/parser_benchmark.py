@@ -0,0 +1,172 @@
+"""
+Benchmark the recipe and ingredient parsers against the checked-in corpus
+For each parser report throughput (lines/sec or pages/sec), peak memory (tracemalloc) and accuracy against the
+expected parses in benchmarks/corpus, so parser performance work has a baseline to measure against
+
+Usage: python benchmarks/parser_benchmark.py [--repeat N] [--cache-dir DIR] [--parse-cache]
+--cache-dir adds the pages of an HTTP cache (or any directory of saved pages) to the page throughput runs;
+those pages have no expected parses, so they don't count towards accuracy
+--parse-cache times the line parsers with their LRU parse caches on (off by default, to measure the parsing itself)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_parser import RecipeParser
+from ingredient_parser import IngredientParser
+from fitmencook_search import FitMenCook
+from recipe_page import RecipePage
+from http_cache import HttpCache
+from parser_backends import load_corpus
+from parse_cache import ParseCache
+from unit_registry import unit_registry
+from meal import Meal
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+PAGE_FIELDS = ["title", "ingredients", "description", "servings", "serving_size", "serving_unit"]
+LINE_FIELDS = ["amount", "amount_max", "unit", "name"]
+
+
+def load_expected(name):
+    """
+    Load one of the expected-parse files of the corpus
+    :param name: the file name in benchmarks/corpus
+    """
+    with open(os.path.join(CORPUS_DIR, name), 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+
+def same(expected, actual):
+    """
+    Compare an expected field with a parsed one (amounts to 3 decimals, names ignoring case)
+    """
+    if isinstance(expected, float) or isinstance(actual, float):
+        return expected is not None and actual is not None and abs(expected - actual) < 1e-3
+    if isinstance(expected, str) and isinstance(actual, str):
+        return expected.strip().lower() == actual.strip().lower()
+    return expected == actual
+
+
+class LineParsers:
+    """
+    Wraps each ingredient line parser so they all return {amount, amount_max, unit, name}
+    """
+
+    def __init__(self, parse_cache=False):
+        # a cache of size 0 keeps nothing, so every line is really parsed
+        self.recipe_parser = RecipeParser(HttpCache(offline=True), ParseCache(50000 if parse_cache else 0))
+        self.ingredient_parser = IngredientParser(ParseCache(50000 if parse_cache else 0))
+
+    def recipe_parser_line(self, line):
+        return self.recipe_parser_row(self.recipe_parser.parse_ingredient_line(line))
+
+    def recipe_parser_row(self, parsed):
+        if not parsed:
+            return None
+        amount, amount_max = parsed.get("amount"), parsed.get("amount_max")
+        if isinstance(amount, dict):  # ranges
+            amount, amount_max = amount.get("min"), amount.get("max")
+        return {"amount": amount, "amount_max": amount_max, "unit": parsed.get("unit"), "name": parsed.get("name")}
+
+    def ingredient_parser_line(self, line):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                parsed = self.ingredient_parser.parse(line)
+        except Exception:
+            return None
+        unit = parsed["unit"]
+        return {"amount": self.recipe_parser.parse_fractional_number(parsed["amount"]), "amount_max": None,
+                "unit": unit_registry().canonical(unit) or unit if unit else None,
+                "name": parsed["name"]}
+
+
+def extract_page(url, html):
+    """
+    Run every FitMenCook extractor on a fresh (unparsed) page
+    :return: dictionary of the PAGE_FIELDS, None for fields whose extractor failed
+    """
+    page = RecipePage(url, html)
+    meal = Meal(name=url)
+    search = FitMenCook(meal, http_cache=HttpCache(offline=True))
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            title = search.get_recipe_title(page)
+        except Exception:
+            title = None
+        try:
+            ingredients = [ingredient["original"] for ingredient in search.extract_recipe(meal, page)]
+        except Exception:
+            ingredients = None
+    return {"title": title, "ingredients": ingredients, "description": meal.description,
+            "servings": meal.servings, "serving_size": meal.serving_size, "serving_unit": meal.serving_unit}
+
+
+def measure(fn, items, repeat):
+    """
+    Time fn over the items, then run them once more under tracemalloc for the peak memory
+    :return: items per second, peak memory in KiB, the results of the last timed run
+    """
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [fn(*item) for item in items]
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    for item in items:
+        fn(*item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return repeat * len(items) / elapsed, peak / 1024, results
+
+
+def accuracy(expected, results, fields):
+    """
+    Fraction of the expected fields the parser got right (a failed parse gets every field wrong)
+    """
+    right = sum(result is not None and same(exp[field], result[field])
+                for exp, result in zip(expected, results) for field in fields)
+    return right / (len(expected) * len(fields))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark the parsers against the saved corpus")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="times the corpus is parsed for timing")
+    arg_parser.add_argument("--cache-dir", default=None, help="extra saved pages (e.g. the HTTP cache directory)")
+    arg_parser.add_argument("--parse-cache", action="store_true", help="let the line parsers use their parse caches")
+    args = arg_parser.parse_args()
+
+    expected_lines = load_expected("ingredient_lines.json")
+    expected_pages = load_expected("recipe_pages.json")
+    lines = [entry["line"] for entry in expected_lines]
+    pages = []
+    for entry in expected_pages:
+        with open(os.path.join(CORPUS_DIR, "pages", entry["file"]), 'r', encoding="utf-8") as f:
+            pages.append((entry["file"], f.read()))
+    extra_pages = load_corpus(args.cache_dir) if args.cache_dir else []
+
+    parsers = LineParsers(args.parse_cache)
+    print(f"{'parser':36} {'items':>6} {'items/sec':>11} {'peak KiB':>9} {'accuracy':>9}")
+    for name, fn in [("RecipeParser.parse_ingredient_line", parsers.recipe_parser_line),
+                     ("IngredientParser.parse", parsers.ingredient_parser_line)]:
+        rate, peak, results = measure(fn, [(line,) for line in lines], args.repeat)
+        print(f"{name:36} {len(lines):6} {rate:8.0f} l/s {peak:9.1f} "
+              f"{accuracy(expected_lines, results, LINE_FIELDS):8.1%}")
+    # the whole corpus as one batch
+    rate, peak, batches = measure(lambda batch: parsers.recipe_parser.parse_many(batch), [(list(lines),)], args.repeat)
+    results = [parsers.recipe_parser_row(row) for row in batches[0].rows()]
+    print(f"{'RecipeParser.parse_many':36} {len(lines):6} {rate * len(lines):8.0f} l/s {peak:9.1f} "
+          f"{accuracy(expected_lines, results, LINE_FIELDS):8.1%}")
+    rate, peak, results = measure(extract_page, pages, args.repeat)
+    print(f"{'FitMenCook pages (corpus)':36} {len(pages):6} {rate:8.1f} p/s {peak:9.1f} "
+          f"{accuracy(expected_pages, results, PAGE_FIELDS):8.1%}")
+    if extra_pages:
+        rate, peak, _ = measure(extract_page, extra_pages, args.repeat)
+        print(f"{'FitMenCook pages (' + args.cache_dir + ')':36} {len(extra_pages):6} {rate:8.1f} p/s {peak:9.1f} "
+              f"{'-':>9}")
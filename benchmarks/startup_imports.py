@@ -0,0 +1,89 @@
+"""
+Benchmark the startup imports of the command line app with python -X importtime
+Each module is imported in a fresh interpreter, several times, and the median cumulative import time is reported
+with the slowest imports under it and the heavy dependencies it pulled in. The cached meal lookup path (main, model,
+view) should not load the scraping, USDA, numpy or GUI dependencies, which are timed separately for comparison
+
+Usage: python benchmarks/startup_imports.py [module ...] [--repeat N] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# dependencies only needed to find a new meal, look up its ingredients, compute macros or edit the ingredients
+HEAVY_MODULES = ["selenium", "webdriver_manager", "bs4", "lxml", "requests", "aiohttp", "asyncio", "numpy", "scipy",
+                 "PyQt6"]
+# the modules that load them, imported when a meal isn't in the database yet
+DEFERRED_MODULES = ["fitmencook_search", "usda_service", "macro_calculator"]
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with -X importtime
+    :param module: the module name
+    :return: dictionary of module -> (self us, cumulative us) of the module and the imports under it (not the ones
+        of the interpreter startup), in import order
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Error importing {module}: {result.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split('|')
+        # a top level import is listed after the imports under it, unindented
+        if not name[1:].startswith(' '):
+            if name.strip() == module:
+                times[module] = (int(self_us), int(cumulative_us))
+                return times
+            times = {}
+            continue
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    raise Exception(f"No import time reported for {module}")
+
+
+def benchmark(module, repeat):
+    """
+    Import a module repeat times
+    :return: (median cumulative import time in ms, the import times of the median run)
+    """
+    import_times(module)  # warm up the bytecode cache
+    runs = sorted((import_times(module) for _ in range(repeat)), key=lambda times: times[module][1])
+    median = runs[len(runs) // 2]
+    return statistics.median(times[module][1] for times in runs) / 1000, median
+
+
+def report(module, repeat, top):
+    """
+    Print the import time of a module, its slowest imports and the heavy dependencies it loads
+    :return: the median cumulative import time in ms
+    """
+    total_ms, times = benchmark(module, repeat)
+    heavy = [name for name in HEAVY_MODULES if name in times]
+    print(f"{module:20} {total_ms:8.1f} ms   heavy dependencies: {', '.join(heavy) or 'none'}")
+    slowest = sorted((item for item in times.items() if item[0] != module), key=lambda item: -item[1][1])[:top]
+    for name, (_, cumulative_us) in slowest:
+        print(f"    {name:40} {cumulative_us / 1000:8.1f} ms")
+    return total_ms
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Time the startup imports of the app with -X importtime")
+    arg_parser.add_argument("modules", nargs='*', default=["main", "model", "view"], help="modules to import")
+    arg_parser.add_argument("--repeat", type=int, default=7, help="fresh interpreters per module")
+    arg_parser.add_argument("--top", type=int, default=5, help="slowest imports listed per module")
+    args = arg_parser.parse_args()
+
+    for module in args.modules:
+        report(module, args.repeat, args.top)
+    print("\nDeferred until a meal has to be found:")
+    for module in DEFERRED_MODULES:
+        try:
+            report(module, args.repeat, 0)
+        except Exception as e:
+            print(f"{module:20} {e}")
@@ -0,0 +1,261 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from database_utility import DatabaseUtility
+from meal_repository import MealRepository
+from ingredient_index import IngredientIndex
+from fitmencook_search import FitMenCook
+from recipe_page import RecipePage
+from http_cache import HttpCache
+from meal import Meal
+from unit_registry import CONVERTIBLE_DIMENSIONS, unit_registry
+import argparse
+import threading
+import os
+
+
+def parse_recipe(entry, url, html):
+    """
+    Parse a downloaded recipe page into a meal and its ingredients
+    Runs in a worker process, so it only takes and returns picklable values and never touches the network
+    :param entry: the line of the input file the recipe came from (meal name or url)
+    :param url: the url of the recipe
+    :param html: the raw html of the recipe page
+    :return: the filled in meal object, list of parsed ingredients
+    """
+    meal = Meal(name=entry)
+    search = FitMenCook(meal, http_cache=HttpCache(offline=True))
+    page = RecipePage(url, html)
+    try:
+        meal.name = search.get_recipe_title(page)
+    except AttributeError:
+        print(f"Couldn't find recipe title for {url}, keeping \"{entry}\"")
+    ingredients = search.extract_recipe(meal, page)
+    return meal, ingredients
+
+
+class BulkIngestor:
+    """
+    Loads a batch of recipes (meal names or recipe urls) into the database
+    Downloads run on a bounded thread pool, the CPU-bound html parsing on a process pool, and the inserts
+    happen on the calling thread, in batches of one transaction each
+    Each meal is inserted with the bridge rows of its ingredients that are already in the database. Ingredients that
+    aren't are reported and left out: the ingredients table needs their nutrient values, which only a USDA lookup
+    (see Model.build_meal) provides
+    """
+
+    def __init__(self, db_util: DatabaseUtility, fetch_workers=8, parse_workers=None, offline=False,
+                 batch_size=100):
+        """
+        Initialize the ingestor
+        :param db_util: a connected database utility
+        :param fetch_workers: number of threads downloading pages
+        :param parse_workers: number of processes parsing pages (defaults to the cpu count)
+        :param offline: only use pages that are already in the HTTP cache
+        :param batch_size: number of parsed meals inserted per transaction
+        """
+        self._db_util = db_util
+        self._repository = MealRepository(db_util)
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.offline = offline
+        self.batch_size = batch_size
+        self._pending = []
+        # bound on recipes held in memory at once, so huge input files are streamed
+        self.max_in_flight = 2 * (self.fetch_workers + self.parse_workers)
+        self._local = threading.local()
+        # the ingredients of the database by id, and the index resolving parsed names to them (loaded when needed)
+        self._ingredients = None
+        self._ingredient_index = None
+        self.inserted, self.skipped, self.failed, self.unresolved = 0, 0, 0, 0
+
+    def _http_cache(self):
+        """
+        Get this thread's HTTP cache (each download thread keeps its own session)
+        """
+        if not hasattr(self._local, "http_cache"):
+            self._local.http_cache = HttpCache(offline=self.offline)
+        return self._local.http_cache
+
+    def fetch_recipe(self, entry):
+        """
+        Find (for meal names) and download the recipe page for one input entry
+        :param entry: a meal name or a recipe url
+        :return: the recipe url, the raw html of the recipe page
+        """
+        search = FitMenCook(Meal(name=entry), http_cache=self._http_cache())
+        if entry.startswith(("http://", "https://")):
+            page = search.fetch_page(entry)
+        else:
+            search.search_for_meal()
+            page = search.get_recipe_page(search.meal)
+        return page.url, page.html
+
+    def ingredient_index(self):
+        """
+        Get the index of the ingredients in the database, loading it the first time
+        """
+        if self._ingredient_index is None:
+            self._ingredients = {ingredient.id: ingredient for ingredient in self._repository.all_ingredients()}
+            self._ingredient_index = IngredientIndex().load(
+                [(ingredient.id, ingredient.name) for ingredient in self._ingredients.values()])
+        return self._ingredient_index
+
+    @staticmethod
+    def quantity(amount):
+        """
+        Get the quantity stored for a parsed amount
+        :param amount: the parsed amount, a number or a {min, max} range (its midpoint is used)
+        :return: the quantity (float), None if the amount is unknown
+        """
+        if isinstance(amount, dict):
+            if amount.get("min") is None or amount.get("max") is None:
+                return None
+            return (float(amount["min"]) + float(amount["max"])) / 2
+        return None if amount is None else float(amount)
+
+    def meal_ingredients(self, meal: Meal, ingredients: list):
+        """
+        Resolve the parsed ingredients of a meal to ingredients in the database
+        Ingredients whose amount can't be given in the default unit of the matched ingredient (2 cloves of garlic
+        kept in grams, or no unit at all for it) are left out like the ones that aren't in the database, since the
+        macro totals can't count them
+        :param meal: the parsed meal
+        :param ingredients: list of parsed ingredients (list of dicts)
+        :return: list of (Ingredient, quantity, unit) tuples, for insert_meal_graphs
+        """
+        index = self.ingredient_index()
+        units_registry = unit_registry()
+        meal_ingredients, units, unresolved = [], {}, []
+        for ingredient in ingredients:
+            ingredient_id = index.resolve(ingredient["name"])
+            quantity = self.quantity(ingredient.get("amount"))
+            if ingredient_id is None or quantity is None:
+                unresolved.append(ingredient.get("original") or ingredient["name"])
+                continue
+            db_ingredient = self._ingredients[ingredient_id]
+            # an ingredient listed twice must add up in one unit (see MealRepository.bridge_rows)
+            _, unit = self._repository.normalize_quantity(db_ingredient, quantity, ingredient.get("unit"))
+            if unit is None:
+                convertible = units_registry.dimension(db_ingredient.default_unit) not in CONVERTIBLE_DIMENSIONS
+            else:
+                convertible = unit == db_ingredient.default_unit
+            if not convertible or units.setdefault(ingredient_id, unit) != unit:
+                unresolved.append(ingredient.get("original") or ingredient["name"])
+                continue
+            meal_ingredients.append((db_ingredient, quantity, ingredient.get("unit")))
+        if unresolved:
+            print(f"{len(unresolved)} ingredients of \"{meal.name}\" aren't in the database or have no usable "
+                  f"amount or unit, left out: {'; '.join(unresolved)}")
+            self.unresolved += len(unresolved)
+        return meal_ingredients
+
+    def insert(self, meal: Meal, ingredients=None):
+        """
+        Queue a parsed meal for insertion, flushing the queue once a full batch is waiting
+        :param meal: the filled in meal object
+        :param ingredients: list of the parsed ingredients of the meal (list of dicts)
+        """
+        self._pending.append((meal, self.meal_ingredients(meal, ingredients) if ingredients else []))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Insert the queued meals with their ingredients in one transaction, skipping meals that already exist
+        When the batch fails, its meals are inserted one at a time so only the ones that fail are lost
+        """
+        pending, self._pending = self._pending, []
+        name_keys = self._repository.name_keys([meal.name for meal, _ in pending])
+        taken, graphs = set(), []
+        for meal, meal_ingredients in pending:
+            name, exists = name_keys[meal.name]
+            if exists or name in taken:
+                print(f"Meal \"{meal.name}\" already exists, skipping")
+                self.skipped += 1
+            else:
+                taken.add(name)
+                graphs.append((meal, meal_ingredients))
+        try:
+            meals = self._repository.insert_meal_graphs(graphs)
+        except Exception as e:
+            print(f"Couldn't insert a batch of {len(graphs)} meals, inserting them one at a time: {e}")
+            meals = []
+            for graph in graphs:
+                try:
+                    meals += self._repository.insert_meal_graphs([graph])
+                except Exception as e:
+                    print(f"Couldn't insert meal \"{graph[0].name}\": {e}")
+                    self.failed += 1
+        self.inserted += len(meals)
+        for meal in meals:
+            print(f"Inserted meal {meal.id}: {meal.name}")
+
+    def run(self, entries):
+        """
+        Stream the entries through search -> fetch -> parse -> insert
+        :param entries: iterable of meal names and/or recipe urls
+        """
+        entries = iter(entries)
+        with ThreadPoolExecutor(self.fetch_workers) as fetch_pool, \
+                ProcessPoolExecutor(self.parse_workers) as parse_pool:
+            fetching, parsing = {}, {}
+
+            def top_up():
+                while len(fetching) + len(parsing) < self.max_in_flight:
+                    entry = next(entries, None)
+                    if entry is None:
+                        return
+                    fetching[fetch_pool.submit(self.fetch_recipe, entry)] = entry
+
+            top_up()
+            while fetching or parsing:
+                done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        entry = fetching.pop(future)
+                        try:
+                            url, html = future.result()
+                        except Exception as e:
+                            print(f"Couldn't fetch \"{entry}\": {e}")
+                            self.failed += 1
+                            continue
+                        parsing[parse_pool.submit(parse_recipe, entry, url, html)] = entry
+                    else:
+                        entry = parsing.pop(future)
+                        try:
+                            meal, ingredients = future.result()
+                            self.insert(meal, ingredients)
+                        except Exception as e:
+                            print(f"Couldn't ingest \"{entry}\": {e}")
+                            self.failed += 1
+                top_up()
+        self.flush()
+        print(f"Inserted {self.inserted}, skipped {self.skipped}, failed {self.failed}, "
+              f"{self.unresolved} ingredients left out")
+
+
+def read_entries(path):
+    """
+    Read meal names / recipe urls from a file, one per line (blank lines and # comments are ignored)
+    :param path: path to the input file
+    """
+    with open(path, 'r', encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load a file of meal names or recipe urls into the database")
+    arg_parser.add_argument("input", help="file with one meal name or recipe url per line")
+    arg_parser.add_argument("--fetch-workers", type=int, default=8, help="threads downloading pages")
+    arg_parser.add_argument("--parse-workers", type=int, default=None, help="processes parsing pages")
+    arg_parser.add_argument("--offline", action="store_true", help="only use pages already in the HTTP cache")
+    arg_parser.add_argument("--batch-size", type=int, default=100, help="meals inserted per transaction")
+    args = arg_parser.parse_args()
+
+    db_util = DatabaseUtility()
+    db_util.connect(db_util.get_credentials())
+    ingestor = BulkIngestor(db_util, args.fetch_workers, args.parse_workers, args.offline, args.batch_size)
+    ingestor.run(read_entries(args.input))
+    db_util.disconnect()
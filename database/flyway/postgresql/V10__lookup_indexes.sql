@@ -0,0 +1,17 @@
+-- meal_ingredient_bridge's primary key (meal_id, ingredient_id) can't serve lookups by ingredient, which the
+-- meal_macros trigger does on every ingredient update
+CREATE INDEX IF NOT EXISTS meal_ingredient_bridge_ingredient_id_idx ON meal_ingredient_bridge (ingredient_id);
+
+-- trigram indexes for fuzzy name search (name_normalized % 'chiken breast'), when pg_trgm can be installed
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS meals_name_normalized_trgm_idx ON meals USING GIN (name_normalized gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS ingredients_name_normalized_trgm_idx
+            ON ingredients USING GIN (name_normalized gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm is not available, skipping the trigram indexes';
+    END IF;
+END;
+$$;
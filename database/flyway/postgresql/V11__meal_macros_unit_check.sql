@@ -0,0 +1,95 @@
+-- Only bridge rows in the default unit of their ingredient (or without a unit) are added to the meal totals: the
+-- *_per_unit columns are per default unit, and a row in another unit couldn't be converted when it was written
+-- (see MealRepository.normalize_quantity). The rows left out are counted in skipped_rows, so a partial total can't
+-- pass for a full one
+ALTER TABLE meal_macros ADD COLUMN IF NOT EXISTS skipped_rows INT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION refresh_meal_macros() RETURNS INT AS $$
+DECLARE
+    n_refreshed INT;
+BEGIN
+    WITH dirty AS (
+        DELETE FROM meal_macros_dirty RETURNING meal_id
+    )
+    INSERT INTO meal_macros (meal_id, servings,
+                             total_calories,
+                             total_protein,
+                             total_carbs,
+                             total_fat,
+                             total_fiber,
+                             total_sugar,
+                             total_saturated_fat,
+                             total_trans_fat,
+                             total_cholesterol_mg,
+                             total_sodium_mg,
+                             total_potassium_mg,
+                             total_calcium_mg,
+                             total_iron_mg,
+                             total_vitamin_a_ug,
+                             total_vitamin_c_mg,
+                             total_vitamin_d_ug,
+                             skipped_rows,
+                             refreshed_at)
+    SELECT
+        m.id,
+        substring(m.servings FROM '\d+(?:\.\d+)?')::NUMERIC,
+        COALESCE(SUM(COALESCE(i.calories_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.protein_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.carbs_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.fat_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.fiber_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.sugar_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.saturated_fat_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.trans_fat_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.cholesterol_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.sodium_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.potassium_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.calcium_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.iron_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_a_ug_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_c_mg_per_unit, 0) * counted.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_d_ug_per_unit, 0) * counted.quantity), 0),
+        count(mi.meal_id) FILTER (WHERE mi.unit IS NOT NULL AND mi.unit IS DISTINCT FROM i.default_unit),
+        now()
+    FROM dirty d
+    JOIN meals m ON m.id = d.meal_id
+    LEFT JOIN meal_ingredient_bridge mi ON mi.meal_id = m.id
+    LEFT JOIN ingredients i ON i.id = mi.ingredient_id
+    -- the quantity of a row counted in the totals, NULL for a row in another unit
+    LEFT JOIN LATERAL (
+        SELECT mi.quantity WHERE mi.unit IS NULL OR mi.unit = i.default_unit
+    ) counted ON TRUE
+    GROUP BY m.id, m.servings
+    ON CONFLICT (meal_id) DO UPDATE SET
+        servings = EXCLUDED.servings,
+        total_calories = EXCLUDED.total_calories,
+        total_protein = EXCLUDED.total_protein,
+        total_carbs = EXCLUDED.total_carbs,
+        total_fat = EXCLUDED.total_fat,
+        total_fiber = EXCLUDED.total_fiber,
+        total_sugar = EXCLUDED.total_sugar,
+        total_saturated_fat = EXCLUDED.total_saturated_fat,
+        total_trans_fat = EXCLUDED.total_trans_fat,
+        total_cholesterol_mg = EXCLUDED.total_cholesterol_mg,
+        total_sodium_mg = EXCLUDED.total_sodium_mg,
+        total_potassium_mg = EXCLUDED.total_potassium_mg,
+        total_calcium_mg = EXCLUDED.total_calcium_mg,
+        total_iron_mg = EXCLUDED.total_iron_mg,
+        total_vitamin_a_ug = EXCLUDED.total_vitamin_a_ug,
+        total_vitamin_c_mg = EXCLUDED.total_vitamin_c_mg,
+        total_vitamin_d_ug = EXCLUDED.total_vitamin_d_ug,
+        skipped_rows = EXCLUDED.skipped_rows,
+        refreshed_at = EXCLUDED.refreshed_at;
+    GET DIAGNOSTICS n_refreshed = ROW_COUNT;
+    RETURN n_refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- recompute the meals whose totals counted rows in other units
+INSERT INTO meal_macros_dirty (meal_id)
+SELECT DISTINCT mi.meal_id
+FROM meal_ingredient_bridge mi
+JOIN ingredients i ON i.id = mi.ingredient_id
+WHERE mi.unit IS NOT NULL AND mi.unit IS DISTINCT FROM i.default_unit
+ON CONFLICT DO NOTHING;
+SELECT refresh_meal_macros();
@@ -0,0 +1,158 @@
+-- Per-meal macro totals, maintained incrementally: triggers queue the meals whose bridge, ingredient or
+-- servings rows changed in meal_macros_dirty, and refresh_meal_macros() recomputes only those meals
+CREATE TABLE meal_macros (
+    meal_id     INT PRIMARY KEY REFERENCES meals(id) ON DELETE CASCADE,
+    servings    NUMERIC,
+
+    -- totals (whole recipe)
+    total_calories       NUMERIC NOT NULL,
+    total_protein        NUMERIC NOT NULL,
+    total_carbs          NUMERIC NOT NULL,
+    total_fat            NUMERIC NOT NULL,
+    total_fiber          NUMERIC NOT NULL,
+    total_sugar          NUMERIC NOT NULL,
+    total_saturated_fat  NUMERIC NOT NULL,
+    total_trans_fat      NUMERIC NOT NULL,
+    total_cholesterol_mg NUMERIC NOT NULL,
+    total_sodium_mg      NUMERIC NOT NULL,
+    total_potassium_mg   NUMERIC NOT NULL,
+    total_calcium_mg     NUMERIC NOT NULL,
+    total_iron_mg        NUMERIC NOT NULL,
+    total_vitamin_a_ug   NUMERIC NOT NULL,
+    total_vitamin_c_mg   NUMERIC NOT NULL,
+    total_vitamin_d_ug   NUMERIC NOT NULL,
+
+    -- per-serving (NULL when servings is unknown or zero)
+    calories_per_serving       NUMERIC GENERATED ALWAYS AS (total_calories / NULLIF(servings, 0)) STORED,
+    protein_per_serving        NUMERIC GENERATED ALWAYS AS (total_protein / NULLIF(servings, 0)) STORED,
+    carbs_per_serving          NUMERIC GENERATED ALWAYS AS (total_carbs / NULLIF(servings, 0)) STORED,
+    fat_per_serving            NUMERIC GENERATED ALWAYS AS (total_fat / NULLIF(servings, 0)) STORED,
+    fiber_per_serving          NUMERIC GENERATED ALWAYS AS (total_fiber / NULLIF(servings, 0)) STORED,
+    sugar_per_serving          NUMERIC GENERATED ALWAYS AS (total_sugar / NULLIF(servings, 0)) STORED,
+    saturated_fat_per_serving  NUMERIC GENERATED ALWAYS AS (total_saturated_fat / NULLIF(servings, 0)) STORED,
+    trans_fat_per_serving      NUMERIC GENERATED ALWAYS AS (total_trans_fat / NULLIF(servings, 0)) STORED,
+    cholesterol_mg_per_serving NUMERIC GENERATED ALWAYS AS (total_cholesterol_mg / NULLIF(servings, 0)) STORED,
+    sodium_mg_per_serving      NUMERIC GENERATED ALWAYS AS (total_sodium_mg / NULLIF(servings, 0)) STORED,
+    potassium_mg_per_serving   NUMERIC GENERATED ALWAYS AS (total_potassium_mg / NULLIF(servings, 0)) STORED,
+    calcium_mg_per_serving     NUMERIC GENERATED ALWAYS AS (total_calcium_mg / NULLIF(servings, 0)) STORED,
+    iron_mg_per_serving        NUMERIC GENERATED ALWAYS AS (total_iron_mg / NULLIF(servings, 0)) STORED,
+    vitamin_a_ug_per_serving   NUMERIC GENERATED ALWAYS AS (total_vitamin_a_ug / NULLIF(servings, 0)) STORED,
+    vitamin_c_mg_per_serving   NUMERIC GENERATED ALWAYS AS (total_vitamin_c_mg / NULLIF(servings, 0)) STORED,
+    vitamin_d_ug_per_serving   NUMERIC GENERATED ALWAYS AS (total_vitamin_d_ug / NULLIF(servings, 0)) STORED,
+
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE TABLE meal_macros_dirty (
+    meal_id     INT PRIMARY KEY
+);
+
+CREATE FUNCTION mark_meal_macros_dirty() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'meals' THEN
+        INSERT INTO meal_macros_dirty (meal_id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+    ELSIF TG_TABLE_NAME = 'ingredients' THEN
+        INSERT INTO meal_macros_dirty (meal_id)
+        SELECT meal_id FROM meal_ingredient_bridge WHERE ingredient_id = NEW.id
+        ON CONFLICT DO NOTHING;
+    ELSE  -- meal_ingredient_bridge
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO meal_macros_dirty (meal_id) VALUES (OLD.meal_id) ON CONFLICT DO NOTHING;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO meal_macros_dirty (meal_id) VALUES (NEW.meal_id) ON CONFLICT DO NOTHING;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER meals_mark_macros_dirty
+    AFTER INSERT OR UPDATE OF servings ON meals
+    FOR EACH ROW EXECUTE FUNCTION mark_meal_macros_dirty();
+
+CREATE TRIGGER ingredients_mark_macros_dirty
+    AFTER UPDATE ON ingredients
+    FOR EACH ROW EXECUTE FUNCTION mark_meal_macros_dirty();
+
+CREATE TRIGGER meal_ingredient_bridge_mark_macros_dirty
+    AFTER INSERT OR UPDATE OR DELETE ON meal_ingredient_bridge
+    FOR EACH ROW EXECUTE FUNCTION mark_meal_macros_dirty();
+
+-- Recompute the queued meals and empty the queue, returns the number of meals refreshed
+CREATE FUNCTION refresh_meal_macros() RETURNS INT AS $$
+DECLARE
+    n_refreshed INT;
+BEGIN
+    WITH dirty AS (
+        DELETE FROM meal_macros_dirty RETURNING meal_id
+    )
+    INSERT INTO meal_macros (meal_id, servings,
+                             total_calories,
+                             total_protein,
+                             total_carbs,
+                             total_fat,
+                             total_fiber,
+                             total_sugar,
+                             total_saturated_fat,
+                             total_trans_fat,
+                             total_cholesterol_mg,
+                             total_sodium_mg,
+                             total_potassium_mg,
+                             total_calcium_mg,
+                             total_iron_mg,
+                             total_vitamin_a_ug,
+                             total_vitamin_c_mg,
+                             total_vitamin_d_ug,
+                             refreshed_at)
+    SELECT
+        m.id,
+        substring(m.servings FROM '\d+(?:\.\d+)?')::NUMERIC,
+        COALESCE(SUM(COALESCE(i.calories_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.protein_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.carbs_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.fat_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.fiber_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.sugar_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.saturated_fat_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.trans_fat_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.cholesterol_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.sodium_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.potassium_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.calcium_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.iron_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_a_ug_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_c_mg_per_unit, 0) * mi.quantity), 0),
+        COALESCE(SUM(COALESCE(i.vitamin_d_ug_per_unit, 0) * mi.quantity), 0),
+        now()
+    FROM dirty d
+    JOIN meals m ON m.id = d.meal_id
+    LEFT JOIN meal_ingredient_bridge mi ON mi.meal_id = m.id
+    LEFT JOIN ingredients i ON i.id = mi.ingredient_id
+    GROUP BY m.id, m.servings
+    ON CONFLICT (meal_id) DO UPDATE SET
+        servings = EXCLUDED.servings,
+        total_calories = EXCLUDED.total_calories,
+        total_protein = EXCLUDED.total_protein,
+        total_carbs = EXCLUDED.total_carbs,
+        total_fat = EXCLUDED.total_fat,
+        total_fiber = EXCLUDED.total_fiber,
+        total_sugar = EXCLUDED.total_sugar,
+        total_saturated_fat = EXCLUDED.total_saturated_fat,
+        total_trans_fat = EXCLUDED.total_trans_fat,
+        total_cholesterol_mg = EXCLUDED.total_cholesterol_mg,
+        total_sodium_mg = EXCLUDED.total_sodium_mg,
+        total_potassium_mg = EXCLUDED.total_potassium_mg,
+        total_calcium_mg = EXCLUDED.total_calcium_mg,
+        total_iron_mg = EXCLUDED.total_iron_mg,
+        total_vitamin_a_ug = EXCLUDED.total_vitamin_a_ug,
+        total_vitamin_c_mg = EXCLUDED.total_vitamin_c_mg,
+        total_vitamin_d_ug = EXCLUDED.total_vitamin_d_ug,
+        refreshed_at = EXCLUDED.refreshed_at;
+    GET DIAGNOSTICS n_refreshed = ROW_COUNT;
+    RETURN n_refreshed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- backfill meals created before this table existed
+INSERT INTO meal_macros_dirty (meal_id) SELECT id FROM meals;
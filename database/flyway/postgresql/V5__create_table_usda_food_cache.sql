@@ -0,0 +1,8 @@
+CREATE TABLE usda_food_cache (
+    query       TEXT NOT NULL,
+    food_type   TEXT NOT NULL,
+    foods       JSONB NOT NULL,
+    fetched_at  TIMESTAMP NOT NULL DEFAULT now(),
+    hit_count   BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (query, food_type)
+);
@@ -0,0 +1,7 @@
+CREATE TABLE fdc_nutrient (
+    id              INT PRIMARY KEY,
+    name            TEXT NOT NULL,
+    unit_name       TEXT,
+    nutrient_nbr    TEXT,
+    rank            NUMERIC
+);
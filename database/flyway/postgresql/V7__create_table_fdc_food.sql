@@ -0,0 +1,9 @@
+CREATE TABLE fdc_food (
+    fdc_id          INT PRIMARY KEY,
+    data_type       TEXT NOT NULL,
+    description     TEXT NOT NULL,
+    search_vector   TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', description)) STORED
+);
+
+CREATE INDEX fdc_food_search_vector_idx ON fdc_food USING GIN (search_vector);
+CREATE INDEX fdc_food_data_type_idx ON fdc_food (data_type);
@@ -0,0 +1,6 @@
+CREATE TABLE fdc_food_nutrient (
+    fdc_id          INT NOT NULL,
+    nutrient_id     INT NOT NULL,
+    amount          NUMERIC,
+    PRIMARY KEY (fdc_id, nutrient_id)
+);
@@ -0,0 +1,34 @@
+-- Normalized names (lower case, whitespace collapsed and trimmed) for meals and ingredients, kept up to date by
+-- generated columns and indexed, so name lookups are index scans instead of sequential scans of UPPER(name)
+CREATE OR REPLACE FUNCTION normalize_name(name TEXT) RETURNS TEXT AS $$
+    SELECT lower(regexp_replace(regexp_replace(name, '\s+', ' ', 'g'), '^ | $', '', 'g'));
+$$ LANGUAGE SQL IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE meals ADD COLUMN IF NOT EXISTS name_normalized TEXT
+    GENERATED ALWAYS AS (normalize_name(name)) STORED;
+ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS name_normalized TEXT
+    GENERATED ALWAYS AS (normalize_name(name)) STORED;
+
+-- meal names that only differed by case or whitespace were allowed before, keep the first meal with a name and
+-- rename the later ones (e.g. "chili (12)") so the names can be unique, reporting each one renamed
+DO $$
+DECLARE
+    duplicate RECORD;
+    new_name TEXT;
+BEGIN
+    FOR duplicate IN
+        SELECT id, name FROM (
+            SELECT id, name, row_number() OVER (PARTITION BY normalize_name(name) ORDER BY id) AS n FROM meals
+        ) named WHERE n > 1
+    LOOP
+        new_name := btrim(regexp_replace(duplicate.name, '\s+', ' ', 'g')) || ' (' || duplicate.id || ')';
+        UPDATE meals SET name = new_name WHERE id = duplicate.id;
+        RAISE NOTICE 'Meal % has the same name as an earlier meal, renamed "%" to "%"',
+            duplicate.id, duplicate.name, new_name;
+    END LOOP;
+END $$;
+
+-- a meal name is only ever inserted once (see Model.check_for_meal and BulkIngestor.flush)
+CREATE UNIQUE INDEX IF NOT EXISTS meals_name_normalized_key ON meals (name_normalized);
+-- several ingredients may share a name (e.g. with different default units), so this one isn't unique
+CREATE INDEX IF NOT EXISTS ingredients_name_normalized_idx ON ingredients (name_normalized);
@@ -1,11 +1,24 @@
 from configparser import ConfigParser
+from contextlib import contextmanager
+from psycopg2 import pool, sql
+from psycopg2.extras import execute_batch
+import getpass
 import psycopg2
+import sys
+import threading
 import os
 
+PASSWORD_ENV = "MEALLOGGER_DB_PASSWORD"
+PASSWORD_FILE_ENV = "MEALLOGGER_DB_PASSWORD_FILE"
+# the credentials of the process, resolved the first time they are asked for
+_credentials = None
+_credentials_lock = threading.Lock()
+
 
 class DatabaseUtility:
     """
     A class for database connection functionality
+    Connections come from a thread-safe pool, so several threads (e.g. ingestion workers) can share one utility
     """
 
     def __init__(self):
@@ -14,9 +27,12 @@ class DatabaseUtility:
         """
         self._config_section = "credentials"
         self._database_ini = os.path.join(os.path.dirname(__file__), "database", "database.ini")
-        self.conn, self.cur = None, None
+        self.pool = None
+        # connection -> names of the statements prepared on it (prepared statements live per connection)
+        self._prepared = {}
+        self._prepared_lock = threading.Lock()
 
-    def get_credentials(self):
+    def read_ini(self):
         """
         Parse the database ini file (supplied in self._database_ini class
             variable) for database credentials
@@ -33,48 +49,210 @@ class DatabaseUtility:
             raise Exception('Section {0} not found in the {1} file'.format(self._config_section, self._database_ini))
         return credentials
 
-    def connect(self, credentials):
+    def get_credentials(self):
+        """
+        Get the database credentials of the process: the ini file plus the password, resolved once and shared by
+            every DatabaseUtility and Flyway
+        :return: dictionary of credentials, the password is None when libpq finds it itself (PGPASSWORD, .pgpass)
+        """
+        global _credentials
+        with _credentials_lock:
+            if _credentials is None:
+                credentials = self.read_ini()
+                credentials["password"] = self.resolve_password(credentials)
+                _credentials = credentials
+            return dict(_credentials)
+
+    def resolve_password(self, credentials):
+        """
+        Find the database password without asking for it if possible, in order:
+            the MEALLOGGER_DB_PASSWORD environment variable,
+            the secrets file in MEALLOGGER_DB_PASSWORD_FILE or password_file in the ini file (its first line),
+            PGPASSWORD, or .pgpass entries for every database the app connects to (the app database and init_db,
+                which creates it), left for libpq to use,
+            a prompt when running in a terminal
+        :param credentials: the credentials of the ini file
+        :return: the password, None if there is none to pass (libpq's own sources, or no password needed)
+        """
+        if os.environ.get(PASSWORD_ENV) is not None:
+            return os.environ[PASSWORD_ENV]
+        password_file = os.environ.get(PASSWORD_FILE_ENV) or credentials.get("password_file")
+        if password_file:
+            # relative paths are relative to the ini file
+            password_file = os.path.join(os.path.dirname(self._database_ini), os.path.expanduser(password_file))
+            try:
+                with open(password_file, 'r', encoding="utf-8") as f:
+                    return f.readline().rstrip("\r\n")
+            except OSError as e:
+                raise Exception(f"Error reading the database password file {password_file}: {e}")
+        if os.environ.get("PGPASSWORD") is not None:
+            return None
+        if all(self.has_pgpass_entry(credentials, db_name) for db_name in self.connected_databases(credentials)):
+            return None
+        if sys.stdin is not None and sys.stdin.isatty():
+            return getpass.getpass(f"Please enter your database password for {credentials['user']}:")
+        return None
+
+    @staticmethod
+    def connected_databases(credentials):
+        """
+        Get the databases the app connects to: the app database, and init_db to create it (see Flyway)
+        :param credentials: the credentials of the ini file
+        """
+        return [db_name for db_name in dict.fromkeys([credentials.get("app_db"), credentials.get("init_db")])
+                if db_name]
+
+    @staticmethod
+    def has_pgpass_entry(credentials, db_name):
+        """
+        Check whether the password file of libpq (PGPASSFILE, ~/.pgpass by default) has an entry for a database
+        :param credentials: the credentials of the ini file
+        :param db_name: the database connected to
+        """
+        pgpass = os.environ.get("PGPASSFILE") or os.path.join(os.path.expanduser("~"), ".pgpass")
+        try:
+            with open(pgpass, 'r', encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return False
+        wanted = [credentials["host"], str(credentials["port"]), db_name, credentials["user"]]
+        for line in lines:
+            if not line.strip() or line.startswith('#'):
+                continue
+            # hostname:port:database:username:password, with : and \ escaped by a backslash
+            fields, field, escaped = [], '', False
+            for char in line:
+                if escaped:
+                    field, escaped = field + char, False
+                elif char == '\\':
+                    escaped = True
+                elif char == ':':
+                    fields.append(field)
+                    field = ''
+                else:
+                    field += char
+            fields.append(field)
+            if len(fields) >= 5 and all(pattern in ('*', value) for pattern, value in zip(fields[:4], wanted)):
+                return True
+        return False
+
+    def connect(self, credentials, min_connections=1, max_connections=10):
         """
-        Connect to the database supplied in the credentials dictionary
+        Open a connection pool to the database supplied in the credentials dictionary
         :param credentials: a dictionary of connection parameters to the db
-        :return: the (open) database connection and cursor objects
+        :param min_connections: number of connections opened up front
+        :param max_connections: maximum number of connections open at once
+        :return: the connection pool
         """
         try:
             print('Connecting to the PostgreSQL database...')
-            password = input(f"Please enter your database password for {credentials['user']}:")
-            self.conn = psycopg2.connect(
+            self.pool = pool.ThreadedConnectionPool(
+                min_connections, max_connections,
                 host=credentials["host"],
                 user=credentials["user"],
-                password=password,
+                password=credentials.get("password"),
                 dbname=credentials["app_db"],
-                port=credentials["port"]  # Connect to a default database to create others
+                port=credentials["port"]
             )
-            self.cur = self.conn.cursor()
-            self.cur.execute('SELECT version()')
-            db_version = self.cur.fetchone()
             print("Successfully connected to database")
         except (Exception, psycopg2.DatabaseError) as error:
-            raise Exception(error)
-        return self.conn, self.cur
+            raise self.connection_error(credentials, credentials["app_db"], error)
+        return self.pool
+
+    @staticmethod
+    def connection_error(credentials, db_name, error):
+        """
+        Explain a failed connection, listing where the password can come from when the server wanted one
+        :param credentials: the credentials connected with
+        :param db_name: the database connected to
+        :param error: the connection error
+        :return: the exception to raise
+        """
+        if "no password supplied" not in str(error):
+            return Exception(error)
+        return Exception(f"No password for database {db_name}: set {PASSWORD_ENV}, {PASSWORD_FILE_ENV} (or "
+                         f"password_file in database.ini) or PGPASSWORD, or add the .pgpass entry "
+                         f"{credentials['host']}:{credentials['port']}:{db_name}:{credentials['user']}:<password>")
 
     def disconnect(self):
         """
-        Take an existing, open database connection and close it
+        Close every connection in the pool
         """
-        self.cur.close()
-        self.conn.close()
+        self.pool.closeall()
+        self._prepared.clear()
         print("Connection to database has been closed.")
 
-    def execute_statement(self, statement: str):
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool for the duration of the with block
+        """
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+
+    @contextmanager
+    def transaction(self, cursor_factory=None):
+        """
+        Run the with block in a single transaction: commit if it succeeds, roll back if it raises
+        :param cursor_factory: optional psycopg2 cursor class (e.g. RealDictCursor)
+        :return: a cursor on the borrowed connection
+        """
+        with self.connection() as conn:
+            cur = conn.cursor(cursor_factory=cursor_factory)
+            try:
+                yield cur
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def execute_prepared(self, cur, name: str, statement: str, params=()):
+        """
+        Execute a server-side prepared statement, preparing it on the cursor's connection the first time
+        Use for hot queries so Postgres plans them once per connection
+        :param cur: a cursor from transaction()
+        :param name: the name of the prepared statement
+        :param statement: the statement, with $1, $2, ... placeholders
+        :param params: the values bound to the placeholders
+        """
+        with self._prepared_lock:
+            prepared = self._prepared.setdefault(cur.connection, set())
+        if name not in prepared:
+            cur.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)) + sql.SQL(statement))
+            prepared.add(name)
+        if params:
+            cur.execute(sql.SQL("EXECUTE {} ({})").format(sql.Identifier(name),
+                                                         sql.SQL(', ').join([sql.Placeholder()] * len(params))),
+                        params)
+        else:
+            cur.execute(sql.SQL("EXECUTE {}").format(sql.Identifier(name)))
+
+    def execute_statement(self, statement, params=None):
         """
-        Execute an update, insert, or delete statement
-        :param statement: the statement to execute
+        Execute an update, insert, or delete statement in its own transaction
+        :param statement: the statement to execute, with %s placeholders for the params
+        :param params: the values bound to the placeholders
+        :return: the first column of the first returned row (e.g. RETURNING id), None if nothing is returned
         """
-        self.cur.execute(statement)
-        row_id = self.cur.fetchone()[0]
-        self.conn.commit()
-        return row_id
+        with self.transaction() as cur:
+            cur.execute(statement, params)
+            row = cur.fetchone() if cur.description else None
+        return row[0] if row else None
 
+    def execute_many(self, statement, params_list, page_size=100):
+        """
+        Execute a statement for many sets of params in one transaction, sending them to the server in pages
+        :param statement: the statement to execute, with %s placeholders for the params
+        :param params_list: list of params tuples
+        :param page_size: number of statements sent per round trip
+        """
+        with self.transaction() as cur:
+            execute_batch(cur, statement, params_list, page_size=page_size)
 
     def get_row_id(self, table_name: str, column_name: str, value: str, id_col="id"):
         """
@@ -83,10 +261,11 @@ class DatabaseUtility:
         :param column_name: the column name to use in the where clause
         :param value: the value of the column name for the where clause
         :param id_col: the name of the id column
+        :return: the row id, None if there is no such row
         """
-        query = f"select * from {table_name} where {column_name} = \'{value}\';"
-        print(query)
-        self.cur.execute(query)
-        self.conn.commit()
-        res = self.cur.fetchone()
-        return res[id_col]
\ No newline at end of file
+        query = sql.SQL("SELECT {} FROM {} WHERE {} = %s;").format(
+            sql.Identifier(id_col), sql.Identifier(table_name), sql.Identifier(column_name))
+        with self.transaction() as cur:
+            cur.execute(query, (value,))
+            res = cur.fetchone()
+        return res[0] if res else None
@@ -0,0 +1,63 @@
+from database_utility import DatabaseUtility
+import re
+
+
+class FdcFoodIndex:
+    """
+    Full-text food search over the locally imported FoodData Central tables (see fdc_import.py)
+    Results come back in the same shape as USDAService.trim_foods, so they can stand in for the API
+    """
+
+    def __init__(self, db_conn: DatabaseUtility, limit=10):
+        """
+        Initialize the index
+        :param db_conn: a connected database utility
+        :param limit: maximum number of foods returned per search
+        """
+        self.db_conn = db_conn
+        self.limit = limit
+        # FoodData Central csv data types -> the dataType names the API uses
+        self.data_type_names = {"foundation_food": "Foundation", "sr_legacy_food": "SR Legacy",
+                                "branded_food": "Branded", "survey_fndds_food": "Survey (FNDDS)"}
+        # food type -> data types to search (None searches everything, like the API without a dataType filter)
+        self.food_type_data_types = {"foundation": ["foundation_food"], "branded": None}
+        self.search_query = """
+            WITH hits AS (
+                SELECT f.fdc_id, f.description, f.data_type, ts_rank(f.search_vector, q) AS rank
+                FROM fdc_food f, to_tsquery('english', $1) q
+                WHERE f.search_vector @@ q AND ($2::TEXT[] IS NULL OR f.data_type = ANY($2::TEXT[]))
+                ORDER BY rank DESC, f.fdc_id
+                LIMIT $3
+            )
+            SELECT h.fdc_id, h.description, h.data_type,
+                   COALESCE(json_agg(json_build_object('nutrientName', n.name, 'unitName', n.unit_name,
+                                                       'value', fn.amount) ORDER BY n.rank)
+                            FILTER (WHERE n.id IS NOT NULL), '[]')
+            FROM hits h
+            LEFT JOIN fdc_food_nutrient fn ON fn.fdc_id = h.fdc_id
+            LEFT JOIN fdc_nutrient n ON n.id = fn.nutrient_id
+            GROUP BY h.fdc_id, h.description, h.data_type, h.rank
+            ORDER BY h.rank DESC, h.fdc_id;
+            """
+
+    def search(self, food_keywords: str, food_type: str="foundation"):
+        """
+        Search the local foods matching all the keywords
+        (no fallback to foods matching any of them: "chicken" would find every chicken product, and a poor local
+        match would always win over the USDA API)
+        :param food_keywords: the keywords to search for food
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: list of foods (dicts of fdcId, description, dataType, foodNutrients), best match first
+        """
+        if food_type not in self.food_type_data_types:
+            raise Exception(f"Invalid food type: {food_type} not in [branded, foundation]")
+        words = re.findall(r"[a-z0-9]+", food_keywords.lower())
+        if not words:
+            return []
+        with self.db_conn.transaction() as cur:
+            self.db_conn.execute_prepared(cur, "fdc_food_search", self.search_query,
+                                          (" & ".join(words), self.food_type_data_types[food_type], self.limit))
+            rows = cur.fetchall()
+        return [{"fdcId": fdc_id, "description": description,
+                 "dataType": self.data_type_names.get(data_type, data_type), "foodNutrients": nutrients}
+                for fdc_id, description, data_type, nutrients in rows]
@@ -0,0 +1,95 @@
+from database_utility import DatabaseUtility
+import argparse
+import csv
+import io
+import os
+
+
+class FdcImporter:
+    """
+    Loads the downloadable USDA FoodData Central CSV datasets (Foundation, SR Legacy, Branded, ...) into the
+    fdc_nutrient, fdc_food and fdc_food_nutrient tables so food searches can run without the API
+    """
+
+    def __init__(self, db_conn: DatabaseUtility, chunk_size=50000):
+        """
+        Initialize the importer
+        :param db_conn: a connected database utility
+        :param chunk_size: number of csv rows sent per COPY
+        """
+        self.db_conn = db_conn
+        self.chunk_size = chunk_size
+        # (dataset file, table, primary key, [(table column, csv column)])
+        self.files = [
+            ("nutrient.csv", "fdc_nutrient", "id",
+             [("id", "id"), ("name", "name"), ("unit_name", "unit_name"), ("nutrient_nbr", "nutrient_nbr"),
+              ("rank", "rank")]),
+            ("food.csv", "fdc_food", "fdc_id",
+             [("fdc_id", "fdc_id"), ("data_type", "data_type"), ("description", "description")]),
+            ("food_nutrient.csv", "fdc_food_nutrient", "fdc_id, nutrient_id",
+             [("fdc_id", "fdc_id"), ("nutrient_id", "nutrient_id"), ("amount", "amount")]),
+        ]
+
+    def import_dataset(self, dataset_dir: str):
+        """
+        Import one unzipped FoodData Central CSV download
+        Rows that are already imported (e.g. nutrient.csv, which every download ships) are skipped
+        :param dataset_dir: the directory holding food.csv, nutrient.csv and food_nutrient.csv
+        """
+        for file_name, table, key, columns in self.files:
+            path = os.path.join(dataset_dir, file_name)
+            if not os.path.exists(path):
+                print(f"No {file_name} in {dataset_dir}, skipping")
+                continue
+            print(f"Importing {path} into {table}...")
+            n_rows = self.import_csv(path, table, key, columns)
+            print(f"Imported {n_rows} rows into {table}")
+        with self.db_conn.transaction() as cur:
+            cur.execute("ANALYZE fdc_nutrient; ANALYZE fdc_food; ANALYZE fdc_food_nutrient;")
+
+    def import_csv(self, path: str, table: str, key: str, columns: list):
+        """
+        Stream a csv file into a table through a temporary staging table, one COPY per chunk of rows,
+        all in a single transaction
+        :param path: path to the csv file
+        :param table: the table to load into
+        :param key: the primary key columns of the table (duplicates in the file are dropped)
+        :param columns: list of (table column, csv column) pairs to load
+        :return: number of rows read from the file
+        """
+        table_columns = ', '.join(column for column, _ in columns)
+        stage = f"{table}_stage"
+        copy_statement = f"COPY {stage} ({table_columns}) FROM STDIN WITH (FORMAT csv)"
+        n_rows = 0
+        with self.db_conn.transaction() as cur, open(path, 'r', newline='', encoding="utf-8") as f:
+            cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                        f"SELECT {table_columns} FROM {table} WITH NO DATA;")
+            reader = csv.DictReader(f)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in reader:
+                writer.writerow([row.get(csv_column) for _, csv_column in columns])
+                n_rows += 1
+                if n_rows % self.chunk_size == 0:
+                    buffer.seek(0)
+                    cur.copy_expert(copy_statement, buffer)
+                    buffer.seek(0)
+                    buffer.truncate()
+            buffer.seek(0)
+            cur.copy_expert(copy_statement, buffer)
+            cur.execute(f"INSERT INTO {table} ({table_columns}) SELECT DISTINCT ON ({key}) {table_columns} "
+                        f"FROM {stage} ON CONFLICT DO NOTHING;")
+        return n_rows
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Import FoodData Central CSV downloads into the database")
+    arg_parser.add_argument("dataset_dirs", nargs='+', help="unzipped FoodData Central CSV download directories")
+    args = arg_parser.parse_args()
+
+    db_util = DatabaseUtility()
+    db_util.connect(db_util.get_credentials())
+    importer = FdcImporter(db_util)
+    for dataset_dir in args.dataset_dirs:
+        importer.import_dataset(dataset_dir)
+    db_util.disconnect()
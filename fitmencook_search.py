@@ -1,7 +1,5 @@
 from recipe_search import RecipeSearch
 from recipe_parser import RecipeParser
-import requests
-from bs4 import BeautifulSoup
 import re
 
 
@@ -11,37 +9,56 @@ class FitMenCook(RecipeSearch):
     Utilities for navigating and retrieving data from the FitMenCook recipe website
     """
 
-    def __init__(self, meal):
+    def __init__(self, meal, http_cache=None):
         """
         Initialize utilities for FitMenCook website navigation
         :param meal: the initialized meal object -- mostly null attributes
+        :param http_cache: the HttpCache all page downloads go through (a default on-disk cache if None)
         """
-        super().__init__(meal)
+        super().__init__(meal, http_cache)
         self._name = "FitMenCook"
         self._base_url = "https://fitmencook.com/"
         self._search_url = self._base_url + "?s="
-        self._rp = RecipeParser()
+        self._rp = RecipeParser(self._http_cache)
+        self._page = None
 
     def search_for_meal(self):
         """
-        Search for the meal name on the FitMenCook website
+        Search for the meal name on the FitMenCook website, downloading the recipe page and filling in the recipe url
+            and title of the meal
         :return: the url to the recipe (str)
         """
         search_url = self._search_url + self.meal_name.replace(' ', '+')
-        r = requests.get(search_url, timeout=15)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
+        soup = self.fetch_page(search_url).soup
         recipe_element = soup.find("figure", class_="fmc_grid_figure")
         recipe_url = recipe_element.find("a")["href"]
 
-        r = requests.get(recipe_url, timeout=15)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
-        self.meal.name = soup.find("h1", class_="fmc_title_1 title_spacing_3").get_text(strip=True)
+        self._page = self.fetch_page(recipe_url)
+        self.meal.recipe_url = recipe_url
+        self.meal.name = self.get_recipe_title(self._page)
         return recipe_url
 
+    def get_recipe_page(self, meal):
+        """
+        Get the downloaded recipe page for the given meal, fetching it only if it hasn't been already
+        :param meal: the meal object (with recipe url)
+        :return: the recipe page (RecipePage)
+        """
+        if self._page is None or self._page.url != meal.recipe_url:
+            self._page = self.fetch_page(meal.recipe_url)
+        return self._page
+
+    def get_recipe_title(self, page):
+        """
+        Get the title of the recipe
+        :param page: the recipe page
+        :return: the recipe title (str)
+        """
+        name = page.json_ld_field("name")
+        if isinstance(name, str) and name.strip():
+            return name.strip()
+        return page.soup.find("h1", class_="fmc_title_1 title_spacing_3").get_text(strip=True)
+
     def get_ingredients(self, meal):
         """
         Get list of ingredients
@@ -51,7 +68,23 @@ class FitMenCook(RecipeSearch):
         recipe_url = self.search_for_meal()
         meal.recipe_url = recipe_url
         meal.website_name = self._name
-        ingredients = self._rp.parse_recipe_url(recipe_url)
+        ingredients = self._rp.parse_recipe_page(self.get_recipe_page(meal))
+        return ingredients
+
+    def extract_recipe(self, meal, page):
+        """
+        Fill in the meal from an already downloaded recipe page, without touching the network
+        :param meal: the meal object
+        :param page: the recipe page (RecipePage)
+        :return: list of parsed ingredients for the recipe
+        """
+        self._page = page
+        meal.recipe_url = page.url
+        meal.website_name = self._name
+        ingredients = self._rp.parse_recipe_page(page)
+        meal.description = self.get_recipe_steps(meal)
+        meal.servings = self.get_recipe_servings(meal)
+        meal.serving_size, meal.serving_unit = self.get_serving_size_and_unit(meal)
         return ingredients
 
     def get_recipe_steps(self, meal):
@@ -59,47 +92,29 @@ class FitMenCook(RecipeSearch):
         Get the description of the given recipe
         :param meal: the meal object
         """
-        r = requests.get(meal.recipe_url, timeout=15)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
+        page = self.get_recipe_page(meal)
         # --------------------------------------------------
-        # 1. Try JSON-LD (the most reliable format)
+        # 1. Try JSON-LD (the most reliable format), read straight from the raw html
         # --------------------------------------------------
         steps = []
-        for script in soup.find_all("script", type="application/ld+json"):
-            try:
-                import json
-                data = json.loads(script.string.strip())
-            except Exception:
-                continue
-            # Flatten lists
-            def walk(obj):
-                if isinstance(obj, list):
-                    for item in obj:
-                        yield from walk(item)
-                elif isinstance(obj, dict):
-                    yield obj
-                    for v in obj.values():
-                        yield from walk(v)
-            for node in walk(data):
-                if isinstance(node, dict) and node.get("@type", "").lower() == "recipe":
-                    instr = node.get("recipeInstructions")
-                    if instr:
-                        # recipeInstructions may be:
-                        # 1) list of steps (HowToStep objects)
-                        # 2) single long string
-                        if isinstance(instr, list):
-                            for step in instr:
-                                if isinstance(step, dict) and "text" in step:
-                                    steps.append(step["text"].strip())
-                                elif isinstance(step, str):
-                                    steps.append(step.strip())
-                        elif isinstance(instr, str):
-                            # Break into lines
-                            steps.extend([s.strip() for s in instr.split("\n") if s.strip()])
-                    if steps:
-                        return "\n".join(f"{i + 1}. {s}" for i, s in enumerate(steps))
+        for node in page.json_ld_recipes:
+            instr = node.get("recipeInstructions")
+            if instr:
+                # recipeInstructions may be:
+                # 1) list of steps (HowToStep objects)
+                # 2) single long string
+                if isinstance(instr, list):
+                    for step in instr:
+                        if isinstance(step, dict) and "text" in step:
+                            steps.append(step["text"].strip())
+                        elif isinstance(step, str):
+                            steps.append(step.strip())
+                elif isinstance(instr, str):
+                    # Break into lines
+                    steps.extend([s.strip() for s in instr.split("\n") if s.strip()])
+            if steps:
+                return "\n".join(f"{i + 1}. {s}" for i, s in enumerate(steps))
+        soup = page.soup
         # --------------------------------------------------
         # 2. Fallback: Find instructions section by heading
         # --------------------------------------------------
@@ -162,12 +177,15 @@ class FitMenCook(RecipeSearch):
         Get the servings for this recipep
         :param meal: the meal object
         """
-        r = requests.get(meal.recipe_url, timeout=15)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
+        page = self.get_recipe_page(meal)
+        recipe_yield = page.json_ld_field("recipeYield")
+        if isinstance(recipe_yield, list):
+            recipe_yield = recipe_yield[0]
+        match = re.search(r'\d+', str(recipe_yield)) if recipe_yield is not None else None
+        if match:
+            return match.group(0)
         try:
-            n_servings = soup.find("div", class_="fmc_nos").find("span").get_text(strip=True)
+            n_servings = page.soup.find("div", class_="fmc_nos").find("span").get_text(strip=True)
         except:
             print("Couldn't find number of servings")
             n_servings = None
@@ -178,12 +196,13 @@ class FitMenCook(RecipeSearch):
         Get the serving size and unit
         :param meal: the meal object
         """
-        r = requests.get(meal.recipe_url, timeout=15)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
+        page = self.get_recipe_page(meal)
+        nutrition = page.json_ld_field("nutrition")
+        serving_size = nutrition.get("servingSize") if isinstance(nutrition, dict) else None
+        if isinstance(serving_size, str) and re.search(r'\d+', serving_size) and re.search(r'[A-Za-z]', serving_size):
+            return re.search(r'\d+', serving_size).group(0), re.search(r'[A-Za-z]', serving_size).group(0)
         try:
-            serving_size = soup.find("div", class_="fmc_ss").find("span").get_text(strip=True)
+            serving_size = page.soup.find("div", class_="fmc_ss").find("span").get_text(strip=True)
             serving_size, serving_unit = re.search(r'\d+', serving_size).group(0), re.search(r'[A-Za-z]', serving_size).group(0)
         except:
             print("Couldn't find serving size")
@@ -1,89 +1,253 @@
 import psycopg2
+from psycopg2 import sql
 import os
+import re
+import time
+import zlib
 from database_utility import DatabaseUtility
 
+# versioned migration scripts: V<version>__<description>.sql, applied in version order
+RE_MIGRATION = re.compile(r'^V(\d+)__(\w+)\.sql$')
+HISTORY_TABLE = "flyway_schema_history"
+# advisory lock key, so app instances starting at the same time don't apply the same migrations twice
+MIGRATION_LOCK_KEY = 7201934
+
 
 class Flyway:
     """
     Scripts for executing flyway on a database
+    Migrations are the versioned scripts in database/flyway/<db_type>. The ones applied are recorded, with a checksum,
+    in the flyway_schema_history table; the pending ones are applied in version order in one transaction on one
+    connection, so a failing script leaves the schema as it was. When nothing is pending, migrate() costs one query
     """
 
-    def  __init__(self, db_type="postgresql"):
+    def  __init__(self, credentials=None, db_type="postgresql"):
         """
         Initialize
+        :param credentials: the database credentials (those of the process, see DatabaseUtility.get_credentials,
+            if None)
+        :param db_type: the database type, the directory of the migration scripts
         """
         self.flyway_path = os.path.join(os.path.dirname(__file__), "database", "flyway", db_type)
         self.db_utility = DatabaseUtility()
-        self.credentials = self.db_utility.get_credentials()
-        self.credentials["password"] = input(f"Please enter your database password for {self.credentials['user']}:")
+        self.credentials = credentials if credentials is not None else self.db_utility.get_credentials()
+        self.baseline_version = int(self.credentials.get("baseline_version", 0))
+        self.conn = None
+
+    def connect(self, db_name: str):
+        """
+        Open a connection to a database of the server
+        :param db_name: name of the database
+        """
         try:
-            # Connect to the default 'postgres' database to create a new one
-            self.conn = psycopg2.connect(
+            return psycopg2.connect(
                 host=self.credentials["host"],
                 user=self.credentials["user"],
-                password=self.credentials["password"],
-                dbname=self.credentials["init_db"],
-                port=self.credentials["port"]  # Connect to a default database to create others
+                password=self.credentials.get("password"),
+                dbname=db_name,
+                port=self.credentials["port"]
             )
-            self.cur = self.conn.cursor()
-        except psycopg2.Error as e:
-            raise Exception(f"Error creating database: {e}")
-        self.table_order = self.credentials["table_order"].split(',')
+        except psycopg2.OperationalError as e:
+            if "no password supplied" in str(e):
+                raise self.db_utility.connection_error(self.credentials, db_name, e)
+            raise
+
+    def close(self):
+        """
+        Close the connection to the app database
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
 
     def create_database(self, db_name: str):
         """
         Create a database if it doesn't exist
         :param db_name: name of new database
         """
-        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-        self.cur.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = '{}'".format(db_name))
+        # Connect to the default 'postgres' database to create a new one
         try:
-            exists = self.cur.fetchone()
-            if not exists:
-                self.cur.execute("CREATE DATABASE \"{}\"".format(db_name))
-                self.conn.commit()
-            else:
-                print(f"{db_name} already exists.")
-        except psycopg2.ProgrammingError:
+            conn = self.connect(self.credentials["init_db"])
+        except psycopg2.Error as e:
+            raise Exception(f"Error creating database: {e}")
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (db_name,))
+                if cur.fetchone():
+                    print(f"{db_name} already exists.")
+                    return
+                try:
+                    cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+                except psycopg2.errors.DuplicateDatabase:
+                    print(f"{db_name} already exists.")
+        finally:
+            conn.close()
+
+    def open_app_database(self):
+        """
+        Connect to the app database, creating it first if it doesn't exist yet
+        """
+        db_name = self.credentials["app_db"]
+        try:
+            self.conn = self.connect(db_name)
+        except psycopg2.OperationalError as e:
+            if "does not exist" not in str(e):
+                raise Exception(f"Error connecting to database {db_name}: {e}")
+            print(f"Creating database {db_name}...")
+            self.create_database(db_name)
+            self.conn = self.connect(db_name)
+
+    @staticmethod
+    def checksum(script: bytes) -> int:
+        """
+        Checksum a migration script (CRC32 as a signed int, ignoring line endings)
+        """
+        crc = zlib.crc32(script.replace(b"\r\n", b"\n"))
+        return crc - (1 << 32) if crc >= 1 << 31 else crc
+
+    def local_migrations(self):
+        """
+        Find the migration scripts
+        :return: list of dictionaries of version, description, script (file name), checksum and sql, in version order
+        """
+        migrations = []
+        for file_name in os.listdir(self.flyway_path):
+            match = RE_MIGRATION.match(file_name)
+            if not match:
+                continue
+            with open(os.path.join(self.flyway_path, file_name), 'rb') as f:
+                script = f.read()
+            migrations.append({"version": int(match.group(1)), "description": match.group(2).replace('_', ' '),
+                               "script": file_name, "checksum": self.checksum(script),
+                               "sql": script.decode("utf-8")})
+        migrations.sort(key=lambda migration: migration["version"])
+        for previous, migration in zip(migrations, migrations[1:]):
+            if previous["version"] == migration["version"]:
+                raise Exception(f"Migrations {previous['script']} and {migration['script']} have the same version")
+        return migrations
+
+    def applied_migrations(self, cur):
+        """
+        Read the schema history
+        :param cur: a cursor on the app database
+        :return: dictionary of applied version -> (type, checksum), None if there is no schema history yet
+        """
+        try:
+            cur.execute(f"SELECT version, type, checksum FROM {HISTORY_TABLE};")
+        except psycopg2.errors.UndefinedTable:
+            self.conn.rollback()
+            return None
+        return {version: (migration_type, checksum) for version, migration_type, checksum in cur.fetchall()}
+
+    @staticmethod
+    def pending_migrations(applied, migrations):
+        """
+        Validate the applied migrations against the scripts and find the ones still to apply
+        :param applied: the schema history (see applied_migrations)
+        :param migrations: the migration scripts (see local_migrations)
+        :return: the pending migrations, in version order
+        """
+        baseline = max([version for version, (migration_type, _) in applied.items() if migration_type == "BASELINE"],
+                       default=0)
+        local_versions = {migration["version"] for migration in migrations}
+        for version, (migration_type, _) in applied.items():
+            if migration_type != "BASELINE" and version not in local_versions:
+                print(f"Migration version {version} was applied but its script is missing")
+        pending = []
+        for migration in migrations:
+            if migration["version"] in applied:
+                if applied[migration["version"]][0] == "SQL" and \
+                        applied[migration["version"]][1] != migration["checksum"]:
+                    raise Exception(f"Migration {migration['script']} was changed after it was applied "
+                                    f"(checksum {migration['checksum']}, applied {applied[migration['version']][1]})")
+            elif migration["version"] > baseline:
+                pending.append(migration)
+        if pending and applied and pending[0]["version"] < max(applied):
+            raise Exception(f"Migration {pending[0]['script']} is older than the latest applied migration "
+                            f"(version {max(applied)})")
+        return pending
+
+    def baseline(self, cur):
+        """
+        Record the baseline version for a database whose tables were created before the schema history existed
+        :param cur: a cursor on the app database, in the migration transaction
+        :return: whether a baseline was recorded
+        """
+        cur.execute("SELECT count(*) FROM information_schema.tables WHERE table_schema = current_schema() "
+                    "AND table_name <> %s;", (HISTORY_TABLE,))
+        if not self.baseline_version or not cur.fetchone()[0]:
+            return False
+        print(f"Existing schema found, baselining at version {self.baseline_version}")
+        cur.execute(f"INSERT INTO {HISTORY_TABLE} (version, description, type, script, execution_time) "
+                    f"VALUES (%s, '<< Flyway Baseline >>', 'BASELINE', '<< Flyway Baseline >>', 0);",
+                    (self.baseline_version,))
+        return True
+
+    def migrate(self):
+        """
+        Bring the app database schema up to date, creating the database if it doesn't exist
+        :return: the number of migrations applied
+        """
+        if self.conn is None:
+            self.open_app_database()
+        migrations = self.local_migrations()
+        with self.conn.cursor() as cur:
+            applied = self.applied_migrations(cur)
+            if applied is not None and not self.pending_migrations(applied, migrations):
+                self.conn.rollback()
+                return 0
+            migration = None
             try:
-                self.cur.execute("CREATE DATABASE \"{}\"".format(db_name))
+                cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_KEY,))
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+                        installed_rank  SERIAL PRIMARY KEY,
+                        version         INT NOT NULL UNIQUE,
+                        description     TEXT NOT NULL,
+                        type            TEXT NOT NULL,
+                        script          TEXT NOT NULL,
+                        checksum        INT,
+                        installed_by    TEXT NOT NULL DEFAULT current_user,
+                        installed_on    TIMESTAMP NOT NULL DEFAULT now(),
+                        execution_time  INT NOT NULL
+                    );
+                    """)
+                # read the history again under the lock, another instance may have just migrated
+                applied = self.applied_migrations(cur)
+                if not applied and self.baseline(cur):
+                    applied = self.applied_migrations(cur)
+                pending = self.pending_migrations(applied, migrations)
+                for migration in pending:
+                    print(f"Applying migration {migration['version']}: {migration['description']}...")
+                    start = time.perf_counter()
+                    cur.execute(migration["sql"])
+                    # e.g. the rows a migration had to change
+                    for notice in self.conn.notices:
+                        print(notice.strip())
+                    del self.conn.notices[:]
+                    cur.execute(f"INSERT INTO {HISTORY_TABLE} (version, description, type, script, checksum, "
+                                f"execution_time) VALUES (%s, %s, 'SQL', %s, %s, %s);",
+                                (migration["version"], migration["description"], migration["script"],
+                                 migration["checksum"], round((time.perf_counter() - start) * 1000)))
                 self.conn.commit()
-            except psycopg2.errors.DuplicateDatabase:
-                print(f"{db_name} already exists.")
-        self.conn = psycopg2.connect(
-            host=self.credentials["host"],
-            user=self.credentials["user"],
-            password=self.credentials["password"],
-            dbname=self.credentials["app_db"],
-            port=self.credentials["port"]  # Connect to a default database to create others
-        )
-        self.conn.commit()
-        self.cur = self.conn.cursor()
-
-    def create_table(self, table_name: str):
-        """
-        Create a postgres table from create table script saved in a file
-        :param table_name: name of the table
-        """
-        flyway_script_name = f"create_table_{table_name}.sql"
-        create_table_statement = open(os.path.join(self.flyway_path, flyway_script_name), 'r').read()
-        try:
-            self.cur.execute(create_table_statement)
-            self.conn.commit()
-        except psycopg2.errors.DuplicateTable:
-            print(f"Relation \"{table_name}\" was already created")
-            self.conn.commit()
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                failed = f" {migration['script']}" if migration else ""
+                raise Exception(f"Error applying migration{failed}, no migration was applied: {e}")
+            except Exception:
+                self.conn.rollback()
+                raise
+        return len(pending)
 
     def run_flyway(self):
-            """
-            Run flyway step for database
-            """
-            flyway = Flyway()
-            print(f"Creating database {self.credentials['app_db']}...")
-            flyway.create_database(self.credentials["app_db"])
-            for table in self.table_order:
-                print(f"Creating table {table}...")
-                flyway.create_table(table)
+        """
+        Run flyway step for database
+        """
+        print(f"Migrating database {self.credentials['app_db']}...")
+        applied = self.migrate()
+        print(f"Applied {applied} migrations" if applied else "Database schema is up to date")
+        self.close()
 
 
 if __name__ == "__main__":
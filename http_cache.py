@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import requests
+
+
+class HttpCache:
+    """
+    A persistent on-disk cache of HTTP GET responses for recipe websites
+    Each response is stored in a file named after the sha256 of its url, holding the body, the response headers
+    and the time it was fetched. Stale entries are revalidated with a conditional GET (ETag / Last-Modified)
+    """
+
+    def __init__(self, cache_dir=None, ttl=7 * 24 * 60 * 60, offline=False, timeout=15):
+        """
+        Initialize the cache
+        :param cache_dir: the directory to store responses in (defaults to cache/http next to this file)
+        :param ttl: number of seconds a response is served without revalidation (None never expires)
+        :param offline: only serve responses from the cache, never touch the network
+        :param timeout: the request timeout in seconds
+        """
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), "cache", "http")
+        self.ttl = ttl
+        self.offline = offline
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def get(self, url):
+        """
+        Get the body of the given url, from the cache if possible
+        :param url: the url to get (str)
+        :return: the response body (str)
+        """
+        entry = self.load(url)
+        if entry and (self.offline or self.is_fresh(entry)):
+            return entry["body"]
+        if self.offline:
+            raise Exception(f"{url} is not in the HTTP cache and offline mode is on")
+        headers = {}
+        if entry:
+            if entry["headers"].get("ETag"):
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        r = self._session.get(url, headers=headers, timeout=self.timeout)
+        if entry and r.status_code == 304:  # unchanged, keep the cached body
+            entry["fetched_at"] = time.time()
+            self.store(url, entry)
+            return entry["body"]
+        r.raise_for_status()
+        entry = {
+            "url": url,
+            "body": r.text,
+            "headers": {key: r.headers[key] for key in ("ETag", "Last-Modified", "Content-Type") if key in r.headers},
+            "fetched_at": time.time(),
+        }
+        self.store(url, entry)
+        return entry["body"]
+
+    def is_fresh(self, entry):
+        """
+        Check whether a cached entry can be served without revalidation
+        :param entry: the cached entry (dict)
+        """
+        return self.ttl is None or time.time() - entry["fetched_at"] < self.ttl
+
+    def load(self, url):
+        """
+        Load the cached entry for a url
+        :param url: the url (str)
+        :return: the cached entry (dict), None if the url isn't cached
+        """
+        try:
+            with open(self._path(url), 'r', encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, url, entry):
+        """
+        Write an entry to the cache, atomically so concurrent readers never see a partial file
+        :param url: the url (str)
+        :param entry: the entry to store (dict)
+        """
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a temp file of its own per writer, threads of one process included
+        with tempfile.NamedTemporaryFile('w', encoding="utf-8", dir=os.path.dirname(path), suffix=".tmp",
+                                         delete=False) as f:
+            json.dump(entry, f)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+    def _path(self, url):
+        """
+        Get the cache file path for a url
+        :param url: the url (str)
+        """
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
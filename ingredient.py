@@ -1,8 +1,25 @@
+# the nutrient columns of the ingredients table (<nutrient>_per_unit) and of meal_macros (total_<nutrient>)
+NUTRIENTS = [
+    "calories", "protein", "carbs", "fat", "fiber", "sugar", "saturated_fat", "trans_fat", "cholesterol_mg",
+    "sodium_mg", "potassium_mg", "calcium_mg", "iron_mg", "vitamin_a_ug", "vitamin_c_mg", "vitamin_d_ug"
+]
+
+
 class Ingredient(object):
     """
     Ingredient object definition
+    Slotted, so a catalogue of many ingredients doesn't carry a __dict__ per object (see IngredientTable for the
+    columnar form)
     """
 
+    __slots__ = (
+        "_id", "_name", "_calories_per_unit", "_protein_per_unit", "_carbs_per_unit", "_fat_per_unit",
+        "_fiber_per_unit", "_sugar_per_unit", "_saturated_fat_per_unit", "_trans_fat_per_unit",
+        "_cholesterol_mg_per_unit", "_sodium_mg_per_unit", "_potassium_mg_per_unit", "_calcium_mg_per_unit",
+        "_iron_mg_per_unit", "_vitamin_a_ug_per_unit", "_vitamin_c_mg_per_unit", "_vitamin_d_ug_per_unit",
+        "_default_unit",
+    )
+
     def __init__(
         self,
         id=None,
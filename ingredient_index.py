@@ -0,0 +1,190 @@
+import re
+
+# words that describe how an ingredient is cut or sold rather than what it is
+STOP_WORDS = {
+    "a", "an", "and", "the", "of", "or", "for", "to", "with", "in", "fresh", "freshly", "organic", "large",
+    "medium", "small", "boneless", "skinless", "chopped", "diced", "minced", "sliced", "shredded", "grated",
+    "crushed", "ground", "peeled", "trimmed", "finely", "roughly", "thinly", "halved", "cubed", "taste", "optional",
+    "divided", "packed",
+}
+# words for the state of an ingredient, which changes its nutrients per gram (cooked rice is mostly water):
+# a name only matches an ingredient in the same state
+STATE_WORDS = {"cooked", "uncooked", "raw", "dried", "frozen", "canned"}
+RE_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class IngredientIndex:
+    """
+    An in-memory index of the ingredients table, resolving parsed ingredient names to ingredient ids
+    Names are reduced to normalized tokens (lowercase, singular, without descriptor words). An exact token match is
+    one dictionary lookup; otherwise the candidates are the ingredients sharing a token in the inverted index, with
+    misspelled tokens mapped to close vocabulary tokens through a trigram index, and the best one is kept if its
+    score clears the threshold
+    A candidate has to match every token of the name and be in the same state (STATE_WORDS), and a one word name
+    only matches one word ingredients, so "egg" doesn't resolve to egg white nor "rice" to cooked rice
+    """
+
+    def __init__(self, threshold=0.6, token_threshold=0.5):
+        """
+        Initialize an empty index
+        :param threshold: the minimum score (0 to 1) a match needs to resolve a name
+        :param token_threshold: the minimum trigram similarity for a misspelled token to match a known one
+        """
+        self.threshold = threshold
+        self.token_threshold = token_threshold
+        self.names = {}
+        # ingredient id -> normalized tokens, and the state words among them
+        self._tokens = {}
+        self._states = {}
+        # sorted normalized tokens -> ingredient id
+        self._exact = {}
+        # token -> ids of the ingredients with that token
+        self._postings = {}
+        # trigram -> vocabulary tokens containing it, and the number of trigrams of each vocabulary token
+        self._trigrams = {}
+        self._n_trigrams = {}
+        self._resolved = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def singular(token):
+        """
+        Reduce a plural token to its singular (tomatoes -> tomato, berries -> berry, eggs -> egg)
+        """
+        if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+            return token
+        if token.endswith("ies"):
+            return token[:-3] + "y"
+        if token.endswith(("oes", "ches", "shes", "xes", "sses")):
+            return token[:-2]
+        if token.endswith("s"):
+            return token[:-1]
+        return token
+
+    def normalize(self, name):
+        """
+        Reduce a name to its normalized tokens
+        :param name: an ingredient name e.g. Boneless Skinless Chicken Breasts
+        :return: list of tokens e.g. [chicken, breast]
+        """
+        tokens = [self.singular(token) for token in RE_TOKEN.findall((name or '').lower())
+                  if token not in STOP_WORDS and not token.isdigit()]
+        return list(dict.fromkeys(tokens))
+
+    @staticmethod
+    def trigrams(token):
+        """
+        Get the trigrams of a token, padded so short tokens have some
+        """
+        padded = f"  {token} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def load(self, rows):
+        """
+        Add the ingredients of the database to the index
+        :param rows: list of (id, name) tuples
+        :return: the index
+        """
+        for ingredient_id, name in rows:
+            self.add(ingredient_id, name)
+        return self
+
+    def add(self, ingredient_id, name):
+        """
+        Add one ingredient to the index
+        :param ingredient_id: the id of the ingredient
+        :param name: the name of the ingredient
+        """
+        tokens = self.normalize(name)
+        if not tokens:
+            return
+        self.names[ingredient_id] = name
+        self._tokens[ingredient_id] = tokens
+        self._states[ingredient_id] = STATE_WORDS.intersection(tokens)
+        # the first ingredient with a name keeps it (ids are in insertion order)
+        self._exact.setdefault(' '.join(sorted(tokens)), ingredient_id)
+        for token in tokens:
+            if token not in self._postings:
+                self._postings[token] = set()
+                trigrams = self.trigrams(token)
+                for trigram in trigrams:
+                    self._trigrams.setdefault(trigram, set()).add(token)
+                self._n_trigrams[token] = len(trigrams)
+            self._postings[token].add(ingredient_id)
+        self._resolved.clear()
+
+    def similar_tokens(self, token):
+        """
+        Find the vocabulary tokens close to a token that isn't in the vocabulary
+        :return: dictionary of token -> trigram similarity (Dice), at least token_threshold
+        """
+        trigrams = self.trigrams(token)
+        shared = {}
+        for trigram in trigrams:
+            for other in self._trigrams.get(trigram, ()):
+                shared[other] = shared.get(other, 0) + 1
+        similar = {}
+        for other, n_shared in shared.items():
+            similarity = 2 * n_shared / (len(trigrams) + self._n_trigrams[other])
+            if similarity >= self.token_threshold:
+                similar[other] = similarity
+        return similar
+
+    def match(self, name):
+        """
+        Find the ingredient best matching a name
+        :param name: the parsed ingredient name
+        :return: (ingredient id, score) tuple, the id is None if no score clears the threshold
+        """
+        tokens = self.normalize(name)
+        if not tokens:
+            return None, 0.0
+        exact = self._exact.get(' '.join(sorted(tokens)))
+        if exact is not None:
+            return exact, 1.0
+        # per query token: the vocabulary tokens it matches and how well
+        matches = {}
+        for token in tokens:
+            matches[token] = {token: 1.0} if token in self._postings else self.similar_tokens(token)
+        # matched token weight and number of query tokens matched per candidate, accumulated over the postings of
+        # the matched tokens
+        matched, n_matched = {}, {}
+        for token in tokens:
+            token_matches = matches[token]
+            if len(token_matches) == 1:
+                (other, similarity), = token_matches.items()
+                best_similarity = dict.fromkeys(self._postings[other], similarity)
+            else:
+                best_similarity = {}
+                for other, similarity in token_matches.items():
+                    for ingredient_id in self._postings[other]:
+                        if similarity > best_similarity.get(ingredient_id, 0.0):
+                            best_similarity[ingredient_id] = similarity
+            for ingredient_id, similarity in best_similarity.items():
+                matched[ingredient_id] = matched.get(ingredient_id, 0.0) + similarity
+                n_matched[ingredient_id] = n_matched.get(ingredient_id, 0) + 1
+        states = STATE_WORDS.intersection(tokens)
+        best, best_score = None, 0.0
+        for ingredient_id, weight in matched.items():
+            if n_matched[ingredient_id] < len(tokens) or self._states[ingredient_id] != states or \
+                    (len(tokens) == 1 and len(self._tokens[ingredient_id]) > 1):
+                continue
+            # Dice coefficient over the tokens, with fuzzy token matches counting their similarity
+            score = 2 * weight / (len(tokens) + len(self._tokens[ingredient_id]))
+            if best is None or score > best_score or (score == best_score and ingredient_id < best):
+                best, best_score = ingredient_id, score
+        if best_score < self.threshold:
+            return None, best_score
+        return best, best_score
+
+    def resolve(self, name):
+        """
+        Resolve a parsed ingredient name to the id of an ingredient in the database
+        :param name: the parsed ingredient name
+        :return: the ingredient id, None if no ingredient matches well enough
+        """
+        if name not in self._resolved:
+            self._resolved[name] = self.match(name)[0]
+        return self._resolved[name]
@@ -1,5 +1,9 @@
 import re
-import json
+from parse_cache import shared_cache, source_version
+from unit_registry import UNIT_SOURCES, unit_registry
+
+# saved parse caches are only reused by the exact parser code and unit tables that wrote them
+PARSER_VERSION = source_version(__file__, *UNIT_SOURCES)
 
 
 # TODO
@@ -8,13 +12,20 @@ class IngredientParser:
     A tool for parsing an ingredient for its name and its measurement
     """
 
-    def __init__(self):
+    def __init__(self, parse_cache=None):
         """
         Initialize the ingredient parser
+        :param parse_cache: the ParseCache of parsed lines (the process-wide one if None)
         """
-        self._valid_units = json.load(open("units/units.json"))
+        self._parse_cache = parse_cache if parse_cache is not None else shared_cache("ingredient_parser",
+                                                                                   PARSER_VERSION)
+        # the units and descriptors are those of the unit registry (units/canonical_units.json)
+        self._units = unit_registry()
         # units that can act as descriptors at the end of a listed ingredient
-        self._valid_descriptor_units = json.load(open("units/descriptor_units.json"))
+        self._valid_descriptor_units = self._units.descriptors
+        self._unit_trie, self._unit_ranks = self.build_unit_trie()
+        self._descriptor_units = [(key, unit) for key in self._valid_descriptor_units
+                                  for unit in self._valid_descriptor_units[key]]
         self._ingredient = None
         self._unit = None
         self._amount = 0
@@ -25,49 +36,89 @@ class IngredientParser:
         :param unparsed_ingredient: one of the unparsed ingredients of the recipe
             e.g. 4 tablespoons olive oil
         Good luck!
+        :return: dictionary of the unit, amount and name of the ingredient
         """
         print("Full Ingredient:", unparsed_ingredient)
-        ingredient_dict = {"unit": None, "amount": None, "name": None}
-        ingredient_dict["unit"], inds, found_unit = self.find_ingredient_unit(unparsed_ingredient)
-        start_ind, end_ind = inds
-        ingredient_dict["name"] = self.find_ingredient_name(found_unit, unparsed_ingredient, end_ind)
-        ingredient_dict["amount"] = self.find_ingredient_amount(found_unit, unparsed_ingredient, start_ind, end_ind)
-        # Make sure amount isn't in name
-        if ingredient_dict["amount"] + ' ' in ingredient_dict["name"]:
-            ingredient_dict["name"] = ingredient_dict["name"].replace(ingredient_dict["amount"] + ' ', '')
+        ingredient_dict = self._parse_cache.get(unparsed_ingredient)
+        if ingredient_dict is None:
+            ingredient_dict = {"unit": None, "amount": None, "name": None}
+            ingredient_dict["unit"], inds, found_unit = self.find_ingredient_unit(unparsed_ingredient)
+            start_ind, end_ind = inds
+            ingredient_dict["name"] = self.find_ingredient_name(found_unit, unparsed_ingredient, end_ind)
+            ingredient_dict["amount"] = self.find_ingredient_amount(found_unit, unparsed_ingredient, start_ind, end_ind)
+            # Make sure amount isn't in name
+            if ingredient_dict["amount"] + ' ' in ingredient_dict["name"]:
+                ingredient_dict["name"] = ingredient_dict["name"].replace(ingredient_dict["amount"] + ' ', '')
+            self._parse_cache.put(unparsed_ingredient, ingredient_dict)
         print("Ingredient Dict:", ingredient_dict, '\n')
+        return ingredient_dict
 
     def find_ingredient_unit(self, unparsed_ingredient):
         """
         Find the unit in the full ingredient
+        Units are tried longest alias first, and each unit in the formats after_dash,
+        surround_by_spaces, in_parentheses, right_beside_num; the first unit found in any format wins
         :param unparsed_ingredient: a full ingredient of the recipe
         :return:
-            1. the parent unit (str) (None if no unit)
+            1. the parent unit (str), the canonical unit of the registry or a descriptor (None if no unit)
             2. the unit span, tuple of the start and end indices of the unit in the full ingredient string
             3. the found version of the unit (i.e. not the parent unit)
         """
         # search for valid unit
-        # unit_formats = [surround_by_spaces, in_parentheses]
-        for key in self._valid_units:
-            for unit in self._valid_units[key]:
-                matches = [self.after_dash(unit, unparsed_ingredient),
-                self.surround_by_spaces(unit, unparsed_ingredient),
-                self.in_parentheses(unit, unparsed_ingredient),
-                self.right_beside_num(unit, unparsed_ingredient)]
-                matches = [m for m in matches if m]  # Get matches
-                try:
-                    match = matches[0]  # Get first match
-                    return key, match.span(1), unit  # return the parent unit is "key"
-                except IndexError:  # no match
-                    match = None
-        for key in self._valid_descriptor_units:
-            for unit in self._valid_descriptor_units[key]:
-                if unparsed_ingredient.endswith(unit):
-                    return key, (len(unparsed_ingredient)-len(unit), len(unparsed_ingredient)), unit  # the parent descriptor unit is "key"
-                elif unparsed_ingredient.startswith(unit):
-                    return key, (0, len(unit)), unit   # the parent descriptor unit is "key"
+        occurrences = self.find_unit_occurrences(unparsed_ingredient)
+        for unit in sorted(occurrences, key=lambda u: self._unit_ranks[u][0]):
+            spans = occurrences[unit]
+            span = (self.after_dash(spans, unparsed_ingredient) or
+                    self.surround_by_spaces(spans, unparsed_ingredient) or
+                    self.in_parentheses(spans, unparsed_ingredient) or
+                    self.right_beside_num(spans, unparsed_ingredient))
+            if span:
+                return self._unit_ranks[unit][1], span, unit  # return the parent unit is "key"
+        for key, unit in self._descriptor_units:
+            if unparsed_ingredient.endswith(unit):
+                return key, (len(unparsed_ingredient)-len(unit), len(unparsed_ingredient)), unit  # the parent descriptor unit is "key"
+            elif unparsed_ingredient.startswith(unit):
+                return key, (0, len(unit)), unit   # the parent descriptor unit is "key"
         return None, (0, 0), None
 
+    def build_unit_trie(self):
+        """
+        Compile the unit aliases of the registry into a character trie, so every unit in an ingredient is found in
+        one pass
+        :return: the trie (nested dicts, a None key holds the unit that ends at that node),
+            dictionary of unit -> (priority, parent unit) where a lower priority is tried first: longer aliases
+            first (fl oz before oz), then in the order of the registry
+        """
+        aliases = {}
+        for key, key_aliases in self._units.unit_aliases.items():
+            for unit in key_aliases:
+                aliases.setdefault(unit, key)  # listed again under another parent, the first listing wins
+        trie, ranks = {}, {}
+        for unit in sorted(aliases, key=lambda alias: -len(alias)):
+            ranks[unit] = (len(ranks), aliases[unit])
+            node = trie
+            for c in unit:
+                node = node.setdefault(c, {})
+            node[None] = unit
+        return trie, ranks
+
+    def find_unit_occurrences(self, unparsed_ingredient):
+        """
+        Find every occurrence of every unit in the ingredient with a single walk of the unit trie
+        :param unparsed_ingredient: a full ingredient of the recipe
+        :return: dictionary of unit -> list of (start, end) spans, in order of appearance
+        """
+        occurrences = {}
+        for i in range(len(unparsed_ingredient)):
+            node = self._unit_trie
+            for j in range(i, len(unparsed_ingredient)):
+                node = node.get(unparsed_ingredient[j])
+                if node is None:
+                    break
+                if None in node:
+                    occurrences.setdefault(node[None], []).append((i, j + 1))
+        return occurrences
+
     def find_ingredient_name(self, unit, unparsed_ingredient, ind):
         """
         Find just the ingredient name in the full, unparsed ingredient
@@ -140,52 +191,83 @@ class IngredientParser:
             raise Exception("Could not find ingredient amount: ", unparsed_ingredient)
 
 
-    def surround_by_spaces(self, unit, unparsed_ingredient):
+    def surround_by_spaces(self, spans, unparsed_ingredient):
         """
         Units can be formatted in a variety of ways in a recipe
         This one checks to see if the unit is surrounded by spaces
-        :param unit: a valid unit
+        :param spans: the spans of one unit in the full ingredient, in order of appearance
         :param unparsed_ingredient: a full ingredient of the recipe
-        :return: a match object for the regular expression
+        :return: the span of the first occurrence in this format (None if there is none)
         """
-        unit = unit.replace('.', "\.")
-        return re.search("\d*\s(" + unit + ")\s", unparsed_ingredient)
+        for start, end in spans:
+            if 0 < start and end < len(unparsed_ingredient) and \
+                    unparsed_ingredient[start-1].isspace() and unparsed_ingredient[end].isspace():
+                return start, end
+        return None
 
-    def in_parentheses(self, unit, unparsed_ingredient):
+    def in_parentheses(self, spans, unparsed_ingredient):
         """
         Units can be formatted in a variety of ways in a recipe
         This one checks to see if the unit in parentheses next to the amount
-        :param unit: a valid unit
+          e.g. (~8 oz)
+        :param spans: the spans of one unit in the full ingredient, in order of appearance
         :param unparsed_ingredient: a full ingredient of the recipe
-        :return: a match object for the regular expression
+        :return: the span of the first occurrence in this format (None if there is none)
         """
-        unit = unit.replace('.', "\.")
-        return re.search("\(~?\d*\.?\d*\s?(" + unit + ")\)", unparsed_ingredient)
+        for start, end in spans:
+            if end >= len(unparsed_ingredient) or unparsed_ingredient[end] != ')':
+                continue
+            # walk back over "(~1.5 " to the opening parenthesis
+            i = start - 1
+            if i >= 0 and unparsed_ingredient[i].isspace():
+                i -= 1
+            while i >= 0 and unparsed_ingredient[i].isdecimal():
+                i -= 1
+            if i >= 0 and unparsed_ingredient[i] == '.':
+                i -= 1
+                while i >= 0 and unparsed_ingredient[i].isdecimal():
+                    i -= 1
+            if i >= 0 and unparsed_ingredient[i] == '~':
+                i -= 1
+            if i >= 0 and unparsed_ingredient[i] == '(':
+                return start, end
+        return None
 
-    def right_beside_num(self, unit, unparsed_ingredient):
+    def right_beside_num(self, spans, unparsed_ingredient):
         """
         Units can be formatted in a variety of ways in a recipe
         This one checks to see if the unit is right next to the amount number
           e.g. 1lb
-        :param unit: a valid unit
+        :param spans: the spans of one unit in the full ingredient, in order of appearance
         :param unparsed_ingredient: a full ingredient of the recipe
-        :return: a match object for the regular expression
+        :return: the span of the first occurrence in this format (None if there is none)
         """
-        unit = unit.replace('.', "\.")
-        return re.search("\d+(" + unit + ")\s", unparsed_ingredient)
+        for start, end in spans:
+            if 0 < start and end < len(unparsed_ingredient) and \
+                    unparsed_ingredient[start-1].isdecimal() and unparsed_ingredient[end].isspace():
+                return start, end
+        return None
 
-    def after_dash(self, unit, unparsed_ingredient):
+    def after_dash(self, spans, unparsed_ingredient):
         """
         Units can be formatted in a variety of ways in a recipe
         This one checks to see if the unit and number occurs after a dash
           e.g. -- 1/2 T
-        :param unit: a valid unit
+        :param spans: the spans of one unit in the full ingredient, in order of appearance
         :param unparsed_ingredient: a full ingredient of the recipe
-        :return: a match object for the regular expression
+        :return: the span of the last occurrence after the first dash it follows on the same line
+            (None if there is none)
         """
-        unit = unit.replace('.', "\.")
-        return re.search("[\u2013]+.+(" + unit + ')', unparsed_ingredient)
-
+        dash = unparsed_ingredient.find('\u2013')
+        while dash != -1:
+            line_end = unparsed_ingredient.find('\n', dash)
+            if line_end == -1:
+                line_end = len(unparsed_ingredient)
+            after = [(start, end) for start, end in spans if start >= dash + 2 and end <= line_end]
+            if after:
+                return after[-1]
+            dash = unparsed_ingredient.find('\u2013', dash + 1)
+        return None
 
     def parse_for_amount(self, parsed_ingredient):
         """
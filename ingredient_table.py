@@ -0,0 +1,170 @@
+import numpy as np
+from ingredient import Ingredient, NUTRIENTS
+
+NUTRIENT_COLUMNS = [nutrient + "_per_unit" for nutrient in NUTRIENTS]
+
+
+class IngredientRow:
+    """
+    A view of one row of an IngredientTable, read and written like an Ingredient without copying the row out
+    """
+
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    @property
+    def id(self):
+        return self._table.ids[self._i]
+
+    @property
+    def name(self):
+        return self._table.names[self._i]
+
+    @property
+    def default_unit(self):
+        return self._table.default_units[self._i]
+
+    @property
+    def nutrients(self):
+        """
+        The nutrient values of the row (a numpy view, NaN for unknown values)
+        """
+        return self._table.nutrients[self._i]
+
+    def __getattr__(self, column):
+        if column in self._table.column_index:
+            value = self._table.nutrients[self._i, self._table.column_index[column]]
+            return None if np.isnan(value) else float(value)
+        raise AttributeError(f"IngredientRow has no attribute {column}")
+
+    def __setattr__(self, column, value):
+        if column in IngredientRow.__slots__:
+            object.__setattr__(self, column, value)
+        elif column in self._table.column_index:
+            self._table.nutrients[self._i, self._table.column_index[column]] = np.nan if value is None else value
+        else:
+            raise AttributeError(f"IngredientRow has no attribute {column}")
+
+    def to_ingredient(self):
+        """
+        Copy the row out as an Ingredient object
+        """
+        return self._table.ingredient(self._i)
+
+
+class IngredientTable:
+    """
+    Many ingredients stored column by column: the nutrient values of all of them in one float64 block (ingredients x
+    nutrients, NaN for unknown values), their ids in an int64 array and their names and default units in lists
+    The whole ingredient catalogue then costs about 8 bytes per nutrient value instead of an object per ingredient,
+    and the block can be handed to numpy as is (see MacroCalculator)
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        Initialize an empty table
+        :param capacity: the number of rows to allocate up front (the table grows as needed)
+        """
+        self.column_index = {column: j for j, column in enumerate(NUTRIENT_COLUMNS)}
+        self._n = 0
+        self._nutrients = np.full((capacity, len(NUTRIENT_COLUMNS)), np.nan)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self.names = []
+        self.default_units = []
+        self._row_index = None
+
+    @classmethod
+    def from_ingredients(cls, ingredients):
+        """
+        Build a table from Ingredient objects
+        :param ingredients: list of Ingredient objects
+        """
+        return cls.from_rows(
+            [(ingredient.id, ingredient.name, *(getattr(ingredient, column) for column in NUTRIENT_COLUMNS),
+              ingredient.default_unit) for ingredient in ingredients])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a table from database rows
+        :param rows: list of (id, name, <16 nutrient columns>, default_unit) tuples, as in the ingredients table
+        """
+        table = cls(max(len(rows), 1))
+        for row in rows:
+            table.append(row[0], row[1], row[2:-1], row[-1])
+        return table
+
+    def __len__(self):
+        return self._n
+
+    def append(self, id, name, nutrients, default_unit):
+        """
+        Add an ingredient, doubling the storage when it is full
+        :param id: the id of the ingredient (None for an ingredient not in the database yet, stored as -1)
+        :param name: the name of the ingredient
+        :param nutrients: the 16 nutrient values in NUTRIENT_COLUMNS order (None for unknown values)
+        :param default_unit: the unit the nutrient values are given per
+        :return: the row index of the ingredient
+        """
+        if self._n == len(self._ids):
+            nutrients, ids = self._nutrients, self._ids
+            self._nutrients = np.full((2 * len(ids), len(NUTRIENT_COLUMNS)), np.nan)
+            self._nutrients[:self._n] = nutrients
+            self._ids = np.zeros(2 * len(ids), dtype=np.int64)
+            self._ids[:self._n] = ids
+        i = self._n
+        self._nutrients[i] = [np.nan if value is None else float(value) for value in nutrients]
+        self._ids[i] = -1 if id is None else id
+        self.names.append(name)
+        self.default_units.append(default_unit)
+        self._n += 1
+        self._row_index = None
+        return i
+
+    @property
+    def nutrients(self):
+        """
+        The nutrient block (a view of the filled rows)
+        """
+        return self._nutrients[:self._n]
+
+    @property
+    def ids(self):
+        """
+        The ingredient ids (a view of the filled rows)
+        """
+        return self._ids[:self._n]
+
+    def index_of(self, id):
+        """
+        Get the row index of an ingredient id
+        :return: the row index, None if the id isn't in the table
+        """
+        if self._row_index is None:
+            self._row_index = {int(row_id): i for i, row_id in enumerate(self.ids.tolist())}
+        return self._row_index.get(id)
+
+    def row(self, i):
+        """
+        Get a view of row i
+        """
+        if not 0 <= i < self._n:
+            raise IndexError(f"Ingredient row {i} is out of range")
+        return IngredientRow(self, i)
+
+    def __getitem__(self, i):
+        return self.row(i)
+
+    def __iter__(self):
+        return (IngredientRow(self, i) for i in range(self._n))
+
+    def ingredient(self, i):
+        """
+        Copy row i out as an Ingredient object
+        """
+        values = [None if np.isnan(value) else value for value in self._nutrients[i].tolist()]
+        row_id = int(self._ids[i])
+        return Ingredient(None if row_id == -1 else row_id, self.names[i], *values, self.default_units[i])
@@ -1,28 +1,191 @@
+from fractions import Fraction
+import math
+import re
+import numpy as np
+from scipy.sparse import coo_matrix
 from ingredient_parser import IngredientParser
+from unit_registry import unit_registry
+from ingredient import NUTRIENTS
+from ingredient_table import IngredientTable
+
+RE_SERVINGS = re.compile(r'\d+(?:\.\d+)?')
 
 
-# TODO: pass everything through the ingredient parser
 class MacroCalculator:
     """
-    Functions to calculate the macros of a meal
+    Functions to calculate the macros of meals
+    The nutrients of the known ingredients are held in one ingredient x nutrient matrix, per gram for ingredients
+    whose default unit is a mass or volume (per default unit for counted ones: eggs, cloves, ...). A meal is a
+    quantity vector over the ingredients, so its totals are one vector-matrix product, and a batch of meals is a
+    sparse meal x ingredient matrix whose product with the nutrient matrix gives every meal's totals at once
     """
 
     def __init__(self, ingredients):
         """
         Initialize the macro calculator
-        :param ingredients: list of ingredient and their measurements (as str)
+        :param ingredients: the ingredients (with ids) the meals are made of, an IngredientTable or list of Ingredient
         """
-        self._ingredients = ingredients
+        self._units = unit_registry()
+        if not isinstance(ingredients, IngredientTable):
+            ingredients = IngredientTable.from_ingredients(ingredients)
+        self._table = ingredients
+        self.ingredient_index = {ingredient_id: k for k, ingredient_id in enumerate(ingredients.ids.tolist())}
+        # grams in one default unit of each ingredient, NaN when the default unit is counted
+        self.default_unit_grams = np.array(
+            [self._units.to_grams(1, default_unit, name) or math.nan
+             for name, default_unit in zip(ingredients.names, ingredients.default_units)], dtype=np.float64)
+        self.by_grams = ~np.isnan(self.default_unit_grams)
+        self.nutrient_matrix = np.nan_to_num(ingredients.nutrients, nan=0.0)
+        self.nutrient_matrix[self.by_grams] /= self.default_unit_grams[self.by_grams, None]
+        # conversion factor to the base of an ingredient (grams, or its counted unit) per (ingredient, unit)
+        self._factors = {}
 
-    def parse(self):
+    def parse(self, ingredient_lines):
         """
         Parse each of the ingredients for their measurement
-        :return: dictionary of ingredient (str) -> value + unit of measurement (str)
+        :param ingredient_lines: list of ingredients and their measurements (list of str)
+        :return: list of dictionaries of the name, amount (float), unit and grams (None if not convertible)
         """
         parser = IngredientParser()
-        
+        parsed = []
+        for line in ingredient_lines:
+            parsed_line = parser.parse(line)
+            amount = self.parse_amount(parsed_line["amount"])
+            parsed.append({"name": parsed_line["name"], "amount": amount, "unit": parsed_line["unit"],
+                           "grams": self._units.to_grams(amount, parsed_line["unit"], parsed_line["name"])})
+        return parsed
+
+    @staticmethod
+    def parse_amount(amount):
+        """
+        Turn an amount found by the ingredient parser into a number
+        :param amount: the amount (str) e.g. 1/2, 1 1/2, 2.5
+        :return: the amount (float), None if it isn't a number
+        """
+        try:
+            return float(sum(Fraction(part) for part in amount.split()))
+        except (ValueError, ZeroDivisionError, AttributeError):
+            return None
+
+    @staticmethod
+    def parse_servings(servings):
+        """
+        Get the number of servings of a meal, like meal_macros does (the first number in the servings text)
+        :return: the servings (float), NaN if unknown
+        """
+        match = RE_SERVINGS.search(str(servings)) if servings is not None else None
+        return float(match.group(0)) if match else math.nan
+
+    def factor(self, k, unit):
+        """
+        Get the factor turning a quantity of ingredient k in the given unit into the base of the ingredient
+        :param k: the row of the ingredient in the nutrient matrix
+        :param unit: the unit of the quantity (None for the default unit)
+        :return: the factor (float), NaN if the unit doesn't convert
+        """
+        key = (k, unit)
+        if key not in self._factors:
+            name, default_unit = self._table.names[k], self._table.default_units[k]
+            if self.by_grams[k]:
+                factor = self._units.to_grams(1, unit or default_unit, name)
+            elif not unit or self._units.same_unit(unit, default_unit):
+                factor = 1.0
+            else:
+                factor = None
+            self._factors[key] = math.nan if factor is None else factor
+        return self._factors[key]
+
+    def quantity_vector(self, meal_ingredients):
+        """
+        Build the quantity vector of a meal
+        :param meal_ingredients: list of (ingredient id, quantity, unit) tuples
+        :return: numpy vector over the ingredients of the quantities in grams (in units for counted ingredients);
+            ingredients missing from the table are left out
+        """
+        quantities = np.zeros(len(self._table))
+        for ingredient_id, quantity, unit in meal_ingredients:
+            k = self.ingredient_index.get(ingredient_id)
+            if k is None:
+                continue
+            factor = self.factor(k, unit)
+            if not math.isnan(factor):
+                quantities[k] += float(quantity) * factor
+        return quantities
+
+    def meal_macros(self, meal_ingredients, servings=None):
+        """
+        Calculate the macros of one meal
+        Quantities whose unit doesn't convert to the base of their ingredient, and ingredients missing from the
+        table, are left out of the totals
+        :param meal_ingredients: list of (ingredient id, quantity, unit) tuples
+        :param servings: the servings of the meal
+        :return: dictionary of total_<nutrient> and <nutrient>_per_serving -> value (NaN per serving if unknown)
+        """
+        totals = self.quantity_vector(meal_ingredients) @ self.nutrient_matrix
+        return self.as_dict(totals, self.parse_servings(servings))
+
+    def sparse_quantities(self, bridge_rows, meal_ids=None):
+        """
+        Build the sparse meal x ingredient quantity matrix of a batch of meals, in coordinate form
+        :param bridge_rows: list of (meal id, ingredient id, quantity, unit) tuples
+        :param meal_ids: the meals, in the order of the matrix rows (the meals of bridge_rows if None)
+        :return: (meal ids, meal row per entry, ingredient column per entry, quantity per entry) tuple; rows of
+            meals not in meal_ids are left out, the quantity is NaN for units that don't convert and ingredients
+            missing from the table (column -1)
+        """
+        if meal_ids is None:
+            meal_ids = list(dict.fromkeys(meal_id for meal_id, _, _, _ in bridge_rows))
+        meal_index = {meal_id: m for m, meal_id in enumerate(meal_ids)}
+        bridge_rows = [row for row in bridge_rows if row[0] in meal_index]
+        rows = np.fromiter((meal_index[row[0]] for row in bridge_rows), dtype=np.int64, count=len(bridge_rows))
+        cols = np.fromiter((self.ingredient_index.get(row[1], -1) for row in bridge_rows), dtype=np.int64,
+                           count=len(bridge_rows))
+        quantities = np.fromiter((float(row[2]) * self.factor(k, row[3]) if k >= 0 else math.nan
+                                  for k, row in zip(cols, bridge_rows)), dtype=np.float64, count=len(bridge_rows))
+        return meal_ids, rows, cols, quantities
+
+    def batch_macros(self, bridge_rows, servings=None, meal_ids=None):
+        """
+        Calculate the macros of a batch of meals (e.g. the whole meal history) in one sparse matrix product
+        Quantities whose unit doesn't convert to the base of their ingredient, and ingredients missing from the
+        table, are left out of the totals
+        :param bridge_rows: list of (meal id, ingredient id, quantity, unit) tuples
+        :param servings: dictionary of meal id -> servings (meals without servings get NaN per serving)
+        :param meal_ids: the meals, in the order of the result rows (the meals of bridge_rows if None)
+        :return: (meal ids, totals (meals x nutrients), per serving (meals x nutrients), number of rows left out
+            per meal) tuple
+        """
+        meal_ids, rows, cols, quantities = self.sparse_quantities(bridge_rows, meal_ids)
+        known = ~np.isnan(quantities)
+        skipped = np.bincount(rows[~known], minlength=len(meal_ids))
+        # repeated (meal, ingredient) entries are summed
+        quantity_matrix = coo_matrix((quantities[known], (rows[known], cols[known])),
+                                     shape=(len(meal_ids), len(self._table))).tocsr()
+        totals = np.asarray(quantity_matrix @ self.nutrient_matrix)
+        servings = servings or {}
+        n_servings = np.array([self.parse_servings(servings.get(meal_id)) for meal_id in meal_ids])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            per_serving = totals / np.where(n_servings > 0, n_servings, np.nan)[:, None]
+        return meal_ids, totals, per_serving, skipped
+
+    @staticmethod
+    def as_dict(totals, servings):
+        """
+        Name the nutrient values of one meal like the meal_macros columns
+        :param totals: vector of the nutrient totals
+        :param servings: the number of servings (NaN if unknown)
+        """
+        macros = {f"total_{nutrient}": float(total) for nutrient, total in zip(NUTRIENTS, totals)}
+        for nutrient, total in zip(NUTRIENTS, totals):
+            macros[f"{nutrient}_per_serving"] = float(total / servings) if servings > 0 else math.nan
+        return macros
 
 
 if __name__ == "__main__":
-    test_list = ["1/2 cup of skim milk", "3 large eggs", "1 potato", "2 tablespoons of frank's red hot sauce"]
-    calculator = MacroCalculator(test_list)
+    from ingredient import Ingredient
+    pantry = [Ingredient(id=1, name="skim milk", calories_per_unit=0.34, protein_per_unit=0.034, carbs_per_unit=0.05,
+                         fat_per_unit=0.001, default_unit="g"),
+              Ingredient(id=2, name="egg", calories_per_unit=72, protein_per_unit=6.3, carbs_per_unit=0.4,
+                         fat_per_unit=4.8, default_unit="egg")]
+    calculator = MacroCalculator(pantry)
+    print(calculator.meal_macros([(1, 0.5, "cup"), (2, 3, None)], servings="2 servings"))
@@ -5,8 +5,11 @@ class Meal(object):
     A meal object
     """
 
+    __slots__ = ("_id", "_name", "_description", "_servings", "_serving_size", "_serving_unit", "_recipe_url",
+                 "_created_at", "_website_name")
+
     def __init__(self, id=None, name=None, description=None, servings=None, serving_size=None, serving_unit=None,
-                 recipe_url=None, created_at=None):
+                 recipe_url=None, created_at=None, website_name=None):
         """
         Initialize the meal object
         """
@@ -18,6 +21,7 @@ class Meal(object):
         self._serving_unit = serving_unit
         self._recipe_url = recipe_url
         self._created_at = created_at
+        self._website_name = website_name
 
     def describe(self):
         """
@@ -148,3 +152,18 @@ class Meal(object):
         :parameter created_at: the new created_at
         """
         self._created_at = created_at
+
+    @property
+    def website_name(self):
+        """
+        Get the name of the recipe website the meal was found on
+        """
+        return self._website_name
+
+    @website_name.setter
+    def website_name(self, website_name):
+        """
+        Set the recipe website name
+        :parameter website_name: the new website name
+        """
+        self._website_name = website_name
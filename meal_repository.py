@@ -1,7 +1,10 @@
 from database_utility import DatabaseUtility
+from psycopg2.extras import execute_values, RealDictCursor
 from meal import Meal
+from ingredient import Ingredient, NUTRIENTS
+from unit_registry import unit_registry
 import datetime
-import time
+import math
 
 
 class MealRepository:
@@ -11,19 +14,271 @@ class MealRepository:
         Initialize database connection
         """
         self.db_conn = db_conn
+        self.meal_columns = "id, name, description, servings, serving_size, serving_unit, recipe_url, created_at"
+        self.ingredient_columns = [
+            "name", "calories_per_unit", "protein_per_unit", "carbs_per_unit", "fat_per_unit", "fiber_per_unit",
+            "sugar_per_unit", "saturated_fat_per_unit", "trans_fat_per_unit", "cholesterol_mg_per_unit",
+            "sodium_mg_per_unit", "potassium_mg_per_unit", "calcium_mg_per_unit", "iron_mg_per_unit",
+            "vitamin_a_ug_per_unit", "vitamin_c_mg_per_unit", "vitamin_d_ug_per_unit", "default_unit"
+        ]
 
     def insert(self, meal: Meal) -> Meal:
         """
-        Insert a meal into the database
+        Insert a meal into the database, with its meal_macros row
         """
         created_at = datetime.datetime.now()
-        insert_statement = """
-            INSERT INTO meals (name, description, servings, serving_size, serving_unit, recipe_url, created_at)
-            VALUES (\'{}\', \'{}\', \'{}\', {}, \'{}\', \'{}\', \'{}\')
-            RETURNING id
-            """.format(meal.name, meal.description, meal.servings, meal.serving_size, meal.serving_unit,
-                       meal.recipe_url, created_at)
-        row_id = self.db_conn.execute_statement(insert_statement)
-        meal.id = row_id
+        with self.db_conn.transaction() as cur:
+            self.db_conn.execute_prepared(
+                cur, "insert_meal",
+                """
+                INSERT INTO meals (name, description, servings, serving_size, serving_unit, recipe_url, created_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                RETURNING id
+                """,
+                (meal.name, meal.description, meal.servings, meal.serving_size, meal.serving_unit,
+                 meal.recipe_url, created_at))
+            meal.id = cur.fetchone()[0]
+            cur.execute("SELECT refresh_meal_macros();")
         meal.created_at = created_at
-        return meal
\ No newline at end of file
+        return meal
+
+    def find_by_name(self, meal_name: str):
+        """
+        Find a meal by name, ignoring case and extra whitespace
+        :param meal_name: the name of the meal (str)
+        :return: the meal object, None if there is no such meal
+        """
+        with self.db_conn.transaction() as cur:
+            self.db_conn.execute_prepared(
+                cur, "find_meal_by_name",
+                f"SELECT {self.meal_columns} FROM meals WHERE name_normalized = normalize_name($1)",
+                (meal_name,))
+            row = cur.fetchone()
+        return Meal(*row) if row else None
+
+    def name_keys(self, meal_names: list):
+        """
+        Normalize meal names with the normalize_name() function of the database (the one the unique name index is
+        built on, Python's lower() and whitespace differ from it for some names) and find which are taken, in one query
+        :param meal_names: list of meal names
+        :return: dictionary of name -> (normalized name, whether a meal has that normalized name)
+        """
+        with self.db_conn.transaction() as cur:
+            cur.execute("""
+                SELECT n.name, normalize_name(n.name),
+                       EXISTS (SELECT 1 FROM meals m WHERE m.name_normalized = normalize_name(n.name))
+                FROM unnest(%s::TEXT[]) AS n(name);
+                """, (list({name for name in meal_names if name}),))
+            return {name: (normalized, exists) for name, normalized, exists in cur.fetchall()}
+
+    def insert_many(self, meals: list) -> list:
+        """
+        Insert a batch of meals in one transaction and one statement per page of rows
+        :param meals: list of meal objects (without id and created_at)
+        :return: the meals, with their generated ids and created_at filled in
+        """
+        return self.insert_meal_graphs([(meal, []) for meal in meals])
+
+    def insert_meal_graph(self, meal: Meal, meal_ingredients: list) -> Meal:
+        """
+        Insert a meal, its new ingredients and its meal_ingredient_bridge rows in one transaction
+        :param meal: the meal object (without id and created_at)
+        :param meal_ingredients: list of (Ingredient, quantity, unit) tuples; ingredients without an id are inserted
+        :return: the meal, with its generated id and created_at filled in
+        """
+        return self.insert_meal_graphs([(meal, meal_ingredients)])[0]
+
+    def insert_meal_graphs(self, graphs: list) -> list:
+        """
+        Insert a batch of meals with their ingredients and bridge rows in one transaction, using multi-row
+        INSERT ... VALUES statements (execute_values) so each table costs one round trip per page of rows
+        The meal_macros rows of the meals are refreshed in the same transaction. If it fails, the ids filled in are
+        cleared again, so the same graphs can be retried
+        :param graphs: list of (meal, [(Ingredient, quantity, unit), ...]) tuples
+        :return: the meals, with their generated ids and created_at filled in
+        """
+        if not graphs:
+            return []
+        created_at = datetime.datetime.now()
+        meals = [meal for meal, _ in graphs]
+        # the same Ingredient object may be shared by several meals, only insert it once
+        new_ingredients = list({id(ingredient): ingredient for _, meal_ingredients in graphs
+                                for ingredient, _, _ in meal_ingredients if ingredient.id is None}.values())
+        try:
+            self._insert_meal_graphs(graphs, meals, new_ingredients, created_at)
+        except BaseException:
+            for item in meals + new_ingredients:
+                item.id = None
+            for meal in meals:
+                meal.created_at = None
+            raise
+        return meals
+
+    def _insert_meal_graphs(self, graphs, meals, new_ingredients, created_at):
+        """
+        Run the inserts of insert_meal_graphs in one transaction
+        """
+        with self.db_conn.transaction() as cur:
+            meal_ids = execute_values(
+                cur,
+                """
+                INSERT INTO meals (name, description, servings, serving_size, serving_unit, recipe_url, created_at)
+                VALUES %s RETURNING id
+                """,
+                [(meal.name, meal.description, meal.servings, meal.serving_size, meal.serving_unit,
+                  meal.recipe_url, created_at) for meal in meals],
+                fetch=True)
+            for meal, (meal_id,) in zip(meals, meal_ids):
+                meal.id = meal_id
+                meal.created_at = created_at
+            if new_ingredients:
+                ingredient_ids = execute_values(
+                    cur,
+                    f"INSERT INTO ingredients ({', '.join(self.ingredient_columns)}) VALUES %s RETURNING id",
+                    [tuple(getattr(ingredient, column) for column in self.ingredient_columns)
+                     for ingredient in new_ingredients],
+                    fetch=True)
+                for ingredient, (ingredient_id,) in zip(new_ingredients, ingredient_ids):
+                    ingredient.id = ingredient_id
+            bridge_rows = self.bridge_rows(graphs)
+            if bridge_rows:
+                execute_values(cur, "INSERT INTO meal_ingredient_bridge (meal_id, ingredient_id, quantity, unit) "
+                                    "VALUES %s", bridge_rows)
+            cur.execute("SELECT refresh_meal_macros();")
+
+    def bridge_rows(self, graphs: list):
+        """
+        Build the meal_ingredient_bridge rows, adding up the quantities of an ingredient listed twice in a meal
+        Quantities are stored in the default unit of their ingredient when the units convert (see normalize_quantity);
+        the ones that don't are stored in their own unit, reported, and left out of the macro totals (counted in
+        meal_macros.skipped_rows)
+        :param graphs: list of (meal, [(Ingredient, quantity, unit), ...]) tuples, with ids filled in
+        :return: list of (meal_id, ingredient_id, quantity, unit) tuples
+        """
+        rows = {}
+        for meal, meal_ingredients in graphs:
+            for ingredient, quantity, unit in meal_ingredients:
+                quantity, unit = self.normalize_quantity(ingredient, quantity, unit)
+                if unit is not None and unit != ingredient.default_unit:
+                    print(f"{quantity} {unit} of {ingredient.name} can't be converted to {ingredient.default_unit}, "
+                          f"it is left out of the macros of meal {meal.name}")
+                key = (meal.id, ingredient.id)
+                if key not in rows:
+                    rows[key] = [meal.id, ingredient.id, quantity, unit]
+                elif rows[key][3] != unit:
+                    raise Exception(f"Ingredient {ingredient.name} is listed in both {rows[key][3]} and {unit} "
+                                    f"for meal {meal.name}")
+                else:
+                    rows[key][2] += quantity
+        return [tuple(row) for row in rows.values()]
+
+    @staticmethod
+    def normalize_quantity(ingredient, quantity, unit):
+        """
+        Convert a quantity to the default unit of its ingredient, which its *_per_unit macros are given in
+        (volumes and masses convert through the density of the ingredient; counted units are left as they are)
+        :param ingredient: the Ingredient
+        :param quantity: the quantity
+        :param unit: the unit of the quantity
+        :return: (quantity, unit) tuple, in the unit given when it doesn't convert
+        """
+        if not ingredient.default_unit or not unit:
+            return quantity, unit
+        units = unit_registry()
+        # units the registry doesn't know (e.g. egg) are only the same unit by name
+        if units.same_unit(unit, ingredient.default_unit):
+            return quantity, ingredient.default_unit
+        target = units.canonical(ingredient.default_unit)
+        if target is None:
+            return quantity, unit
+        converted = units.convert(quantity, unit, target, ingredient.name)
+        if converted is None:
+            return quantity, unit
+        return converted, ingredient.default_unit
+
+    def refresh_macros(self):
+        """
+        Recompute the meal_macros rows of the meals whose ingredients, quantities or servings changed
+        The insert methods refresh their meals, call this after changing rows any other way (e.g. editing the
+        ingredients table)
+        :return: number of meals refreshed
+        """
+        with self.db_conn.transaction() as cur:
+            cur.execute("SELECT refresh_meal_macros();")
+            return cur.fetchone()[0]
+
+    def get_macros(self, meal_ids: list):
+        """
+        Get the precomputed macro totals and per-serving values of meals
+        Read only: the rollups are refreshed when meals are written (see refresh_macros)
+        :param meal_ids: list of meal ids
+        :return: dictionary of meal id -> dictionary of meal_macros columns (skipped_rows counts the ingredients
+            left out of the totals because their unit isn't the default unit of the ingredient)
+        """
+        with self.db_conn.transaction(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM meal_macros WHERE meal_id = ANY(%s);", (list(meal_ids),))
+            return {row["meal_id"]: dict(row) for row in cur.fetchall()}
+
+    def all_ingredients(self) -> list:
+        """
+        Get every ingredient in the database
+        :return: list of Ingredient objects
+        """
+        with self.db_conn.transaction() as cur:
+            cur.execute(f"SELECT id, {', '.join(self.ingredient_columns)} FROM ingredients;")
+            return [Ingredient(row[0], *row[1:]) for row in cur.fetchall()]
+
+    def ingredient_names(self) -> list:
+        """
+        Get the id and name of every ingredient in the database, for the in-memory IngredientIndex
+        :return: list of (id, name) tuples, in id order
+        """
+        with self.db_conn.transaction() as cur:
+            cur.execute("SELECT id, name FROM ingredients ORDER BY id;")
+            return cur.fetchall()
+
+    def ingredient_table(self) -> "IngredientTable":
+        """
+        Get every ingredient in the database in columnar form
+        :return: the IngredientTable
+        """
+        # numpy is only loaded for the macro computations, not every meal lookup
+        from ingredient_table import IngredientTable
+        with self.db_conn.transaction() as cur:
+            cur.execute(f"SELECT id, {', '.join(self.ingredient_columns)} FROM ingredients;")
+            return IngredientTable.from_rows(cur.fetchall())
+
+    def recompute_all_macros(self) -> int:
+        """
+        Recompute the meal_macros rows of every meal, e.g. after the nutrient data of the ingredients was updated,
+        with one sparse matrix product over the whole meal history (MacroCalculator.batch_macros) and one
+        INSERT ... VALUES statement per page of rows, instead of the per-meal SQL aggregation of refresh_macros
+        Like refresh_meal_macros(), rows whose unit doesn't convert to the default unit of their ingredient are left
+        out of the totals and counted in skipped_rows
+        :return: number of meals recomputed
+        """
+        from macro_calculator import MacroCalculator
+        ingredients = self.ingredient_table()
+        with self.db_conn.transaction() as cur:
+            cur.execute("SELECT meal_id, ingredient_id, quantity, unit FROM meal_ingredient_bridge;")
+            bridge_rows = cur.fetchall()
+            cur.execute("SELECT id, servings FROM meals;")
+            servings = dict(cur.fetchall())
+            meal_ids, totals, _, skipped = MacroCalculator(ingredients).batch_macros(bridge_rows, servings,
+                                                                                      list(servings))
+            total_columns = [f"total_{nutrient}" for nutrient in NUTRIENTS] + ["skipped_rows"]
+            rows = []
+            for meal_id, meal_totals, n_skipped in zip(meal_ids, totals.tolist(), skipped.tolist()):
+                n_servings = MacroCalculator.parse_servings(servings[meal_id])
+                rows.append((meal_id, None if math.isnan(n_servings) else n_servings, *meal_totals, n_skipped))
+            if rows:
+                execute_values(
+                    cur,
+                    f"""
+                    INSERT INTO meal_macros (meal_id, servings, {', '.join(total_columns)}) VALUES %s
+                    ON CONFLICT (meal_id) DO UPDATE SET servings = EXCLUDED.servings,
+                    {', '.join(f"{column} = EXCLUDED.{column}" for column in total_columns)}, refreshed_at = now()
+                    """,
+                    rows, page_size=1000)
+            cur.execute("DELETE FROM meal_macros_dirty WHERE meal_id = ANY(%s);", (meal_ids,))
+        return len(meal_ids)
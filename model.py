@@ -1,9 +1,10 @@
 from meal import Meal
 from ingredient import Ingredient
-from usda_service import USDAService
 from meal_repository import MealRepository
+from nutrient_cache import NutrientCache
+from fdc_food_index import FdcFoodIndex
+from ingredient_index import IngredientIndex
 from database_utility import DatabaseUtility
-from fitmencook_search import FitMenCook
 from ingredient_parser import IngredientParser
 from flyway import Flyway
 
@@ -11,6 +12,8 @@ from flyway import Flyway
 class Model:
     """
     The model of the Model View Controller (MVC) paradigm
+    Scraping (selenium, BeautifulSoup, requests) and the USDA client (aiohttp) are imported when a meal first has
+    to be found or looked up, so checking for a meal already in the database only needs psycopg2
     """
 
     def __init__(self):
@@ -21,22 +24,31 @@ class Model:
         # Open a database connection
         self._db_util = DatabaseUtility()
         self.creds = self._db_util.get_credentials()
-        self._meal_table_order = self.creds["table_order"].split(',')
         self.run_flyway()
-        self._connection, self._cursor = self._db_util.connect(self.creds)
+        self._db_util.connect(self.creds)
+        self._meal_repository = MealRepository(self._db_util)
         self._meal_list = []
         self._ingredient_parser = IngredientParser()
+        self._nutrient_cache = NutrientCache(self._db_util)
+        self._food_index = FdcFoodIndex(self._db_util)
+        self._ingredient_index = None
 
     def run_flyway(self):
         """
-        Run flyway step for database
+        Run flyway step for database: create it if needed and apply the pending migrations
         """
-        flyway = Flyway()
-        print(f"Creating database {self.creds['app_db']}...")
-        flyway.create_database(self.creds["app_db"])
-        for table in self._meal_table_order:
-            print(f"Creating table {table}...")
-            flyway.create_table(table)
+        flyway = Flyway(self.creds)
+        flyway.run_flyway()
+
+    @property
+    def ingredient_index(self):
+        """
+        The ingredients already in the database, so parsed names resolve without a query or an API call
+        (loaded the first time ingredients are resolved)
+        """
+        if self._ingredient_index is None:
+            self._ingredient_index = IngredientIndex().load(self._meal_repository.ingredient_names())
+        return self._ingredient_index
 
     def check_for_meal(self, meal_name):
         """
@@ -44,14 +56,11 @@ class Model:
         :param meal_name; the name of the meal (str)
         :return: the meal object, exist flag
         """
-        query = "SELECT * FROM meals WHERE UPPER(name) = \'" + meal_name.upper() + "\';"
-        self._cursor.execute(query)
-        row = self._cursor.fetchone()
+        meal = self._meal_repository.find_by_name(meal_name)
         exists = True
-        if not row:  # meal does not exist
-            row = []
+        if not meal:  # meal does not exist
+            meal = Meal()
             exists = False
-        meal = Meal(*row)
         return meal, exists
 
     def find_meal(self, meal):
@@ -60,6 +69,7 @@ class Model:
         :param meal: the meal object that's not already in database (str)
         :return: list of ingredients
         """
+        from fitmencook_search import FitMenCook
         # TODO: Ask user for the website to search
         print("Supported Websites:", self.supported_websites)
         search = FitMenCook(meal)
@@ -77,7 +87,16 @@ class Model:
         Insert the meal into the database
         :param meal: the completed meal (without id and created_at)
         """
-        MealRepository(self._db_util).insert(meal)
+        self._meal_repository.insert(meal)
+
+    def get_meal_macros(self, meal_id):
+        """
+        Get the macro totals and per-serving values of a meal from the precomputed rollup
+        :param meal_id: the id of the meal
+        :return: dictionary of macro name -> value, None if the meal doesn't exist; skipped_rows > 0 means some
+            ingredients couldn't be counted and the totals are partial
+        """
+        return self._meal_repository.get_macros([meal_id]).get(meal_id)
 
     def process_ingredients(self, ingredient_list: list):
         """
@@ -91,14 +110,39 @@ class Model:
     def build_meal(self, meal, ingredients):
         """
         Build the full meal object from the list of ingredients provided and
-        the meal object template. Query the Nutritionix API for nutrition
-        information
+        the meal object template. Ingredients already in the database are resolved
+        through the ingredient index; only the rest are looked up in USDA
         :param meal: the complete meal object
         :param ingredients: list of parsed ingredients (list of dicts)
         :return: the completed meal and ingredient objects
         """
-        usda = USDAService()
-        for ingredient in ingredients:
-            food_info = usda.search_food(ingredient["name"], food_type=ingredient["ingredient_type"])
-            print(ingredient, "---", food_info)
+        import asyncio
+        ingredient_ids = self.resolve_ingredients(ingredients)
+        unresolved = [ingredient for ingredient, ingredient_id in zip(ingredients, ingredient_ids)
+                      if ingredient_id is None]
+        food_infos = iter(asyncio.run(self.lookup_ingredients(unresolved)) if unresolved else [])
+        for ingredient, ingredient_id in zip(ingredients, ingredient_ids):
+            if ingredient_id is not None:
+                print(ingredient, "---", f"ingredient {ingredient_id} ({self.ingredient_index.names[ingredient_id]})")
+            else:
+                print(ingredient, "---", next(food_infos))
         meal.describe()
+
+    def resolve_ingredients(self, ingredients):
+        """
+        Resolve the parsed ingredients to ingredients already in the database
+        :param ingredients: list of parsed ingredients (list of dicts)
+        :return: list of ingredient ids, None for the ingredients that aren't in the database
+        """
+        return [self.ingredient_index.resolve(ingredient["name"]) for ingredient in ingredients]
+
+    async def lookup_ingredients(self, ingredients):
+        """
+        Look up the nutrition information of all the ingredients concurrently
+        :param ingredients: list of parsed ingredients (list of dicts)
+        :return: list of food info, in the same order as the ingredients (None for the ones not found)
+        """
+        from usda_service import AsyncUSDAService
+        async with AsyncUSDAService(self._nutrient_cache, self._food_index) as usda:
+            return await usda.search_foods(
+                [(ingredient["name"], ingredient["ingredient_type"]) for ingredient in ingredients])
@@ -0,0 +1,83 @@
+from database_utility import DatabaseUtility
+from psycopg2.extras import Json
+import re
+
+
+class NutrientCache:
+    """
+    A persistent cache of USDA food search results, stored in the usda_food_cache table
+    Entries are keyed by the normalized search keywords plus the food type and expire after a TTL
+    """
+
+    def __init__(self, db_conn: DatabaseUtility, ttl=30 * 24 * 60 * 60):
+        """
+        Initialize the cache
+        :param db_conn: a connected database utility
+        :param ttl: number of seconds a cached search result stays valid
+        """
+        self.db_conn = db_conn
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_query(food_keywords: str):
+        """
+        Normalize search keywords so "Olive Oil" and "olive  oil," share a cache entry
+        :param food_keywords: the keywords to search for food in USDA database
+        :return: the normalized keywords (str)
+        """
+        return ' '.join(re.sub(r"[^\w%]+", ' ', food_keywords.lower()).split())
+
+    def get(self, food_keywords: str, food_type: str):
+        """
+        Get the cached search result for the keywords
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: the cached list of trimmed foods, None if not cached (or expired)
+            Empty results are misses, so searches that found nothing are tried again
+        """
+        with self.db_conn.transaction() as cur:
+            self.db_conn.execute_prepared(
+                cur, "usda_food_cache_get",
+                """
+                UPDATE usda_food_cache SET hit_count = hit_count + 1
+                WHERE query = $1 AND food_type = $2 AND fetched_at > now() - $3::INTEGER * INTERVAL '1 second'
+                    AND jsonb_array_length(foods) > 0
+                RETURNING foods
+                """,
+                (self.normalize_query(food_keywords), food_type, self.ttl))
+            row = cur.fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, food_keywords: str, food_type: str, foods: list):
+        """
+        Cache a search result
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :param foods: the list of trimmed foods returned by the search
+            Empty results aren't cached: the food may be added to the USDA database later
+        """
+        if not foods:
+            return
+        with self.db_conn.transaction() as cur:
+            self.db_conn.execute_prepared(
+                cur, "usda_food_cache_put",
+                """
+                INSERT INTO usda_food_cache (query, food_type, foods, fetched_at)
+                VALUES ($1, $2, $3, now())
+                ON CONFLICT (query, food_type) DO UPDATE SET foods = EXCLUDED.foods, fetched_at = EXCLUDED.fetched_at
+                """,
+                (self.normalize_query(food_keywords), food_type, Json(foods)))
+
+    def stats(self):
+        """
+        Get the hit/miss counters of this cache instance
+        :return: dictionary of hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
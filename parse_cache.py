@@ -0,0 +1,156 @@
+from collections import OrderedDict
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+# directory the shared parse caches persist to between runs (unset: in memory only)
+PARSE_CACHE_DIR_ENV = "MEALLOGGER_PARSE_CACHE_DIR"
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+class ParseCache:
+    """
+    A bounded LRU cache of ingredient line parses, keyed on the line
+    Values are parse dictionaries (of scalars, or one level of nested dicts like range amounts); the cache stores
+    and hands out copies, so callers can keep modifying the dictionaries they get back
+    """
+
+    def __init__(self, maxsize=50000, path=None, version=None):
+        """
+        Initialize the cache
+        :param maxsize: the maximum number of lines kept (least recently used are evicted first)
+        :param path: the json file the cache is loaded from and saved to (None to keep it in memory only)
+        :param version: the version of the parser filling the cache; a saved cache of another version is ignored
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+
+    @staticmethod
+    def copy_parse(parsed):
+        """
+        Copy a parse dictionary deep enough that changing the copy never changes the cached value
+        :param parsed: the parse dictionary (None for lines that parse to nothing)
+        """
+        if parsed is None:
+            return None
+        return {key: dict(value) if isinstance(value, dict) else value for key, value in parsed.items()}
+
+    def get(self, line, default=None):
+        """
+        Get the cached parse of a line
+        :param line: the ingredient line, as the parser normalized it
+        :param default: returned when the line isn't cached
+        :return: a copy of the cached parse
+        """
+        with self._lock:
+            if line not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(line)
+            self.hits += 1
+            return self.copy_parse(self._entries[line])
+
+    def put(self, line, parsed):
+        """
+        Cache the parse of a line, evicting the least recently used line when the cache is full
+        :param line: the ingredient line, as the parser normalized it
+        :param parsed: the parse dictionary
+        """
+        with self._lock:
+            self._entries[line] = self.copy_parse(parsed)
+            self._entries.move_to_end(line)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, line):
+        return line in self._entries
+
+    def stats(self):
+        """
+        Get the hit/miss counters of this cache
+        :return: dictionary of hits, misses, hit rate and size
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries)}
+
+    def load(self):
+        """
+        Load the saved cache from self.path (a missing, unreadable or other-version file is ignored)
+        """
+        try:
+            with open(self.path, 'r', encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if saved.get("version") != self.version:
+            print(f"Parse cache {self.path} was written by another parser version, starting empty")
+            return
+        with self._lock:
+            for line, parsed in saved["entries"][-self.maxsize:]:
+                self._entries[line] = parsed
+
+    def save(self):
+        """
+        Write the cache to self.path, atomically so a concurrent reader never sees a partial file
+        """
+        if not self.path:
+            return
+        with self._lock:
+            saved = {"version": self.version, "entries": list(self._entries.items())}
+        cache_dir = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(cache_dir, exist_ok=True)
+        # a temp file of its own per writer, threads of one process included
+        with tempfile.NamedTemporaryFile('w', encoding="utf-8", dir=cache_dir, suffix=".tmp", delete=False) as f:
+            json.dump(saved, f)
+        try:
+            os.replace(f.name, self.path)
+        except OSError:
+            os.remove(f.name)
+            raise
+
+
+def source_version(*paths):
+    """
+    Version a parser by the contents of its source file and the files it reads its tables from, so any change to
+    the parser or its data invalidates saved caches
+    :param paths: the __file__ of the parser module, then the other files its results depend on
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:16]
+
+
+def shared_cache(name, version, maxsize=50000):
+    """
+    Get the process-wide parse cache of a parser, so every parser instance (one per recipe) shares it
+    When MEALLOGGER_PARSE_CACHE_DIR is set, the cache is loaded from <dir>/<name>.json and saved back at exit
+    :param name: the name of the parser (e.g. recipe_parser)
+    :param version: the version of the parser (see source_version)
+    :param maxsize: the maximum number of lines kept
+    """
+    with _shared_lock:
+        if name not in _shared_caches:
+            cache_dir = os.environ.get(PARSE_CACHE_DIR_ENV)
+            path = os.path.join(cache_dir, name + ".json") if cache_dir else None
+            cache = ParseCache(maxsize, path, version)
+            if path:
+                atexit.register(cache.save)
+            _shared_caches[name] = cache
+        return _shared_caches[name]
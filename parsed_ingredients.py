@@ -0,0 +1,128 @@
+from array import array
+import math
+
+
+class ParsedIngredients:
+    """
+    The result of RecipeParser.parse_many, stored column by column instead of one dict per line
+    Amounts are float arrays (NaN for no amount), units are small integer codes (-1 for no unit) and names
+    live in one string buffer addressed by offsets, so a large batch costs a few arrays instead of a dict per line
+    """
+
+    CONFIDENCES = ['low', 'med', 'high']
+
+    def __init__(self, lines, unit_codes):
+        """
+        Initialize empty columns for a batch
+        :param lines: the ingredient lines of the batch (list of str)
+        :param unit_codes: dictionary of canonical unit -> code
+        """
+        n = len(lines)
+        self.lines = lines
+        self.unit_codes = unit_codes
+        self.units = [None] * len(unit_codes)
+        for unit, code in unit_codes.items():
+            self.units[code] = unit
+        # rows of blank lines (which parse to None) stay unparsed
+        self.parsed = array('b', [0]) * n
+        self.amounts = array('d', [math.nan]) * n
+        # upper end of a range amount ("2-3 tbsp"), NaN otherwise
+        self.amount_max = array('d', [math.nan]) * n
+        self.is_range = array('b', [0]) * n
+        self.unit_codes_column = array('h', [-1]) * n
+        self.confidence = array('b', [0]) * n
+        self.notes = [None] * n
+        # names of rows whose name isn't set yet, joined into names_buffer by build_names()
+        self._names = [''] * n
+        self._names_buffer = None
+        self._name_offsets = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def set_row(self, i, parsed):
+        """
+        Store one parsed line
+        :param i: the row index
+        :param parsed: the dictionary returned by RecipeParser.parse_ingredient_line
+        """
+        amount = parsed['amount']
+        if isinstance(amount, dict):
+            self.is_range[i] = 1
+            self.amounts[i] = self._to_float(amount['min'])
+            self.amount_max[i] = self._to_float(amount['max'])
+        else:
+            self.amounts[i] = self._to_float(amount)
+        self.unit_codes_column[i] = self.unit_codes[parsed['unit']] if parsed['unit'] else -1
+        self.confidence[i] = self.CONFIDENCES.index(parsed['confidence'])
+        self.notes[i] = parsed['notes']
+        self._names[i] = parsed['name']
+        self.parsed[i] = 1
+        self._names_buffer = None
+
+    @staticmethod
+    def _to_float(value):
+        return math.nan if value is None else float(value)
+
+    @staticmethod
+    def _from_float(value):
+        return None if math.isnan(value) else value
+
+    def build_names(self):
+        """
+        Join the names into one buffer; name i is names_buffer[name_offsets[i]:name_offsets[i + 1]]
+        """
+        offsets = array('q', [0])
+        total = 0
+        for name in self._names:
+            total += len(name or '')
+            offsets.append(total)
+        self._names_buffer = ''.join(name or '' for name in self._names)
+        self._name_offsets = offsets
+
+    @property
+    def names_buffer(self):
+        if self._names_buffer is None:
+            self.build_names()
+        return self._names_buffer
+
+    @property
+    def name_offsets(self):
+        if self._names_buffer is None:
+            self.build_names()
+        return self._name_offsets
+
+    def name(self, i):
+        """
+        Get the name of row i
+        """
+        offsets = self.name_offsets
+        return self.names_buffer[offsets[i]:offsets[i + 1]]
+
+    def unit(self, i):
+        """
+        Get the canonical unit of row i (None if no unit)
+        """
+        code = self.unit_codes_column[i]
+        return self.units[code] if code >= 0 else None
+
+    def row(self, i):
+        """
+        Rebuild row i as the dictionary parse_ingredient_line returns (None for blank lines)
+        """
+        if not self.parsed[i]:
+            return None
+        if self.is_range[i]:
+            amount = {'min': self._from_float(self.amounts[i]), 'max': self._from_float(self.amount_max[i])}
+        else:
+            amount = self._from_float(self.amounts[i])
+        return {
+            'original': self.lines[i].strip(), 'amount': amount, 'unit': self.unit(i), 'name': self.name(i),
+            'notes': self.notes[i], 'confidence': self.CONFIDENCES[self.confidence[i]]
+        }
+
+    def rows(self):
+        """
+        Rebuild every row (see row)
+        """
+        return [self.row(i) for i in range(len(self))]
@@ -0,0 +1,140 @@
+import requests
+import json
+import os
+import re
+from bs4 import BeautifulSoup, FeatureNotFound
+
+# environment variable forcing the html parser backend (e.g. html.parser, lxml)
+HTML_PARSER_ENV = "MEALLOGGER_HTML_PARSER"
+# backends to try, fastest first; html.parser ships with python so it always works
+HTML_PARSERS = ["lxml", "html.parser"]
+_html_parser = None
+# <script type="application/ld+json"> blocks, found in the raw html without building a soup
+RE_JSON_LD = re.compile(r'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+                        re.I | re.S)
+
+
+def html_parser_backend():
+    """
+    Pick the html parser backend BeautifulSoup builds soups with, once per process
+    :return: the name of the backend (str)
+    """
+    global _html_parser
+    if _html_parser is None:
+        forced = os.environ.get(HTML_PARSER_ENV)
+        for parser in ([forced] if forced else HTML_PARSERS):
+            try:
+                BeautifulSoup("", parser)
+            except FeatureNotFound:
+                if forced:
+                    raise Exception(f"html parser {forced} (from {HTML_PARSER_ENV}) is not installed")
+                continue
+            _html_parser = parser
+            break
+    return _html_parser
+
+
+def make_soup(html, parser=None):
+    """
+    Parse html with the fastest available backend
+    :param html: the raw html (str)
+    :param parser: the backend to use (None to pick one with html_parser_backend)
+    :return: the parsed document (BeautifulSoup)
+    """
+    return BeautifulSoup(html, parser or html_parser_backend())
+
+
+def walk_json_ld(obj):
+    """
+    Walk every node (dict) of a JSON-LD payload, e.g. the nodes of an @graph
+    :param obj: the decoded JSON-LD payload
+    """
+    if isinstance(obj, list):
+        for item in obj:
+            yield from walk_json_ld(item)
+    elif isinstance(obj, dict):
+        yield obj
+        for v in obj.values():
+            yield from walk_json_ld(v)
+
+
+def is_recipe_node(node):
+    """
+    Check whether a JSON-LD node is a schema.org Recipe
+    :param node: the JSON-LD node (dict)
+    """
+    types = node.get("@type", "")
+    if not isinstance(types, list):
+        types = [types]
+    return any(isinstance(t, str) and t.lower() == "recipe" for t in types)
+
+
+class RecipePage:
+    """
+    A single recipe web page, downloaded and parsed once and shared by every extractor that needs it
+    """
+
+    def __init__(self, url, html):
+        """
+        Initialize the recipe page
+        :param url: the url the page was downloaded from (str)
+        :param html: the raw html of the page (str)
+        """
+        self.url = url
+        self.html = html
+        self._soup = None
+        self._json_ld_recipes = None
+
+    @classmethod
+    def fetch(cls, url, http_cache=None, timeout=15):
+        """
+        Download a recipe page
+        :param url: the url of the recipe (str)
+        :param http_cache: the HttpCache to go through (None to always hit the network)
+        :param timeout: the request timeout in seconds
+        :return: the recipe page (RecipePage)
+        """
+        if http_cache is not None:
+            return cls(url, http_cache.get(url))
+        r = requests.get(url, timeout=timeout)
+        r.raise_for_status()
+        return cls(url, r.text)
+
+    @property
+    def soup(self):
+        """
+        Get the parsed document, building it on first access only
+        Extractors must treat the soup as read-only since it is shared between them
+        """
+        if self._soup is None:
+            self._soup = make_soup(self.html)
+        return self._soup
+
+    @property
+    def json_ld_recipes(self):
+        """
+        Get the schema.org Recipe nodes of the page's JSON-LD blocks, scanned straight from the raw html
+        so that pages carrying a full Recipe never need a soup
+        :return: list of Recipe nodes (dicts), in document order
+        """
+        if self._json_ld_recipes is None:
+            self._json_ld_recipes = []
+            for block in RE_JSON_LD.findall(self.html or ""):
+                try:
+                    payload = json.loads(block.strip())
+                except ValueError:
+                    continue
+                self._json_ld_recipes.extend(node for node in walk_json_ld(payload) if is_recipe_node(node))
+        return self._json_ld_recipes
+
+    def json_ld_field(self, *keys):
+        """
+        Get a recipe field from the JSON-LD Recipe nodes
+        :param keys: the names the field goes by, in order of preference (e.g. recipeIngredient, ingredients)
+        :return: the first non-empty value found, None if no Recipe node has the field
+        """
+        for node in self.json_ld_recipes:
+            for key in keys:
+                if node.get(key):
+                    return node[key]
+        return None
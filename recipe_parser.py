@@ -1,50 +1,68 @@
 import re
+import json
 from fractions import Fraction
 from html import unescape
-import requests
-from bs4 import BeautifulSoup
+from bs4 import Tag, NavigableString, CData
+from recipe_page import RecipePage, walk_json_ld
+from parsed_ingredients import ParsedIngredients
+from parse_cache import shared_cache, source_version
+from http_cache import HttpCache
+from unit_registry import UNIT_SOURCES, unit_registry
 from typing import List, Dict, Optional, Tuple, Any
 
+# ---------------------- compiled patterns, shared by every parser instance ----------------------
+RE_FRACTION = re.compile(r'(?P<int>\d+)?\s*(?P<num>\d+)\s*/\s*(?P<den>\d+)')
+RE_RANGE = re.compile(
+    r'(?P<a>\d+(?:[.,]\d+)?(?:\s*\d+/\d+)?|\d+\s*%?)\s*(?:-|to|–|—)\s*(?P<b>\d+(?:[.,]\d+)?(?:\s*\d+/\d+)?|\d+\s*%?)',
+    re.I
+)
+# number + unit glued to each other at start (e.g., '2oz', '10-oz')
+RE_NUMUNIT = re.compile(r'^\s*(?P<num>\d+(?:[.,]\d+)?)(?:\s*-\s*)?(?P<unit>[A-Za-z%./]+)\b')
+# percentage at start like "93%" possibly followed by descriptor
+RE_PERCENT = re.compile(r'^\s*(?P<pct>\d+(?:[.,]\d+)?)\s*%(\s+|$)')
+# hyphenated like '10-oz' anywhere
+RE_HYPHEN_NUMUNIT = re.compile(r'(?P<num>\d+(?:[.,]\d+)?)-(?P<unit>[A-Za-z%./]+)\b')
+# leading mixed/fraction/decimal amount like '1 1/2', '3/4', '1.5'
+RE_LEADING_NUMBER = re.compile(r'^\s*(?P<num>(?:\d+\s+\d+/\d+)|(?:\d+/\d+)|(?:\d+(?:[.,]\d+)?))\b')
+RE_NUMBER = re.compile(r'(?P<number>\d+(?:[.,]\d+)?)')
+RE_DIGIT = re.compile(r'\d')
+RE_BULLET = re.compile(r'^[\-\u2022]\s*')
+RE_LEADING_PUNCT = re.compile(r'^[,:;\-\s]+')
+RE_WHITESPACE = re.compile(r'\s+')
+# trailing parenthetical: the notes it holds, and the whole group (with leading space) to strip
+RE_NOTES = re.compile(r'\(([^)]+)\)\s*$')
+RE_TRAILING_PARENS = re.compile(r'\s*\((?:[^()]*)\)\s*$')
+# unit token cleanup
+RE_NOT_UNIT_CHARS = re.compile(r'[^a-zA-Z%./\s]+')
+RE_NOT_UNIT_CHARS_OR_SPACE = re.compile(r'[^a-zA-Z%./]+')
+RE_UNIT_TOKEN = re.compile(r'^(?P<u>[A-Za-z%./]+)\b')
+# unit words for the line heuristics
+RE_UNIT_WORD = re.compile(r'\b(tsp|tbsp|cup|oz|ounce|g|gram|kg|ml|can|clove|slice|stick|package|lb|pound|cup)\b', re.I)
+RE_LINE_UNIT_WORD = re.compile(
+    r'\b(tsp|tbsp|cup|oz|ounce|g|gram|kg|ml|can|clove|slice|stick|package|lb|pound|stalk|sprig|bag|box)\b', re.I)
+RE_UI_LABEL = re.compile(r'^(image|print recipe|pin recipe|subscribe|download|nutrition)')
+# headings that signal END of ingredient list
+RE_STOP_HEADINGS = re.compile(r'^(instructions?|steps?|directions?|method|preparation|notes?|nutrition)$', re.I)
+RE_INGREDIENT_HEADING = re.compile(r"ingredient", re.I)
+UNIT_PATTERN = re.compile(r"\b(cup|cups|tbsp|tablespoon|tsp|teaspoon|pound|lb|oz|gram|g|kg|ml|l|liters?)\b", re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r"\b(\d+\s*\d*\/?\d*)\b")
+
+# saved parse caches are only reused by the exact parser code and unit tables that wrote them
+PARSER_VERSION = source_version(__file__, *UNIT_SOURCES)
+
 
 class RecipeParser:
 
-    def __init__(self):
-        # canonical units and many aliases (extendable)
-        self.UNIT_ALIASES = {
-            "teaspoon": ["tsp", "t", "teaspoons", "tsps", "tsp."],
-            "tablespoon": ["tbsp", "T", "tbl", "tablespoons", "tablespoon", "tbsp."],
-            "cup": ["c", "cups", "cupful", "cup", "cups."],
-            "gram": ["g", "grams", "gram", "gr", "g."],
-            "kilogram": ["kg", "kilograms", "kilogram", "kg."],
-            "ounce": ["oz", "ounces", "ounce", "oz."],
-            "fluid_ounce": ["fl oz", "floz", "fl. oz", "fl-oz"],
-            "pint": ["pt", "pint", "pints"],
-            "quart": ["qt", "quart", "quarts"],
-            "gallon": ["gal", "gallon", "gallons"],
-            "pound": ["lb", "lbs", "pound", "pounds", "lb."],
-            "milliliter": ["ml", "millilitre", "milliliters", "ml."],
-            "liter": ["l", "litre", "liters", "litres", "l."],
-            "pinch": ["pinch", "pinches"],
-            "dash": ["dash", "dashes"],
-            "clove": ["clove", "cloves"],
-            "can": ["can", "cans"],
-            "slice": ["slice", "slices"],
-            "package": ["package", "pkg", "packet", "packets", "packages"],
-            "stick": ["stick", "sticks"],
-            "piece": ["piece", "pieces"],
-            "head": ["head", "heads"],
-            "bunch": ["bunch", "bunches"],
-            "stalk": ["stalk", "stalks"],
-            "sprig": ["sprig", "sprigs"],
-            "bag": ["bag", "bags"],
-            "box": ["box", "boxes"],
-            "jar": ["jar", "jars"],
-        }
+    def __init__(self, http_cache=None, parse_cache=None):
+        self._http_cache = http_cache or HttpCache()
+        # parsed lines, shared by every parser in the process unless a cache is given
+        self._parse_cache = parse_cache if parse_cache is not None else shared_cache("recipe_parser", PARSER_VERSION)
+        # canonical units and their aliases, shared with the rest of the app (units/canonical_units.json)
+        self._units = unit_registry()
         # unit lookup
-        self.UNIT_MAP = {}
-        for canon, aliases in self.UNIT_ALIASES.items():
-            for a in aliases:
-                self.UNIT_MAP[a.lower()] = canon
+        self.UNIT_MAP = self._units.lower_aliases
+        # canonical unit -> small integer code, for columnar results (ParsedIngredients)
+        self.UNIT_CODES = {canon: code for code, canon in enumerate(self._units.units)}
 
         # number words
         self.NUMBER_WORDS = {
@@ -62,31 +80,24 @@ class RecipeParser:
 
         # regexes
         self.RE_UNICODE_FRAC = re.compile('|'.join(map(re.escape, self.UNICODE_FRACTIONS.keys())))
-        self.RE_FRACTION = re.compile(r'(?P<int>\d+)?\s*(?P<num>\d+)\s*/\s*(?P<den>\d+)')
-        self.RE_RANGE = re.compile(
-            r'(?P<a>\d+(?:[.,]\d+)?(?:\s*\d+/\d+)?|\d+\s*%?)\s*(?:-|to|–|—)\s*(?P<b>\d+(?:[.,]\d+)?(?:\s*\d+/\d+)?|\d+\s*%?)',
-            re.I
-        )
+        self.RE_FRACTION = RE_FRACTION
+        self.RE_RANGE = RE_RANGE
         self.RE_WORD_NUMBER = re.compile(
             r'\b(' + '|'.join(sorted(self.NUMBER_WORDS.keys(), key=len, reverse=True)) + r')\b',
             re.I
         )
-        # number + unit glued to each other at start (e.g., '2oz', '10-oz')
-        self.RE_NUMUNIT = re.compile(r'^\s*(?P<num>\d+(?:[.,]\d+)?)(?:\s*-\s*)?(?P<unit>[A-Za-z%./]+)\b')
-        # percentage at start like "93%" possibly followed by descriptor
-        self.RE_PERCENT = re.compile(r'^\s*(?P<pct>\d+(?:[.,]\d+)?)\s*%(\s+|$)')
-        # hyphenated like '10-oz' anywhere
-        self.RE_HYPHEN_NUMUNIT = re.compile(r'(?P<num>\d+(?:[.,]\d+)?)-(?P<unit>[A-Za-z%./]+)\b')
+        # anything that can start an amount besides a number word: a digit or a unicode fraction
+        self.RE_AMOUNT_HINT = re.compile(r'\d|' + self.RE_UNICODE_FRAC.pattern)
+        self.RE_NUMUNIT = RE_NUMUNIT
+        self.RE_PERCENT = RE_PERCENT
+        self.RE_HYPHEN_NUMUNIT = RE_HYPHEN_NUMUNIT
 
         # heuristics: UI labels to filter
         self.UI_LABELS = {'optional', 'substitute', 'note', 'servings', 'ingredients for', 'show full recipe',
                           'print recipe', 'nutrition', 'calories'}
 
-        self.UNIT_PATTERN = re.compile(
-            r"\b(cup|cups|tbsp|tablespoon|tsp|teaspoon|pound|lb|oz|gram|g|kg|ml|l|liters?)\b",
-            re.IGNORECASE
-        )
-        self.AMOUNT_PATTERN = re.compile(r"\b(\d+\s*\d*\/?\d*)\b")
+        self.UNIT_PATTERN = UNIT_PATTERN
+        self.AMOUNT_PATTERN = AMOUNT_PATTERN
 
         self.STRONG_KEYS = [
             "ingredient", "ingredients", "fmc_ingredients",
@@ -110,8 +121,10 @@ class RecipeParser:
         #         candidates.append((tag, 100))  # strong score
 
         # 2) MEDIUM: any <section>, <div>, <ul> with lots of ingredient-like <li>
+        # (the stats of every node are gathered in one bottom-up pass instead of one subtree walk per candidate)
+        stats = self.container_stats(soup)
         for tag in soup.find_all(["div", "section"]):
-            score = self.score_ingredient_container(tag)
+            score = self.score_container_stats(stats[id(tag)])
             if score > 0:
                 candidates.append((tag, score))
 
@@ -132,44 +145,89 @@ class RecipeParser:
         Determine whether a DOM node is a good ingredient container.
         Higher scores = more likely to be the correct block.
         """
-        # 1) Count descendant text lines
-        all_text = node.get_text("\n", strip=True)
-        text_lines = [l.strip() for l in all_text.split("\n") if l.strip()]
-        # 2) Find LI items using controlled recursion
-        li_nodes = self.find_li_with_depth(node, max_depth=2)
+        return self.score_container_stats(self.container_stats(node)[id(node)])
+
+    def container_stats(self, root):
+        """
+        Gather the scoring stats of root and every tag below it in a single bottom-up pass,
+        so scoring all candidate containers is linear in the page size.
+        Returns {id(tag): stats}, where stats is a dict of
+          lines:      number of non-empty text lines (as node.get_text("\\n", strip=True) splits them)
+          junk:       number of those lines containing junk keywords
+          descendants: len(list(node.descendants))
+          heading:    an h1-h5 below the node has "ingredient" in its string
+          li, good_li: <li> found by find_li_with_depth(node, 2), and how many look like ingredient lines
+        """
+        string_types = (NavigableString, CData)  # the strings get_text() includes
+        heading_names = ("h1", "h2", "h3", "h4", "h5")
+        stats = {}
+        # document order reversed visits every tag after all of its descendants
+        tags = [root] + root.find_all(True)
+        for tag in reversed(tags):
+            lines = junk = descendants = 0
+            heading = False
+            # <li> directly in this list / in its children's lists (depth 0 and 1 of find_li_with_depth)
+            own_li = own_good = child_li = child_good = 0
+            # the children's depth 0 and 1 become depth 1 and 2 here
+            deep_li = deep_good = 0
+            for child in tag.contents:
+                descendants += 1
+                if isinstance(child, Tag):
+                    c = stats[id(child)]
+                    lines += c["lines"]
+                    junk += c["junk"]
+                    descendants += c["descendants"]
+                    heading = heading or c["heading"] or (
+                        child.name in heading_names and child.string is not None and
+                        RE_INGREDIENT_HEADING.search(child.string) is not None)
+                    child_li += c["own_li"]
+                    child_good += c["own_good"]
+                    deep_li += c["own_li"] + c["child_li"]
+                    deep_good += c["own_good"] + c["child_good"]
+                    if child.name == "li" and tag.name in ("ul", "ol"):
+                        own_li += 1
+                        own_good += self.looks_like_ingredient_line(child.get_text(" ", strip=True))
+                elif type(child) in string_types:
+                    for line in child.strip().split("\n"):
+                        line = line.strip()
+                        if line:
+                            lines += 1
+                            junk += self.contains_junk_keywords(line)
+            stats[id(tag)] = {
+                "lines": lines, "junk": junk, "descendants": descendants, "heading": heading,
+                "own_li": own_li, "own_good": own_good, "child_li": child_li, "child_good": child_good,
+                "li": own_li + deep_li, "good_li": own_good + deep_good,
+            }
+        return stats
+
+    def score_container_stats(self, stats):
+        """
+        Score a container from the stats gathered by container_stats.
+        """
         pos = 0
         neg = 0
-        # + Positive scoring
-        ingredient_like_count = 0
-        bad_li = 0
-        for li in li_nodes:
-            line = li.get_text(" ", strip=True)
-            if self.looks_like_ingredient_line(line):
-                ingredient_like_count += 1
-                pos += 3
-            else:
-                bad_li += 1
-                neg += 1
+        # 1) + Positive scoring for ingredient-like LI items
+        ingredient_like_count = stats["good_li"]
+        bad_li = stats["li"] - ingredient_like_count
+        pos += 3 * ingredient_like_count
+        neg += bad_li
         # Penalize LI ratio
         if ingredient_like_count == 0:
             neg += 10  # avoid containers with long lists of junk
-        # 3) Heading bonus
-        heading_text = ""
-        if node.find(["h1", "h2", "h3", "h4", "h5"], string=re.compile(r"ingredient", re.I)):
+        # 2) Heading bonus
+        if stats["heading"]:
             pos += 2
-        # 4) Penalty for overall container size
-        descendants = len(list(node.descendants))
-        neg += descendants * 0.02  # dynamic scaling
-        # 5) Penalty for junk keywords in large text
-        junk_hits = sum(self.contains_junk_keywords(l) for l in text_lines)
-        neg += junk_hits * 3
-        # 6) Penalty for very long containers
-        if len(text_lines) > 60:
+        # 3) Penalty for overall container size
+        neg += stats["descendants"] * 0.02  # dynamic scaling
+        # 4) Penalty for junk keywords in large text
+        neg += stats["junk"] * 3
+        # 5) Penalty for very long containers
+        if stats["lines"] > 60:
             neg += 10
-        elif len(text_lines) > 120:
+        elif stats["lines"] > 120:
             neg += 30
-        # 7) Very large number of LI elements (likely nav or sidebar)
-        if len(li_nodes) > 25:
+        # 6) Very large number of LI elements (likely nav or sidebar)
+        if stats["li"] > 25:
             neg += 8
         # Final score
         return pos - neg
@@ -195,7 +253,7 @@ class RecipeParser:
             except Exception:
                 pass
         # plain number
-        m2 = re.search(r'(?P<number>\d+(?:[.,]\d+)?)', s2)
+        m2 = RE_NUMBER.search(s2)
         if m2:
             try:
                 return float(m2.group('number').replace(',', '.'))
@@ -211,15 +269,10 @@ class RecipeParser:
     def _map_unit_candidate(self, token: str) -> Optional[str]:
         if not token:
             return None
-        t = token.lower().rstrip('.').strip()
-        # try direct
-        if t in self.UNIT_MAP:
-            return self.UNIT_MAP[t]
-        # try with spaces removed (e.g., 'floz' already in map, but check)
-        t2 = t.replace(' ', '')
-        if t2 in self.UNIT_MAP:
-            return self.UNIT_MAP[t2]
-        return None
+        t = token.rstrip('.').strip()
+        # try direct (case matters for a few aliases: T is a tablespoon, t a teaspoon)
+        # then with spaces removed (e.g., 'floz' already in map, but check)
+        return self._units.canonical(t) or self._units.canonical(t.replace(' ', ''))
 
     def find_unit_and_name_after_amount(self, rest: str) -> Tuple[Optional[str], str]:
         """
@@ -233,21 +286,21 @@ class RecipeParser:
         # try two-word unit first
         tokens = rest.split()
         for take in (2, 1):
-            candidate = ' '.join(tokens[:take]).lower().rstrip('.,;()')
+            candidate = ' '.join(tokens[:take]).rstrip('.,;()')
             # keep letters, %, ., / and spaces
-            candidate_clean = re.sub(r'[^a-zA-Z%./\s]+', '', candidate).strip()
+            candidate_clean = RE_NOT_UNIT_CHARS.sub('', candidate).strip()
             mapped = self._map_unit_candidate(candidate_clean)
             if mapped:
                 return mapped, ' '.join(tokens[take:]).strip()
 
         # as fallback, if the first token is punctuation-stripped and maps
-        first = tokens[0].lower().rstrip('.,;()')
-        mapped_first = self._map_unit_candidate(re.sub(r'[^a-zA-Z%./]+', '', first))
+        first = tokens[0].rstrip('.,;()')
+        mapped_first = self._map_unit_candidate(RE_NOT_UNIT_CHARS_OR_SPACE.sub('', first))
         if mapped_first:
             return mapped_first, ' '.join(tokens[1:]).strip()
 
         # also check pattern like "oz." at the very start (regex)
-        m = re.match(r'^(?P<u>[A-Za-z%./]+)\b', rest)
+        m = RE_UNIT_TOKEN.match(rest)
         if m:
             maybe = m.group('u').rstrip('.')
             if self._map_unit_candidate(maybe):
@@ -255,14 +308,26 @@ class RecipeParser:
 
         return None, rest
 
+    # ---------------------- notes ----------------------
+    def _split_notes(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Split a trailing parenthetical off text with a single regex search:
+        'green onion (chopped)' -> ('green onion', 'chopped'); text without one comes back unchanged.
+        """
+        notes_m = RE_NOTES.search(text)
+        if not notes_m:
+            return text, None
+        # same cut as RE_TRAILING_PARENS: from the last '(' (and the whitespace before it) to the end
+        return text[:text.rfind('(')].strip(), notes_m.group(1)
+
     # ---------------------- normalize name ----------------------
     def normalize_ingredient_name(self, name: Optional[str]) -> Optional[str]:
         if name is None:
             return None
         name = name.strip()
         # strip trailing parentheses describing packaging/notes
-        name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name)
-        name = re.sub(r'\s+', ' ', name)
+        name = RE_TRAILING_PARENS.sub('', name)
+        name = RE_WHITESPACE.sub(' ', name)
         return unescape(name).strip()
 
     # ---------------------- parse single ingredient line ----------------------
@@ -274,155 +339,164 @@ class RecipeParser:
         orig = (line or '').strip()
         if not orig:
             return None
+        parsed = self._parse_cache.get(orig)
+        if parsed is None:
+            w = RE_BULLET.sub('', orig)  # strip bullets
+            kind, m = self.classify_ingredient_line(w)
+            parsed = self.LINE_PARSERS[kind](self, orig, w, m)
+            self._parse_cache.put(orig, parsed)
+        return parsed
 
-        w = re.sub(r'^[\-\u2022]\s*', '', orig)  # strip bullets
+    def classify_ingredient_line(self, w: str) -> Tuple[str, Any]:
+        """
+        Pick the branch that parses a (bullet-stripped) line, in priority order:
+          percent, range, glued, hyphen, unicode, number, word, name (no amount)
+        :return: the branch name, the match object it parses from
+        """
+        # lines without a digit, a unicode fraction or a leading number word can only be a plain name
+        if not self.RE_AMOUNT_HINT.search(w):
+            m = self.RE_WORD_NUMBER.match(w)
+            return ('word', m) if m else ('name', None)
 
         # quick: if starts with percentage as descriptor (e.g., "93% lean ground turkey"),
-        pct_m = self.RE_PERCENT.match(w)
-        if pct_m:
-            name = w
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', name)
-            if notes_m:
-                notes = notes_m.group(1)
-                name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name)
-            return {
-                'original': orig,
-                'amount': None,
-                'unit': None,
-                'name': self.normalize_ingredient_name(name),
-                'notes': notes,
-                'confidence': 'med'
-            }
+        m = self.RE_PERCENT.match(w)
+        if m:
+            return 'percent', m
+        m = self.RE_RANGE.search(w)
+        if m:
+            return 'range', m
+        # glued number+unit, only when the unit is a known one
+        m = self.RE_NUMUNIT.match(w)
+        if m and self._map_unit_candidate(m.group('unit').rstrip('.')):
+            return 'glued', m
+        m = self.RE_HYPHEN_NUMUNIT.search(w)
+        if m:
+            return 'hyphen', m
+        m = self.RE_UNICODE_FRAC.match(w.lstrip())
+        if m:
+            return 'unicode', m
+        m = RE_LEADING_NUMBER.match(w)
+        if m:
+            return 'number', m
+        m = self.RE_WORD_NUMBER.match(w)
+        if m:
+            return 'word', m
+        return 'name', None
 
-        # ranges
-        range_m = self.RE_RANGE.search(w)
-        if range_m:
-            a_raw = range_m.group('a')
-            b_raw = range_m.group('b')
-            a_val = self.parse_fractional_number(a_raw)
-            b_val = self.parse_fractional_number(b_raw)
-            amt = {'min': a_val, 'max': b_val}
-            w_after = self.RE_RANGE.sub('', w, count=1).strip(',;: ')
-            unit, name = self.find_unit_and_name_after_amount(w_after)
-            if not name:
-                name = w_after
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', name)
-            if notes_m:
-                notes = notes_m.group(1)
-                name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name).strip()
-            return {
-                'original': orig, 'amount': amt, 'unit': unit, 'name': self.normalize_ingredient_name(name),
-                'notes': notes, 'confidence': 'med'
-            }
+    def _parse_percent(self, orig: str, w: str, m) -> Dict[str, Any]:
+        name, notes = self._split_notes(w)
+        return {
+            'original': orig,
+            'amount': None,
+            'unit': None,
+            'name': self.normalize_ingredient_name(name),
+            'notes': notes,
+            'confidence': 'med'
+        }
 
-        # glued number+unit
-        nun = self.RE_NUMUNIT.match(w)
-        if nun:
-            num_s = nun.group('num')
-            unit_tok = nun.group('unit').rstrip('.').lower()
-            amt_val = self.parse_fractional_number(num_s)
-            unit_mapped = self._map_unit_candidate(unit_tok)
-            remainder = w[nun.end():].strip()
-            remainder = re.sub(r'^[,:;\-\s]+', '', remainder)
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', remainder)
-            if notes_m:
-                notes = notes_m.group(1)
-                remainder = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', remainder).strip()
-            if unit_mapped:
-                return {
-                    'original': orig, 'amount': amt_val, 'unit': unit_mapped,
-                    'name': self.normalize_ingredient_name(remainder), 'notes': notes,
-                    'confidence': 'med'
-                }
-
-        # hyphenated number-unit
-        hyp = self.RE_HYPHEN_NUMUNIT.search(w)
-        if hyp:
-            num_s = hyp.group('num')
-            unit_tok = hyp.group('unit').rstrip('.').lower()
-            amt_val = self.parse_fractional_number(num_s)
-            unit_mapped = self._map_unit_candidate(unit_tok)
-            w2 = (w[:hyp.start()] + w[hyp.end():]).strip()
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', w2)
-            if notes_m:
-                notes = notes_m.group(1)
-                w2 = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', w2).strip()
-            return {
-                'original': orig, 'amount': amt_val, 'unit': unit_mapped,
-                'name': self.normalize_ingredient_name(w2), 'notes': notes, 'confidence': 'med'
-            }
+    def _parse_range(self, orig: str, w: str, m) -> Dict[str, Any]:
+        a_val = self.parse_fractional_number(m.group('a'))
+        b_val = self.parse_fractional_number(m.group('b'))
+        amt = {'min': a_val, 'max': b_val}
+        w_after = (w[:m.start()] + w[m.end():]).strip(',;: ')
+        unit, name = self.find_unit_and_name_after_amount(w_after)
+        if not name:
+            name = w_after
+        name, notes = self._split_notes(name)
+        return {
+            'original': orig, 'amount': amt, 'unit': unit, 'name': self.normalize_ingredient_name(name),
+            'notes': notes, 'confidence': 'med'
+        }
 
-        # unicode fraction at start
-        u = self.RE_UNICODE_FRAC.match(w.lstrip())
-        if u:
-            amt_val = self.parse_fractional_number(u.group(0))
-            w_rem = w[u.end():].strip()
-            unit, name = self.find_unit_and_name_after_amount(w_rem)
-            if not name:
-                name = w_rem
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', name)
-            if notes_m:
-                notes = notes_m.group(1)
-                name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name).strip()
-            return {
-                'original': orig, 'amount': amt_val, 'unit': unit,
-                'name': self.normalize_ingredient_name(name), 'notes': notes, 'confidence': 'med'
-            }
+    def _parse_glued(self, orig: str, w: str, m) -> Dict[str, Any]:
+        amt_val = self.parse_fractional_number(m.group('num'))
+        unit_mapped = self._map_unit_candidate(m.group('unit').rstrip('.'))
+        remainder = RE_LEADING_PUNCT.sub('', w[m.end():].strip())
+        remainder, notes = self._split_notes(remainder)
+        return {
+            'original': orig, 'amount': amt_val, 'unit': unit_mapped,
+            'name': self.normalize_ingredient_name(remainder), 'notes': notes,
+            'confidence': 'med'
+        }
 
-        # standard mixed/decimal
-        m = re.match(r'^\s*(?P<num>(?:\d+\s+\d+/\d+)|(?:\d+/\d+)|(?:\d+(?:[.,]\d+)?))\b', w)
-        if m:
-            amt_val = self.parse_fractional_number(m.group('num'))
-            w_rem = w[m.end():].strip()
-            unit, name = self.find_unit_and_name_after_amount(w_rem)
-            if not name:
-                name = w_rem
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', name)
-            if notes_m:
-                notes = notes_m.group(1)
-                name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name).strip()
-            return {
-                'original': orig, 'amount': amt_val, 'unit': unit,
-                'name': self.normalize_ingredient_name(name), 'notes': notes, 'confidence': 'med'
-            }
+    def _parse_hyphen(self, orig: str, w: str, m) -> Dict[str, Any]:
+        amt_val = self.parse_fractional_number(m.group('num'))
+        unit_mapped = self._map_unit_candidate(m.group('unit').rstrip('.'))
+        w2 = (w[:m.start()] + w[m.end():]).strip()
+        w2, notes = self._split_notes(w2)
+        return {
+            'original': orig, 'amount': amt_val, 'unit': unit_mapped,
+            'name': self.normalize_ingredient_name(w2), 'notes': notes, 'confidence': 'med'
+        }
 
-        # word-number
-        m2 = self.RE_WORD_NUMBER.match(w)
-        if m2:
-            amt_val = float(self.NUMBER_WORDS[m2.group(0).lower()])
-            w_rem = w[m2.end():].strip()
-            unit, name = self.find_unit_and_name_after_amount(w_rem)
-            if not name:
-                name = w_rem
-            notes = None
-            notes_m = re.search(r'\(([^)]+)\)\s*$', name)
-            if notes_m:
-                notes = notes_m.group(1)
-                name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name).strip()
-            return {
-                'original': orig, 'amount': amt_val, 'unit': unit,
-                'name': self.normalize_ingredient_name(name), 'notes': notes, 'confidence': 'med'
-            }
+    def _parse_leading_amount(self, orig: str, w: str, m, amt_val) -> Dict[str, Any]:
+        # shared by the unicode fraction, number and number word branches: unit and name follow the amount
+        w_rem = w[m.end():].strip()
+        unit, name = self.find_unit_and_name_after_amount(w_rem)
+        if not name:
+            name = w_rem
+        name, notes = self._split_notes(name)
+        return {
+            'original': orig, 'amount': amt_val, 'unit': unit,
+            'name': self.normalize_ingredient_name(name), 'notes': notes, 'confidence': 'med'
+        }
 
-        # fallback: treat as name
-        notes = None
-        notes_m = re.search(r'\(([^)]+)\)\s*$', w)
-        name = w
-        if notes_m:
-            notes = notes_m.group(1)
-            name = re.sub(r'\s*\((?:[^()]*)\)\s*$', '', name).strip()
+    def _parse_unicode(self, orig: str, w: str, m) -> Dict[str, Any]:
+        return self._parse_leading_amount(orig, w, m, self.parse_fractional_number(m.group(0)))
+
+    def _parse_number(self, orig: str, w: str, m) -> Dict[str, Any]:
+        return self._parse_leading_amount(orig, w, m, self.parse_fractional_number(m.group('num')))
+
+    def _parse_word(self, orig: str, w: str, m) -> Dict[str, Any]:
+        return self._parse_leading_amount(orig, w, m, float(self.NUMBER_WORDS[m.group(0).lower()]))
 
+    def _parse_name(self, orig: str, w: str, m) -> Dict[str, Any]:
+        # fallback: treat as name
+        name, notes = self._split_notes(w)
         return {
             'original': orig, 'amount': None, 'unit': None,
             'name': self.normalize_ingredient_name(name), 'notes': notes, 'confidence': 'low'
         }
 
+    LINE_PARSERS = {
+        'percent': _parse_percent, 'range': _parse_range, 'glued': _parse_glued, 'hyphen': _parse_hyphen,
+        'unicode': _parse_unicode, 'number': _parse_number, 'word': _parse_word, 'name': _parse_name,
+    }
+
+    # ---------------------- parse a batch of ingredient lines ----------------------
+    def parse_many(self, lines) -> ParsedIngredients:
+        """
+        Parse a batch of ingredient lines into columns (see ParsedIngredients); row i equals
+        parse_ingredient_line(lines[i]).
+        Every distinct line not in the parse cache is classified once up front, then each branch parses its
+        whole group.
+        """
+        lines = list(lines)
+        result = ParsedIngredients(lines, self.UNIT_CODES)
+        # distinct stripped lines -> the rows they fill
+        rows_by_line: Dict[str, List[int]] = {}
+        for i, line in enumerate(lines):
+            orig = (line or '').strip()
+            if orig:
+                rows_by_line.setdefault(orig, []).append(i)
+        groups: Dict[str, List[Tuple[str, str, Any]]] = {kind: [] for kind in self.LINE_PARSERS}
+        for orig, rows in rows_by_line.items():
+            parsed = self._parse_cache.get(orig)
+            if parsed is not None:
+                for i in rows:
+                    result.set_row(i, parsed)
+                continue
+            w = RE_BULLET.sub('', orig)
+            kind, m = self.classify_ingredient_line(w)
+            groups[kind].append((orig, w, m))
+        for kind, group in groups.items():
+            parse = self.LINE_PARSERS[kind]
+            for orig, w, m in group:
+                parsed = parse(self, orig, w, m)
+                self._parse_cache.put(orig, parsed)
+                for i in rows_by_line[orig]:
+                    result.set_row(i, parsed)
+        return result
 
     # ---------------------- extraction of ingredient lines ----------------------
     def extract_ingredients_from_html(self, html: str) -> List[Tuple[Optional[str], str, str]]:
@@ -430,7 +504,38 @@ class RecipeParser:
         Return list of triples: (subsection, raw_line, confidence_source)
         NOW IMPROVED TO STOP AT END OF INGREDIENT LIST.
         """
-        soup = BeautifulSoup(html, 'html.parser')
+        return self.extract_ingredients_from_page(RecipePage(None, html))
+
+    def extract_ingredients_from_page(self, page: RecipePage) -> List[Tuple[Optional[str], str, str]]:
+        """
+        Same as extract_ingredients_from_html, for a recipe page.
+        Fast path: a JSON-LD Recipe with recipeIngredient is read from the raw html and no soup is built.
+        """
+        instr = page.json_ld_field('recipeIngredient', 'ingredients', 'ingredient')
+        candidates = self.dedupe_candidates(self.json_ld_ingredient_candidates(instr))
+        if candidates:
+            return candidates
+        return self.extract_ingredients_from_soup(page.soup)
+
+    def json_ld_ingredient_candidates(self, instr) -> List[Tuple[Optional[str], str, str]]:
+        """
+        Turn a JSON-LD recipeIngredient value (list of lines or one multi-line string) into candidates
+        """
+        candidates = []
+        if isinstance(instr, list):
+            for line in instr:
+                if isinstance(line, str) and line.strip():
+                    candidates.append((None, line.strip(), 'json-ld'))
+        elif isinstance(instr, str):
+            for l in instr.splitlines():
+                if l.strip():
+                    candidates.append((None, l.strip(), 'json-ld'))
+        return candidates
+
+    def extract_ingredients_from_soup(self, soup) -> List[Tuple[Optional[str], str, str]]:
+        """
+        Same as extract_ingredients_from_html, but for an already parsed document (which is not modified)
+        """
         soup = self.find_ingredient_container(soup)
         # print("Found ingredient container:", soup["class"])
         if not soup:
@@ -441,34 +546,14 @@ class RecipeParser:
         # 1) JSON-LD recipeIngredient - HIGH confidence
         for script in soup.find_all('script', type='application/ld+json'):
             try:
-                import json
                 payload = json.loads(script.string or '{}')
             except Exception:
                 continue
 
-            def walk(obj):
-                if isinstance(obj, list):
-                    for it in obj:
-                        yield from walk(it)
-                elif isinstance(obj, dict):
-                    yield obj
-                    for v in obj.values():
-                        yield from walk(v)
-                else:
-                    return
-
-            for node in walk(payload):
+            for node in walk_json_ld(payload):
                 if isinstance(node, dict) and 'recipe' in str(node.get('@type', '')).lower():
                     instr = node.get('recipeIngredient') or node.get('ingredients') or node.get('ingredient')
-                    if instr:
-                        if isinstance(instr, list):
-                            for line in instr:
-                                if isinstance(line, str) and line.strip():
-                                    candidates.append((None, line.strip(), 'json-ld'))
-                        elif isinstance(instr, str):
-                            for l in instr.splitlines():
-                                if l.strip():
-                                    candidates.append((None, l.strip(), 'json-ld'))
+                    candidates.extend(self.json_ld_ingredient_candidates(instr))
 
         # 2) WPRM & common selectors (high/med confidence)
         selectors = [
@@ -512,10 +597,7 @@ class RecipeParser:
                 break
 
         # headings that signal END of ingredient list
-        stop_headings = re.compile(
-            r'^(instructions?|steps?|directions?|method|preparation|notes?|nutrition)$',
-            re.I
-        )
+        stop_headings = RE_STOP_HEADINGS
 
         # ---------- 3) Heuristic fallback inside main container ----------
         if container:
@@ -549,6 +631,10 @@ class RecipeParser:
                     candidates.append((None, line, 'heuristic'))
 
         # ---------- Deduplicate ----------
+        return self.dedupe_candidates(candidates)
+
+    def dedupe_candidates(self, candidates) -> List[Tuple[Optional[str], str, str]]:
+        """Drop repeated (subsection, line) candidates, keeping the first."""
         seen = set()
         out = []
         for sub, line, source in candidates:
@@ -585,9 +671,9 @@ class RecipeParser:
         for lbl in self.UI_LABELS:
             if low == lbl or low.startswith(lbl + ':') or low.startswith(lbl + ' '):
                 return False
-        if re.search(r'\d', s2):
+        if RE_DIGIT.search(s2):
             return True
-        if re.search(r'\b(tsp|tbsp|cup|oz|ounce|g|gram|kg|ml|can|clove|slice|stick|package|lb|pound|stalk|sprig|bag|box)\b', s2, re.I):
+        if RE_LINE_UNIT_WORD.search(s2):
             return True
         if 1 <= len(s2.split()) <= 7:
             if s2.lower() in ['garnish', 'sauce', 'instructions', 'steps', 'notes']:
@@ -597,11 +683,10 @@ class RecipeParser:
 
     # ---------------------- top-level parse url ----------------------
     def parse_recipe_url(self, url: str) -> List[Dict[str, Any]]:
-        r = requests.get(url, timeout=15)
-        r.raise_for_status()
-        html = r.text
+        return self.parse_recipe_page(RecipePage.fetch(url, http_cache=self._http_cache))
 
-        raw_candidates = self.extract_ingredients_from_html(html)
+    def parse_recipe_page(self, page: RecipePage) -> List[Dict[str, Any]]:
+        raw_candidates = self.extract_ingredients_from_page(page)
 
         parsed = []
         for subsection, raw_line, source in raw_candidates:
@@ -620,27 +705,10 @@ class RecipeParser:
             parsed.append(parsed_item)
         return parsed
 
-    def find_li_with_depth(self, node, max_depth=2):
-        """Find <li> elements up to a limited depth inside node."""
-        results = []
-        def walk(n, depth):
-            if depth > max_depth:
-                return
-            # If n is a list container, capture its direct <li> children
-            if n.name in ("ul", "ol"):
-                for li in n.find_all("li", recursive=False):
-                    results.append(li)
-            # Recurse into children (both tag and non-tag children)
-            for child in getattr(n, "contents", []):
-                if getattr(child, "name", None):  # Is a tag
-                    walk(child, depth + 1)
-        walk(node, depth=0)
-        return results
-
     def looks_like_ingredient_line(self, text: str):
         if not text: return False
         t = text.lower()
-        if re.search(r'\d', t): return True
+        if RE_DIGIT.search(t): return True
         if self.contains_unit_word(t): return True
         if any(fr in t for fr in self.UNICODE_FRACTIONS): return True
         # 2–6 word ingredient-like noun phrases
@@ -662,8 +730,7 @@ class RecipeParser:
 
     # small helpers for heuristics
     def contains_unit_word(self, s):
-        return bool(
-            re.search(r'\b(tsp|tbsp|cup|oz|ounce|g|gram|kg|ml|can|clove|slice|stick|package|lb|pound|cup)\b', s, re.I))
+        return bool(RE_UNIT_WORD.search(s))
 
     def looks_like_ui_label(self, s):
         s2 = s.strip().lower()
@@ -673,13 +740,13 @@ class RecipeParser:
             return True
         # lines that are purely 'broccoli, carrots, red bell pepper' are okay — not UI label
         # filter out things like 'image' or 'print recipe' etc
-        if re.match(r'^(image|print recipe|pin recipe|subscribe|download|nutrition)', s2):
+        if RE_UI_LABEL.match(s2):
             return True
         return False
 
     def looks_like_ingredient_text(self, s):
         # heuristic: ingredient lines often have digits, fractions, or unit words or are short (e.g., "spray coconut oil")
-        if re.search(r'\d', s): return True
+        if RE_DIGIT.search(s): return True
         if self.contains_unit_word(s): return True
         # also allow short noun phrases (2-6 words) that look like items (e.g., "spray coconut oil", "fresh cilantro")
         if 1 <= len(s.split()) <= 6:
@@ -1,7 +1,5 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from http_cache import HttpCache
+from recipe_page import RecipePage
 
 
 class RecipeSearch:
@@ -9,18 +7,26 @@ class RecipeSearch:
     The parent class for all recipe website utilities that all recipe websites will inherit from
     """
 
-    def __init__(self, meal):
+    def __init__(self, meal, http_cache=None):
         """
         Define base urls
+        :param meal: the initialized meal object
+        :param http_cache: the HttpCache all page downloads go through (a default on-disk cache if None)
         """
         self.meal = meal
         self.meal_name = self.meal._name
         self.base_url = None
         self.search_url = None
+        self._http_cache = http_cache or HttpCache()
         # Webscraping Utilities
         # self._driver = self.get_driver(headless=False)
 
     def get_driver(self, headless=True):
+        # selenium is only needed by the pages that have to be rendered, not every search
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
         options = Options()
         if headless:
             options.headless = True
@@ -36,6 +42,14 @@ class RecipeSearch:
         driver = webdriver.Chrome(service=service, options=options)
         return driver
 
+    def fetch_page(self, url):
+        """
+        Download a page through the HTTP cache
+        :param url: the url of the page (str)
+        :return: the page (RecipePage)
+        """
+        return RecipePage.fetch(url, http_cache=self._http_cache)
+
     def search_for_meal(self):
         """
         Search for the meal name
@@ -0,0 +1,58 @@
+import os
+import sys
+import psycopg2
+import pytest
+from psycopg2 import sql
+
+# the app is a set of flat modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_utility import DatabaseUtility
+from flyway import Flyway
+
+
+@pytest.fixture
+def db_credentials():
+    """
+    Credentials of a throwaway, empty app database on the server of database/database.ini (or the one in
+    MEALLOGGER_TEST_DB_HOST / MEALLOGGER_TEST_DB_PORT), dropped after the test
+    The test is skipped when the server can't be reached
+    """
+    credentials = DatabaseUtility().get_credentials()
+    credentials["host"] = os.environ.get("MEALLOGGER_TEST_DB_HOST", credentials["host"])
+    credentials["port"] = os.environ.get("MEALLOGGER_TEST_DB_PORT", credentials["port"])
+    credentials["app_db"] = f"meallogger_test_{os.getpid()}"
+    flyway = Flyway(credentials)
+    try:
+        conn = flyway.connect(credentials["init_db"])
+    except Exception as e:
+        # an unreachable server, or no password to log in with
+        pytest.skip(f"No database server: {e}")
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    drop = sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(credentials["app_db"]))
+    with conn.cursor() as cur:
+        cur.execute(drop)
+    try:
+        yield credentials
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(drop)
+        conn.close()
+
+
+@pytest.fixture
+def app_db(db_credentials):
+    """
+    A DatabaseUtility connected to a throwaway app database with every migration applied
+    """
+    flyway = Flyway(db_credentials)
+    try:
+        flyway.migrate()
+    finally:
+        flyway.close()
+    db_util = DatabaseUtility()
+    db_util.connect(db_credentials, max_connections=2)
+    try:
+        yield db_util
+    finally:
+        db_util.disconnect()
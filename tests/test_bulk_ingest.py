@@ -0,0 +1,119 @@
+import os
+import time
+from bulk_ingest import BulkIngestor
+from http_cache import HttpCache
+from ingredient import Ingredient
+from meal import Meal
+from meal_repository import MealRepository
+
+PAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus", "pages")
+RECIPE_URL = "https://fitmencook.com/recipes/turkey-taco-bowls/"
+SEARCH_HTML = f'<figure class="fmc_grid_figure"><a href="{RECIPE_URL}">Turkey Taco Bowls</a></figure>'
+
+
+def offline_cache(tmp_path, pages):
+    cache = HttpCache(cache_dir=str(tmp_path), offline=True)
+    for url, body in pages.items():
+        cache.store(url, {"url": url, "body": body, "headers": {}, "fetched_at": time.time()})
+    return cache
+
+
+def test_fetch_recipe_by_meal_name(tmp_path):
+    with open(os.path.join(PAGES, "fmc_turkey_taco_bowls.html"), 'r', encoding="utf-8") as f:
+        recipe_html = f.read()
+    cache = offline_cache(tmp_path, {"https://fitmencook.com/?s=turkey+taco+bowls": SEARCH_HTML,
+                                     RECIPE_URL: recipe_html})
+    ingestor = BulkIngestor(db_util=None, fetch_workers=1, parse_workers=1, offline=True)
+    ingestor._local.http_cache = cache
+    assert ingestor.fetch_recipe("turkey taco bowls") == (RECIPE_URL, recipe_html)
+
+
+def test_fetch_recipe_by_url(tmp_path):
+    cache = offline_cache(tmp_path, {RECIPE_URL: "<html></html>"})
+    ingestor = BulkIngestor(db_util=None, fetch_workers=1, parse_workers=1, offline=True)
+    ingestor._local.http_cache = cache
+    assert ingestor.fetch_recipe(RECIPE_URL) == (RECIPE_URL, "<html></html>")
+
+
+class PantryRepository(MealRepository):
+    """
+    A MealRepository over a fixed list of ingredients instead of the database
+    """
+
+    def __init__(self, ingredients):
+        super().__init__(None)
+        self.ingredients = ingredients
+
+    def all_ingredients(self):
+        return self.ingredients
+
+
+def test_meal_ingredients_resolve_to_database_ingredients():
+    ingestor = BulkIngestor(db_util=None, fetch_workers=1, parse_workers=1)
+    egg = Ingredient(id=1, name="egg", calories_per_unit=72, protein_per_unit=6.3, carbs_per_unit=0.4,
+                     fat_per_unit=4.8, default_unit="egg")
+    milk = Ingredient(id=2, name="skim milk", calories_per_unit=0.34, protein_per_unit=0.034, carbs_per_unit=0.05,
+                      fat_per_unit=0.001, default_unit="g")
+    ingestor._repository = PantryRepository([egg, milk])
+    parsed = [{"name": "eggs", "amount": 3.0, "unit": None, "original": "3 eggs"},
+              {"name": "skim milk", "amount": {"min": 1.0, "max": 2.0}, "unit": "cup", "original": "1-2 cups milk"},
+              {"name": "salt", "amount": None, "unit": None, "original": "salt to taste"},
+              {"name": "dragon fruit", "amount": 1.0, "unit": None, "original": "1 dragon fruit"}]
+    assert ingestor.meal_ingredients(Meal(name="omelette"), parsed) == [(egg, 3.0, None), (milk, 1.5, "cup")]
+    assert ingestor.unresolved == 2
+
+
+def test_ingredients_in_units_that_dont_convert_are_left_out():
+    ingestor = BulkIngestor(db_util=None, fetch_workers=1, parse_workers=1)
+    egg = Ingredient(id=1, name="egg", calories_per_unit=72, protein_per_unit=6.3, carbs_per_unit=0.4,
+                     fat_per_unit=4.8, default_unit="egg")
+    garlic = Ingredient(id=2, name="garlic", calories_per_unit=1.49, protein_per_unit=0.06, carbs_per_unit=0.33,
+                        fat_per_unit=0, default_unit="g")
+    ingestor._repository = PantryRepository([egg, garlic])
+    parsed = [{"name": "egg whites", "amount": 250.0, "unit": "whites", "original": "250 egg whites"},
+              {"name": "egg", "amount": 1.0, "unit": "tbsp", "original": "1 tbsp egg"},
+              {"name": "garlic", "amount": 2.0, "unit": "clove", "original": "2 cloves garlic"},
+              {"name": "garlic", "amount": 2.0, "unit": None, "original": "2 garlic"},
+              {"name": "garlic", "amount": 10.0, "unit": "g", "original": "10 g garlic"},
+              {"name": "eggs", "amount": 2.0, "unit": "egg", "original": "2 egg"}]
+    assert ingestor.meal_ingredients(Meal(name="aioli"), parsed) == [(garlic, 10.0, "g"), (egg, 2.0, "egg")]
+    assert ingestor.unresolved == 4
+
+
+class FailingRepository(MealRepository):
+    """
+    A MealRepository whose inserts fail for any batch holding a meal named "bad"
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.inserted = []
+
+    def name_keys(self, meal_names):
+        return {name: (name, False) for name in meal_names}
+
+    def insert_meal_graphs(self, graphs):
+        if any(meal.name == "bad" for meal, _ in graphs):
+            raise Exception("duplicate key value violates unique constraint")
+        self.inserted += [meal.name for meal, _ in graphs]
+        return [meal for meal, _ in graphs]
+
+
+def test_flush_retries_a_failed_batch_meal_by_meal():
+    ingestor = BulkIngestor(db_util=None, fetch_workers=1, parse_workers=1)
+    ingestor._repository = FailingRepository()
+    ingestor._pending = [(Meal(name=name), []) for name in ["chili", "bad", "ramen"]]
+    ingestor.flush()
+    assert ingestor._repository.inserted == ["chili", "ramen"]
+    assert (ingestor.inserted, ingestor.failed) == (2, 1)
+
+
+def test_flush_skips_names_the_database_normalizes_alike(app_db):
+    ingestor = BulkIngestor(app_db, fetch_workers=1, parse_workers=1)
+    MealRepository(app_db).insert(Meal(name="istanbul kebab"))
+    # Python lower cases İ to i + a combining dot, Postgres to a plain i; Python's split() collapses a no-break
+    # space, Postgres' \s doesn't
+    ingestor._pending = [(Meal(name=name), []) for name in ["İstanbul Kebab", "Chili\u00a0Bowl", "chili bowl ",
+                                                            "Chili Bowl"]]
+    ingestor.flush()
+    assert (ingestor.inserted, ingestor.skipped, ingestor.failed) == (2, 2, 0)
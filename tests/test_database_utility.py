@@ -0,0 +1,123 @@
+import getpass
+import sys
+import psycopg2
+import pytest
+from database_utility import DatabaseUtility, PASSWORD_ENV, PASSWORD_FILE_ENV
+from flyway import Flyway
+
+CREDENTIALS = {"host": "db.example", "port": "5432", "user": "meals", "app_db": "meal_logger", "init_db": "postgres"}
+
+
+class Terminal:
+    def __init__(self, tty):
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+@pytest.fixture
+def utility(tmp_path, monkeypatch):
+    """
+    A utility with its ini file in tmp_path and none of the password sources of the environment
+    Prompts answer "prompted", stdin is a terminal unless a test says otherwise
+    """
+    for name in (PASSWORD_ENV, PASSWORD_FILE_ENV, "PGPASSWORD"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("PGPASSFILE", str(tmp_path / "missing.pgpass"))
+    monkeypatch.setattr(getpass, "getpass", lambda prompt: "prompted")
+    monkeypatch.setattr(sys, "stdin", Terminal(True))
+    utility = DatabaseUtility()
+    utility._database_ini = str(tmp_path / "database.ini")
+    return utility
+
+
+def pgpass(tmp_path, monkeypatch, *lines):
+    path = tmp_path / ".pgpass"
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    monkeypatch.setenv("PGPASSFILE", str(path))
+
+
+def test_env_var_comes_first(utility, tmp_path, monkeypatch):
+    (tmp_path / "secret").write_text("from file\n", encoding="utf-8")
+    monkeypatch.setenv(PASSWORD_ENV, "from env")
+    monkeypatch.setenv(PASSWORD_FILE_ENV, str(tmp_path / "secret"))
+    monkeypatch.setenv("PGPASSWORD", "from libpq")
+    assert utility.resolve_password(dict(CREDENTIALS)) == "from env"
+
+
+def test_password_file_before_libpq(utility, tmp_path, monkeypatch):
+    (tmp_path / "secret").write_text("from file\r\nsecond line\n", encoding="utf-8")
+    monkeypatch.setenv(PASSWORD_FILE_ENV, str(tmp_path / "secret"))
+    monkeypatch.setenv("PGPASSWORD", "from libpq")
+    assert utility.resolve_password(dict(CREDENTIALS)) == "from file"
+
+
+def test_password_file_of_the_ini_is_relative_to_it(utility, tmp_path):
+    (tmp_path / "secret").write_text("from ini file", encoding="utf-8")
+    assert utility.resolve_password(dict(CREDENTIALS, password_file="secret")) == "from ini file"
+
+
+def test_missing_password_file_raises(utility, tmp_path, monkeypatch):
+    monkeypatch.setenv(PASSWORD_FILE_ENV, str(tmp_path / "nothing here"))
+    with pytest.raises(Exception, match="password file"):
+        utility.resolve_password(dict(CREDENTIALS))
+
+
+def test_pgpassword_is_left_to_libpq(utility, monkeypatch):
+    monkeypatch.setenv("PGPASSWORD", "from libpq")
+    assert utility.resolve_password(dict(CREDENTIALS)) is None
+
+
+def test_pgpass_entries_for_both_databases_are_left_to_libpq(utility, tmp_path, monkeypatch):
+    pgpass(tmp_path, monkeypatch,
+           "# comment",
+           "db.example:5432:meal_logger:meals:secret",
+           "db.example:*:postgres:meals:secret")
+    assert utility.resolve_password(dict(CREDENTIALS)) is None
+
+
+def test_pgpass_wildcards_and_escapes(utility, tmp_path, monkeypatch):
+    pgpass(tmp_path, monkeypatch, r"*:*:*:me\:als:secret")
+    assert utility.has_pgpass_entry(dict(CREDENTIALS, user="me:als"), "postgres")
+    assert not utility.has_pgpass_entry(dict(CREDENTIALS), "postgres")
+
+
+def test_pgpass_entry_for_the_app_database_only_prompts(utility, tmp_path, monkeypatch):
+    # Flyway connects to init_db first to create the app database, libpq would find no password for it
+    pgpass(tmp_path, monkeypatch, "db.example:5432:meal_logger:meals:secret")
+    credentials = dict(CREDENTIALS)
+    assert utility.has_pgpass_entry(credentials, "meal_logger")
+    assert not utility.has_pgpass_entry(credentials, "postgres")
+    assert utility.resolve_password(credentials) == "prompted"
+
+
+def test_prompt_without_other_sources(utility):
+    assert utility.resolve_password(dict(CREDENTIALS)) == "prompted"
+
+
+def test_no_prompt_without_a_terminal(utility, monkeypatch):
+    monkeypatch.setattr(sys, "stdin", Terminal(False))
+    assert utility.resolve_password(dict(CREDENTIALS)) is None
+    monkeypatch.setattr(sys, "stdin", None)
+    assert utility.resolve_password(dict(CREDENTIALS)) is None
+
+
+def test_no_password_error_names_the_database(monkeypatch):
+    def connect(**kwargs):
+        raise psycopg2.OperationalError("fe_sendauth: no password supplied")
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    with pytest.raises(Exception, match="No password for database postgres") as error:
+        Flyway(dict(CREDENTIALS, password=None)).connect("postgres")
+    assert "db.example:5432:postgres:meals:<password>" in str(error.value)
+    assert PASSWORD_ENV in str(error.value)
+
+
+def test_other_connection_errors_are_kept(monkeypatch):
+    def connect(**kwargs):
+        raise psycopg2.OperationalError('database "meal_logger" does not exist')
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    with pytest.raises(psycopg2.OperationalError, match="does not exist"):
+        Flyway(dict(CREDENTIALS, password=None)).connect("meal_logger")
@@ -0,0 +1,34 @@
+from fdc_food_index import FdcFoodIndex
+
+FOODS = [(1, "foundation_food", "Chicken, broiler or fryers, breast, skinless, boneless, meat only, raw"),
+         (2, "foundation_food", "Chicken, broilers or fryers, thigh, meat only, cooked, roasted"),
+         (3, "foundation_food", "Broccoli, raw"),
+         (4, "branded_food", "Chicken breast strips")]
+
+
+def load_foods(db_util):
+    with db_util.transaction() as cur:
+        cur.executemany("INSERT INTO fdc_food (fdc_id, data_type, description) VALUES (%s, %s, %s);", FOODS)
+        cur.execute("INSERT INTO fdc_nutrient (id, name, unit_name, rank) VALUES (1003, 'Protein', 'G', 600);")
+        cur.execute("INSERT INTO fdc_food_nutrient VALUES (1, 1003, 22.5);")
+
+
+def test_search_matches_every_keyword(app_db):
+    load_foods(app_db)
+    foods = FdcFoodIndex(app_db).search("chicken breast")
+    assert [food["fdcId"] for food in foods] == [1]
+    assert foods[0]["foodNutrients"] == [{"nutrientName": "Protein", "unitName": "G", "value": 22.5}]
+
+
+def test_search_does_not_fall_back_to_any_keyword(app_db):
+    load_foods(app_db)
+    index = FdcFoodIndex(app_db)
+    # "chicken" alone is in two foundation foods, but neither is a chicken wing
+    assert index.search("chicken wings") == []
+    assert index.search("broccoli rabe") == []
+
+
+def test_search_branded_searches_every_data_type(app_db):
+    load_foods(app_db)
+    foods = FdcFoodIndex(app_db).search("chicken breast", food_type="branded")
+    assert sorted(food["fdcId"] for food in foods) == [1, 4]
@@ -0,0 +1,107 @@
+import os
+import shutil
+import psycopg2.extensions
+import pytest
+from flyway import Flyway, HISTORY_TABLE
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    executed = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.executed += 1
+        return super().execute(query, vars)
+
+
+def scripts(flyway, *names):
+    return [migration for migration in flyway.local_migrations() if migration["script"].split("__")[1] in names]
+
+
+def history(flyway):
+    with flyway.conn.cursor() as cur:
+        cur.execute(f"SELECT version, type FROM {HISTORY_TABLE} ORDER BY version;")
+        rows = cur.fetchall()
+    flyway.conn.rollback()
+    return rows
+
+
+def test_migrate_new_database(db_credentials, capsys):
+    flyway = Flyway(db_credentials)
+    n_migrations = len(flyway.local_migrations())
+    assert flyway.migrate() == n_migrations
+    assert history(flyway) == [(version, "SQL") for version in range(1, n_migrations + 1)]
+    flyway.close()
+    # up to date: one query on a new connection
+    flyway = Flyway(db_credentials)
+    flyway.open_app_database()
+    flyway.conn.cursor_factory = CountingCursor
+    CountingCursor.executed = 0
+    assert flyway.migrate() == 0
+    assert CountingCursor.executed == 1
+    flyway.close()
+
+
+def test_migrate_existing_database(db_credentials, capsys):
+    """
+    A database created by the table scripts before the schema history existed is baselined and brought up to date,
+    keeping its rows
+    """
+    db_credentials["baseline_version"] = "3"
+    flyway = Flyway(db_credentials)
+    flyway.open_app_database()
+    with flyway.conn.cursor() as cur:
+        for migration in scripts(flyway, "create_table_meals.sql", "create_table_ingredients.sql",
+                                 "create_table_meal_ingredient_bridge.sql"):
+            cur.execute(migration["sql"])
+        cur.execute("INSERT INTO meals (name, servings, created_at) VALUES ('Turkey Taco Bowls', '5', now()), "
+                    "('turkey  taco bowls ', '4', now()), ('Gochujang Ramen', '4', now());")
+        cur.execute("INSERT INTO ingredients (name, calories_per_unit, protein_per_unit, carbs_per_unit, "
+                    "fat_per_unit, default_unit) VALUES ('egg', 72, 6.3, 0.4, 4.8, 'egg');")
+        cur.execute("INSERT INTO meal_ingredient_bridge (meal_id, ingredient_id, quantity, unit) "
+                    "VALUES (3, 1, 2, 'egg');")
+    flyway.conn.commit()
+    n_migrations = len(flyway.local_migrations())
+    assert flyway.migrate() == n_migrations - 3
+    assert history(flyway) == [(3, "BASELINE")] + [(version, "SQL") for version in range(4, n_migrations + 1)]
+    with flyway.conn.cursor() as cur:
+        # the duplicate name is renamed before the unique name index is created
+        cur.execute("SELECT id, name FROM meals ORDER BY id;")
+        assert cur.fetchall() == [(1, "Turkey Taco Bowls"), (2, "turkey taco bowls (2)"), (3, "Gochujang Ramen")]
+        cur.execute("SELECT refresh_meal_macros();")
+        cur.execute("SELECT meal_id, total_calories FROM meal_macros ORDER BY meal_id;")
+        assert [(meal_id, float(calories)) for meal_id, calories in cur.fetchall()] == [(1, 0), (2, 0), (3, 144)]
+    flyway.conn.rollback()
+    assert "renamed" in capsys.readouterr().out.lower()
+    flyway.close()
+
+
+def test_failed_migration_applies_nothing(db_credentials, tmp_path, capsys):
+    flyway = Flyway(db_credentials)
+    flyway.migrate()
+    shutil.copytree(flyway.flyway_path, tmp_path, dirs_exist_ok=True)
+    n_migrations = len(flyway.local_migrations())
+    with open(os.path.join(tmp_path, f"V{n_migrations + 1}__good.sql"), 'w') as f:
+        f.write("CREATE TABLE good (id INT);")
+    with open(os.path.join(tmp_path, f"V{n_migrations + 2}__bad.sql"), 'w') as f:
+        f.write("SELECT * FROM no_such_table;")
+    flyway.flyway_path = str(tmp_path)
+    with pytest.raises(Exception, match="bad.sql"):
+        flyway.migrate()
+    assert history(flyway)[-1] == (n_migrations, "SQL")
+    with flyway.conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('good');")
+        assert cur.fetchone() == (None,)
+    flyway.conn.rollback()
+    flyway.close()
+
+
+def test_changed_migration_is_refused(db_credentials, tmp_path, capsys):
+    flyway = Flyway(db_credentials)
+    flyway.migrate()
+    shutil.copytree(flyway.flyway_path, tmp_path, dirs_exist_ok=True)
+    with open(os.path.join(tmp_path, "V1__create_table_meals.sql"), 'a') as f:
+        f.write("\n-- edited")
+    flyway.flyway_path = str(tmp_path)
+    with pytest.raises(Exception, match="was changed after it was applied"):
+        flyway.migrate()
+    flyway.close()
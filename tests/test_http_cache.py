@@ -0,0 +1,88 @@
+import os
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from http_cache import HttpCache
+
+
+def test_concurrent_stores_of_one_url(tmp_path):
+    cache = HttpCache(cache_dir=str(tmp_path), offline=True)
+    url = "https://fitmencook.com/recipes/turkey-taco-bowls/"
+
+    def store(i):
+        cache.store(url, {"url": url, "body": f"{i:02d}" * 50000, "headers": {}, "fetched_at": time.time()})
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(store, range(64)))
+    body = cache.get(url)
+    assert body == body[:2] * 50000
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")]
+
+
+class Response:
+    def __init__(self, status_code, text="", headers=None):
+        self.status_code, self.text, self.headers = status_code, text, headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """
+    A requests session answering with the given responses in order, recording the requests sent
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+URL = "https://fitmencook.com/recipes/turkey-taco-bowls/"
+
+
+def cache_with(tmp_path, *responses, **kwargs):
+    cache = HttpCache(cache_dir=str(tmp_path), **kwargs)
+    cache._session = StubSession(*responses)
+    return cache
+
+
+def test_fresh_entry_is_served_without_a_request(tmp_path):
+    cache = cache_with(tmp_path, Response(200, "recipe", {"ETag": '"v1"', "Server": "nginx"}))
+    assert cache.get(URL) == "recipe"
+    assert cache.get(URL) == "recipe"
+    assert cache._session.requests == [(URL, {})]
+    assert cache.load(URL)["headers"] == {"ETag": '"v1"'}
+
+
+def test_stale_entry_is_revalidated(tmp_path):
+    headers = {"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}
+    cache = cache_with(tmp_path, Response(304), ttl=60)
+    cache.store(URL, {"url": URL, "body": "recipe", "headers": headers, "fetched_at": time.time() - 120})
+    assert cache.get(URL) == "recipe"
+    assert cache._session.requests == [(URL, {"If-None-Match": '"v1"', "If-Modified-Since": headers["Last-Modified"]})]
+    entry = cache.load(URL)
+    assert entry["body"] == "recipe" and cache.is_fresh(entry)
+    # served from the cache again until the refreshed entry goes stale
+    assert cache.get(URL) == "recipe"
+    assert len(cache._session.requests) == 1
+
+
+def test_changed_page_replaces_the_entry(tmp_path):
+    cache = cache_with(tmp_path, Response(200, "new recipe", {"ETag": '"v2"'}), ttl=60)
+    cache.store(URL, {"url": URL, "body": "recipe", "headers": {"ETag": '"v1"'}, "fetched_at": time.time() - 120})
+    assert cache.get(URL) == "new recipe"
+    assert cache.load(URL)["headers"] == {"ETag": '"v2"'}
+
+
+def test_offline_serves_stale_entries_and_raises_on_a_miss(tmp_path):
+    cache = cache_with(tmp_path, offline=True, ttl=60)
+    cache.store(URL, {"url": URL, "body": "recipe", "headers": {}, "fetched_at": time.time() - 120})
+    assert cache.get(URL) == "recipe"
+    with pytest.raises(Exception, match="offline mode"):
+        cache.get(URL + "?page=2")
+    assert cache._session.requests == []
@@ -0,0 +1,59 @@
+import pytest
+from ingredient_index import IngredientIndex
+
+PANTRY = [(1, "Egg"), (2, "Egg White"), (3, "Brown Sugar"), (4, "Sugar"), (5, "Brown Rice, cooked"),
+          (6, "Brown Rice, uncooked"), (7, "Cranberries, dried"), (8, "Cranberries"), (9, "Chicken Breast"),
+          (10, "Extra Virgin Olive Oil"), (11, "Broccoli"), (12, "Sweet Potato")]
+
+
+@pytest.fixture
+def index():
+    return IngredientIndex().load(PANTRY)
+
+
+@pytest.mark.parametrize("name, ingredient_id", [
+    ("eggs", 1),
+    ("2 large egg whites", 2),
+    ("sugar", 4),
+    ("packed brown sugar", 3),
+    ("cooked brown rice", 5),
+    ("uncooked brown rice", 6),
+    ("dried cranberries", 7),
+    ("fresh cranberries", 8),
+    ("boneless skinless chicken breasts", 9),
+    ("chicken breast, diced", 9),
+    ("brocoli", 11),
+    ("sweet potatos", 12),
+    ("extra virgin olive oil", 10),
+])
+def test_resolve(index, name, ingredient_id):
+    assert index.resolve(name) == ingredient_id
+
+
+@pytest.mark.parametrize("name", [
+    "brown rice",  # cooked or uncooked is unknown
+    "frozen cranberries",  # no frozen cranberries in the pantry
+    "chicken",  # a one word name doesn't resolve to a longer ingredient
+    "rice",
+    "potato",
+    "chicken thigh",  # every word has to match
+    "olive oil spray",
+    "",
+])
+def test_unresolved(index, name):
+    assert index.resolve(name) is None
+
+
+def test_exact_match_scores_one(index):
+    assert index.match("Egg White") == (2, 1.0)
+
+
+def test_first_ingredient_with_a_name_wins():
+    index = IngredientIndex().load([(3, "oats"), (7, "Oats")])
+    assert index.resolve("oats") == 3
+
+
+def test_add_clears_resolved_names(index):
+    assert index.resolve("frozen cranberries") is None
+    index.add(13, "Frozen Cranberries")
+    assert index.resolve("frozen cranberries") == 13
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import random
+import re
+import pytest
+from ingredient_parser import IngredientParser
+from parse_cache import ParseCache
+from unit_registry import unit_registry
+
+
+def parse(line):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return IngredientParser(ParseCache(0)).parse(line)
+
+
+@pytest.mark.parametrize("line, unit, amount, name", [
+    ("2 tablespoons of frank's red hot sauce", "tablespoon", "2", "of frank's red hot sauce"),
+    ("1/2 cup of skim milk", "cup", "1/2", "of skim milk"),
+    ("2 fl oz milk", "fluid_ounce", "2", "milk"),
+    ("1 can coconut milk", "can", "1", "coconut milk"),
+    ("3 large eggs", None, "3", "large eggs"),
+    ("chicken breast – 1/2 cups", "cup", "1/2", "chicken breast"),
+])
+def test_parse(line, unit, amount, name):
+    assert parse(line) == {"unit": unit, "amount": amount, "name": name}
+
+
+def test_units_come_from_the_registry():
+    parser = IngredientParser(ParseCache(0))
+    registry = unit_registry()
+    assert {parent for _, parent in parser._unit_ranks.values()} <= set(registry.units)
+    assert parser._valid_descriptor_units is registry.descriptors
+
+
+def unit_regexes(parser):
+    """
+    The unit search the trie replaced: four regular expressions per unit alias (after a dash, surrounded by spaces,
+    in parentheses, right beside a number), in the order the aliases are tried
+    """
+    regexes = []
+    for unit in sorted(parser._unit_ranks, key=lambda u: parser._unit_ranks[u][0]):
+        escaped = re.escape(unit)
+        regexes.append((unit, [re.compile("[–]+.+(" + escaped + ')'), re.compile(r"\d*\s(" + escaped + r")\s"),
+                               re.compile(r"\(~?\d*\.?\d*\s?(" + escaped + r")\)"),
+                               re.compile(r"\d+(" + escaped + r")\s")]))
+    return regexes
+
+
+def regex_unit(parser, regexes, line):
+    for unit, formats in regexes:
+        match = next((m for m in (regex.search(line) for regex in formats) if m), None)
+        if match:
+            return parser._unit_ranks[unit][1], match.span(1), unit
+    for key, unit in parser._descriptor_units:
+        if line.endswith(unit):
+            return key, (len(line) - len(unit), len(line)), unit
+        elif line.startswith(unit):
+            return key, (0, len(unit)), unit
+    return None, (0, 0), None
+
+
+def test_trie_matches_the_regular_expressions():
+    parser = IngredientParser(ParseCache(0))
+    rng = random.Random(10)
+    aliases = list(parser._unit_ranks) + [unit for _, unit in parser._descriptor_units]
+    pieces = aliases + ["1", "2", "1/2", "1.5", "~3", " ", " ", " ", "(", ")", "–", ",", "chicken", "olive oil",
+                        "of", "cups", "large"]
+    lines = ["4 tablespoons olive oil", "1 (15oz) can black beans", "chicken breast – 1/2 cups",
+             "2 tbsp. honey", "salt to taste", "juice of 1 lime"]
+    lines += [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 8))) for _ in range(500)]
+    # a unit in each format, several units in one line
+    formats = ["{n} {u} ", "({n} {u})", "{n}{u} ", "– {n} {u}", "{u}"]
+    lines += [' '.join(rng.choice(formats).format(n=rng.choice(["1", "1/2", "2.5", ""]), u=rng.choice(aliases))
+                       + rng.choice(["rice", "olive oil", ""]) for _ in range(rng.randint(1, 3)))
+              for _ in range(500)]
+    regexes = unit_regexes(parser)
+    for line in lines:
+        assert parser.find_ingredient_unit(line) == regex_unit(parser, regexes, line), line
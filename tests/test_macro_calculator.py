@@ -0,0 +1,43 @@
+import math
+import numpy as np
+from ingredient import Ingredient, NUTRIENTS
+from macro_calculator import MacroCalculator
+
+PANTRY = [Ingredient(id=1, name="skim milk", calories_per_unit=0.34, protein_per_unit=0.034, carbs_per_unit=0.05,
+                     fat_per_unit=0.001, default_unit="g"),
+          Ingredient(id=2, name="egg", calories_per_unit=72, protein_per_unit=6.3, carbs_per_unit=0.4,
+                     fat_per_unit=4.8, default_unit="egg")]
+
+
+def test_meal_macros():
+    macros = MacroCalculator(PANTRY).meal_macros([(1, 100, "g"), (2, 3, None)], servings="2 servings")
+    assert math.isclose(macros["total_calories"], 34 + 216)
+    assert math.isclose(macros["protein_per_serving"], (3.4 + 18.9) / 2)
+    assert macros["total_fiber"] == 0
+
+
+def test_unknown_ingredients_and_units_are_left_out():
+    calculator = MacroCalculator(PANTRY)
+    macros = calculator.meal_macros([(2, 2, None), (2, 1, "tbsp"), (2, 1, "whites"), (99, 5, "g")])
+    assert macros["total_calories"] == 144
+    assert math.isnan(macros["calories_per_serving"])
+    meal_ids, totals, _, skipped = calculator.batch_macros([(10, 2, 2, "egg"), (10, 99, 5, "g"), (11, 99, 1, None),
+                                                            (11, 1, 2, "clove"), (11, 2, 250, "whites")])
+    assert meal_ids == [10, 11]
+    assert totals[:, NUTRIENTS.index("calories")].tolist() == [144, 0]
+    assert skipped.tolist() == [1, 3]
+
+
+def test_batch_macros_match_meal_macros():
+    calculator = MacroCalculator(PANTRY)
+    meals = {10: [(1, 0.5, "cup"), (2, 3, None)], 11: [(2, 1, None), (2, 2, "egg")], 12: []}
+    servings = {10: "2 servings", 11: "makes 4", 12: None}
+    bridge_rows = [(meal_id, *row) for meal_id, rows in meals.items() for row in rows]
+    meal_ids, totals, per_serving, skipped = calculator.batch_macros(bridge_rows, servings, list(meals))
+    assert meal_ids == [10, 11, 12]
+    assert skipped.tolist() == [0, 0, 0]
+    for m, meal_id in enumerate(meal_ids):
+        expected = calculator.meal_macros(meals[meal_id], servings[meal_id])
+        assert np.allclose(totals[m], [expected[f"total_{nutrient}"] for nutrient in NUTRIENTS])
+        assert np.allclose(per_serving[m], [expected[f"{nutrient}_per_serving"] for nutrient in NUTRIENTS],
+                           equal_nan=True)
@@ -0,0 +1,128 @@
+import math
+import pytest
+from ingredient import Ingredient
+from meal import Meal
+from meal_repository import MealRepository
+from unit_registry import unit_registry
+
+
+def egg():
+    return Ingredient(name="egg", calories_per_unit=72, protein_per_unit=6.3, carbs_per_unit=0.4, fat_per_unit=4.8,
+                      default_unit="egg")
+
+
+def test_inserted_meals_have_macros(app_db):
+    repository = MealRepository(app_db)
+    omelette = repository.insert_meal_graph(Meal(name="omelette", servings="2 servings"), [(egg(), 3, "egg")])
+    toast = repository.insert(Meal(name="toast"))
+    macros = repository.get_macros([omelette.id, toast.id])
+    assert float(macros[omelette.id]["total_calories"]) == 216
+    assert float(macros[omelette.id]["protein_per_serving"]) == 9.45
+    assert float(macros[toast.id]["total_calories"]) == 0
+    assert repository.refresh_macros() == 0
+
+
+def test_get_macros_only_reads(app_db):
+    repository = MealRepository(app_db)
+    omelette = repository.insert_meal_graph(Meal(name="omelette"), [(egg(), 3, "egg")])
+    with app_db.transaction() as cur:
+        cur.execute("UPDATE ingredients SET calories_per_unit = 80;")
+    assert float(repository.get_macros([omelette.id])[omelette.id]["total_calories"]) == 216
+    with app_db.transaction() as cur:
+        cur.execute("SELECT count(*) FROM meal_macros_dirty;")
+        assert cur.fetchone()[0] == 1
+    assert repository.refresh_macros() == 1
+    assert float(repository.get_macros([omelette.id])[omelette.id]["total_calories"]) == 240
+
+
+def test_recompute_all_macros_matches_refresh(app_db):
+    repository = MealRepository(app_db)
+    milk = Ingredient(name="skim milk", calories_per_unit=0.34, protein_per_unit=0.034, carbs_per_unit=0.05,
+                      fat_per_unit=0.001, default_unit="g")
+    # the cup of milk is stored in grams
+    meals = repository.insert_meal_graphs([(Meal(name="omelette", servings="2"), [(egg(), 3, "egg"),
+                                                                                  (milk, 0.5, "cup")]),
+                                           (Meal(name="custard", servings="4"), [(egg(), 2, "egg"),
+                                                                                 (milk, 200, "g")]),
+                                           (Meal(name="water"), [])])
+    omelette, custard, water = meals
+    # rows whose unit doesn't convert to the default unit of the ingredient
+    with app_db.transaction() as cur:
+        cur.execute("SELECT id FROM ingredients WHERE name = 'egg' LIMIT 1;")
+        egg_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO ingredients (name, calories_per_unit, protein_per_unit, carbs_per_unit, "
+                    "fat_per_unit, default_unit) VALUES ('garlic', 1.49, 0.06, 0.33, 0, 'g') RETURNING id;")
+        garlic_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO meal_ingredient_bridge (meal_id, ingredient_id, quantity, unit) VALUES "
+                    "(%s, %s, 2, 'clove'), (%s, %s, 250, 'whites');", (omelette.id, garlic_id, water.id, egg_id))
+    repository.refresh_macros()
+    meal_ids = [meal.id for meal in meals]
+    refreshed = repository.get_macros(meal_ids)
+    milk_grams = unit_registry().convert(0.5, "cup", "g", "skim milk")
+    assert math.isclose(float(refreshed[omelette.id]["total_calories"]), 216 + 0.34 * milk_grams)
+    assert [refreshed[meal_id]["skipped_rows"] for meal_id in meal_ids] == [1, 0, 1]
+    assert math.isclose(float(refreshed[custard.id]["total_calories"]), 144 + 68)
+    assert float(refreshed[water.id]["total_calories"]) == 0
+    assert repository.recompute_all_macros() == 3
+    recomputed = repository.get_macros(meal_ids)
+    for meal_id in meal_ids:
+        assert recomputed[meal_id]["skipped_rows"] == refreshed[meal_id]["skipped_rows"]
+        for column, value in refreshed[meal_id].items():
+            if column.startswith("total_") or column.endswith("_per_serving"):
+                assert (value is None and recomputed[meal_id][column] is None) or \
+                    math.isclose(float(value), float(recomputed[meal_id][column]), abs_tol=1e-9), column
+
+
+def test_rows_in_other_units_are_left_out(app_db):
+    repository = MealRepository(app_db)
+    omelette = repository.insert_meal_graph(Meal(name="omelette"), [(egg(), 3, "egg")])
+    with app_db.transaction() as cur:
+        cur.execute("INSERT INTO ingredients (name, calories_per_unit, protein_per_unit, carbs_per_unit, "
+                    "fat_per_unit, default_unit) VALUES ('garlic', 1.49, 0.06, 0.33, 0, 'g') RETURNING id;")
+        garlic_id = cur.fetchone()[0]
+        # two cloves of an ingredient kept in grams, as written before units were checked
+        cur.execute("INSERT INTO meal_ingredient_bridge (meal_id, ingredient_id, quantity, unit) "
+                    "VALUES (%s, %s, 2, 'clove');", (omelette.id, garlic_id))
+    assert repository.refresh_macros() == 1
+    macros = repository.get_macros([omelette.id])[omelette.id]
+    assert float(macros["total_calories"]) == 216
+    assert macros["skipped_rows"] == 1
+
+
+def test_normalize_quantity():
+    milk = Ingredient(name="skim milk", calories_per_unit=0.34, protein_per_unit=0.034, carbs_per_unit=0.05,
+                      fat_per_unit=0.001, default_unit="g")
+    assert MealRepository.normalize_quantity(egg(), 3, "egg") == (3, "egg")
+    assert MealRepository.normalize_quantity(egg(), 3, None) == (3, None)
+    assert MealRepository.normalize_quantity(milk, 100, "grams") == (100, "g")
+    quantity, unit = MealRepository.normalize_quantity(milk, 0.5, "cup")
+    assert unit == "g" and math.isclose(quantity, unit_registry().convert(0.5, "cup", "g", "skim milk"))
+    # units that don't convert keep their own unit, two units unknown to the registry aren't the same unit
+    assert MealRepository.normalize_quantity(egg(), 250, "whites") == (250, "whites")
+    assert MealRepository.normalize_quantity(egg(), 1, "tbsp") == (1, "tbsp")
+    assert MealRepository.normalize_quantity(milk, 2, "clove") == (2, "clove")
+
+
+def test_unconvertible_rows_are_reported(capsys):
+    repository = MealRepository(None)
+    egg_row = egg()
+    egg_row.id = 1
+    meal = Meal(name="omelette")
+    meal.id = 1
+    assert repository.bridge_rows([(meal, [(egg_row, 3, "egg")])]) == [(1, 1, 3, "egg")]
+    assert capsys.readouterr().out == ""
+    assert repository.bridge_rows([(meal, [(egg_row, 250, "whites")])]) == [(1, 1, 250, "whites")]
+    assert "left out of the macros" in capsys.readouterr().out
+
+
+def test_failed_insert_clears_the_ids(app_db):
+    repository = MealRepository(app_db)
+    repository.insert(Meal(name="omelette"))
+    new_egg = egg()
+    graphs = [(Meal(name="frittata"), [(new_egg, 2, "egg")]), (Meal(name="Omelette "), [(new_egg, 3, "egg")])]
+    with pytest.raises(Exception):
+        repository.insert_meal_graphs(graphs)
+    assert [meal.id for meal, _ in graphs] == [None, None] and new_egg.id is None
+    # the same graphs can be retried
+    frittata = repository.insert_meal_graphs(graphs[:1])[0]
+    assert float(repository.get_macros([frittata.id])[frittata.id]["total_calories"]) == 144
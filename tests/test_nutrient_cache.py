@@ -0,0 +1,24 @@
+from nutrient_cache import NutrientCache
+
+
+def food(description):
+    return [{"fdcId": 1, "description": description, "dataType": "Foundation", "foodNutrients": []}]
+
+
+def test_cached_result_is_served(app_db):
+    cache = NutrientCache(app_db)
+    cache.put("Olive Oil", "foundation", food("olive oil"))
+    assert cache.get("olive  oil,", "foundation") == food("olive oil")
+    assert cache.get("olive oil", "branded") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_empty_results_are_misses(app_db):
+    cache = NutrientCache(app_db)
+    cache.put("unicorn", "foundation", [])
+    assert cache.get("unicorn", "foundation") is None
+    # entries cached before empty results were skipped
+    with app_db.transaction() as cur:
+        cur.execute("INSERT INTO usda_food_cache (query, food_type, foods) VALUES ('dragon', 'foundation', '[]');")
+    assert cache.get("dragon", "foundation") is None
+
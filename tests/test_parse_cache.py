@@ -0,0 +1,32 @@
+import ingredient_parser
+import recipe_parser
+from parse_cache import ParseCache, source_version
+from unit_registry import UNITS_PATH
+
+
+def test_source_version_covers_every_file(tmp_path):
+    parser, units = tmp_path / "parser.py", tmp_path / "units.json"
+    parser.write_text("PARSER = 1\n")
+    units.write_text('{"cup": 236.6}')
+    version = source_version(str(parser), str(units))
+    assert version == source_version(str(parser), str(units))
+    assert version != source_version(str(parser))
+    units.write_text('{"cup": 240}')
+    assert version != source_version(str(parser), str(units))
+
+
+def test_parser_versions_include_the_unit_tables():
+    for module in (ingredient_parser, recipe_parser):
+        assert module.PARSER_VERSION != source_version(module.__file__)
+        assert module.PARSER_VERSION == source_version(module.__file__, *module.UNIT_SOURCES)
+        assert UNITS_PATH in module.UNIT_SOURCES
+
+
+def test_saved_cache_of_another_version_is_ignored(tmp_path):
+    path = str(tmp_path / "recipe_parser.json")
+    cache = ParseCache(path=path, version="a")
+    cache.put("1 cup rice", {"name": "rice", "amount": 1.0, "unit": "cup"})
+    cache.save()
+    assert ParseCache(path=path, version="a").get("1 cup rice") == {"name": "rice", "amount": 1.0, "unit": "cup"}
+    assert "1 cup rice" not in ParseCache(path=path, version="b")
+    assert [p.name for p in tmp_path.iterdir()] == ["recipe_parser.json"]
@@ -0,0 +1,64 @@
+import contextlib
+import io
+import json
+import os
+import pytest
+from fitmencook_search import FitMenCook
+from http_cache import HttpCache
+from meal import Meal
+from parse_cache import ParseCache
+from recipe_page import RecipePage
+from recipe_parser import RecipeParser
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+with open(os.path.join(CORPUS, "recipe_pages.json"), 'r', encoding="utf-8") as f:
+    EXPECTED = {entry["file"]: entry for entry in json.load(f)}
+
+
+def pages(file):
+    """
+    The same page twice: as downloaded, and with its JSON-LD hidden so every field comes from the soup
+    """
+    with open(os.path.join(CORPUS, "pages", file), 'r', encoding="utf-8") as f:
+        html = f.read()
+    soup_page = RecipePage(EXPECTED[file].get("url"), html)
+    soup_page._json_ld_recipes = []
+    return RecipePage(EXPECTED[file].get("url"), html), soup_page
+
+
+def lines(parser, page):
+    return [line for _, line, _ in parser.extract_ingredients_from_page(page)]
+
+
+@pytest.mark.parametrize("file", ["fmc_gochujang_ramen.html", "wprm_sheet_pan_salmon.html"])
+def test_json_ld_ingredients_without_soup(file):
+    page, soup_page = pages(file)
+    parser = RecipeParser(parse_cache=ParseCache(0))
+    json_ld_lines = lines(parser, page)
+    assert page._soup is None
+    assert json_ld_lines == EXPECTED[file]["ingredients"]
+    # the soup finds the same ingredients, among the headings and split up lines around them
+    assert set(json_ld_lines) <= set(lines(parser, soup_page))
+
+
+@pytest.mark.parametrize("file", ["blog_overnight_oats.html", "fmc_turkey_taco_bowls.html"])
+def test_pages_without_json_ld_use_the_soup(file):
+    page, soup_page = pages(file)
+    parser = RecipeParser(parse_cache=ParseCache(0))
+    assert lines(parser, page) == lines(parser, soup_page)
+    assert page._soup is not None
+
+
+@pytest.mark.parametrize("file", ["fmc_gochujang_ramen.html", "fmc_turkey_taco_bowls.html"])
+def test_recipe_fields_match_the_soup(file, tmp_path):
+    fields = []
+    for page in pages(file):
+        meal = Meal(name=EXPECTED[file]["title"])
+        search = FitMenCook(meal, http_cache=HttpCache(cache_dir=str(tmp_path), offline=True))
+        with contextlib.redirect_stdout(io.StringIO()):
+            search.extract_recipe(meal, page)
+            fields.append((search.get_recipe_title(page), meal.description, meal.servings, meal.serving_size,
+                           meal.serving_unit))
+    expected = EXPECTED[file]
+    assert fields[0] == fields[1] == (expected["title"], expected["description"], expected["servings"],
+                                      expected["serving_size"], expected["serving_unit"])
@@ -0,0 +1,39 @@
+import json
+import os
+import random
+from parse_cache import ParseCache
+from recipe_parser import RecipeParser
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus")
+
+
+def corpus_lines():
+    with open(os.path.join(CORPUS, "ingredient_lines.json"), 'r', encoding="utf-8") as f:
+        lines = [entry["line"] for entry in json.load(f)]
+    with open(os.path.join(CORPUS, "recipe_pages.json"), 'r', encoding="utf-8") as f:
+        lines += [line for page in json.load(f) for line in page["ingredients"]]
+    return lines
+
+
+def test_parse_many_matches_parse_ingredient_line():
+    lines = corpus_lines()
+    # repeated lines, blank lines and the same line with other surrounding whitespace
+    batch = lines + lines[:10] + ["", "   ", None] + [f"  {line}\t" for line in lines[10:20]]
+    random.Random(16).shuffle(batch)
+    expected = [RecipeParser(parse_cache=ParseCache(0)).parse_ingredient_line(line) for line in batch]
+    parsed = RecipeParser(parse_cache=ParseCache()).parse_many(batch)
+    assert len(parsed) == len(batch)
+    assert parsed.rows() == expected
+    for i, row in enumerate(expected):
+        if row is not None:
+            assert parsed.name(i) == row["name"]
+            assert parsed.unit(i) == row["unit"]
+
+
+def test_parse_many_with_cached_lines():
+    lines = corpus_lines()
+    parser = RecipeParser(parse_cache=ParseCache())
+    expected = [parser.parse_ingredient_line(line) for line in lines[::2]]
+    # half the lines come from the cache, the other half are parsed by the batch
+    assert parser.parse_many(lines).rows() == [parser.parse_ingredient_line(line) for line in lines]
+    assert parser.parse_many(lines[::2]).rows() == expected
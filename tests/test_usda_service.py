@@ -0,0 +1,116 @@
+import asyncio
+import time
+import pytest
+from nutrient_cache import NutrientCache
+from usda_service import AsyncUSDAService, USDAService
+
+
+class StubUSDAService(AsyncUSDAService):
+    """
+    An AsyncUSDAService whose API calls are served by a function instead of the network
+    """
+
+    def __init__(self, respond, **kwargs):
+        self.respond = respond
+        self.api_key = "key"
+        self.nutrient_cache = self.food_index = None
+        self.max_concurrency = kwargs.get("max_concurrency", 8)
+        self.max_retries = kwargs.get("max_retries", 5)
+        self.backoff = kwargs.get("backoff", 0.01)
+        self.base_url, self.food_search_endpoint = "", ""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def fetch_foods(self, food_keywords, food_type):
+        return await self.respond(self, food_keywords)
+
+
+def food(description):
+    return [{"fdcId": 1, "description": description, "dataType": "Foundation", "foodNutrients": []}]
+
+
+def test_search_food_keeps_the_sync_api():
+    assert not asyncio.iscoroutinefunction(AsyncUSDAService.search_food)
+    assert AsyncUSDAService.search_food is USDAService.search_food
+
+
+def test_one_failed_query_doesnt_fail_the_others():
+    async def respond(service, keywords):
+        if keywords == "unicorn":
+            return []  # no results
+        if keywords == "timeout":
+            raise asyncio.TimeoutError()
+        return food(keywords)
+
+    service = StubUSDAService(respond)
+    results = asyncio.run(service.search_foods([("egg", "foundation"), ("unicorn", "foundation"),
+                                                ("timeout", "foundation"), ("milk", "foundation")]))
+    assert results == [{"egg": []}, None, None, {"milk": []}]
+
+
+def test_local_lookups_run_off_the_event_loop():
+    class SlowIndex:
+        def search(self, keywords, food_type):
+            time.sleep(0.2)  # a blocking psycopg2 query
+            return food(keywords)
+
+    async def respond(service, keywords):
+        raise AssertionError("the API isn't called for foods in the index")
+
+    service = StubUSDAService(respond)
+    service.food_index = SlowIndex()
+    start = time.perf_counter()
+    results = asyncio.run(service.search_foods([(f"food {i}", "foundation") for i in range(4)]))
+    assert time.perf_counter() - start < 0.6
+    assert results == [{f"food {i}": []} for i in range(4)]
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status, self.headers = status, {}
+
+    async def json(self):
+        return {"foods": food("egg")}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def test_backoff_releases_the_request_slot():
+    service = StubUSDAService(None, max_concurrency=1, backoff=0.2)
+    statuses = {"rate limited": [429, 200], "egg": [200]}
+    order = []
+
+    class Session:
+        def get(self, url, params):
+            order.append(params["query"])
+            return FakeResponse(statuses[params["query"]].pop(0))
+
+    service._session = Session()
+
+    async def run():
+        return await asyncio.gather(AsyncUSDAService.fetch_foods(service, "rate limited", "branded"),
+                                    AsyncUSDAService.fetch_foods(service, "egg", "branded"))
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    # the egg request went out while the rate limited one was backing off, not after it
+    assert order == ["rate limited", "egg", "rate limited"]
+    assert results[0] == results[1] == food("egg")
+    assert time.perf_counter() - start == pytest.approx(0.2, abs=0.15)
+
+
+def test_empty_result_is_searched_again(app_db):
+    responses = {"unicorn": [[], food("unicorn")]}
+
+    async def respond(service, keywords):
+        return responses[keywords].pop(0)
+
+    service = StubUSDAService(respond)
+    service.nutrient_cache = NutrientCache(app_db)
+    assert asyncio.run(service.search_foods([("unicorn", "foundation")])) == [None]
+    assert asyncio.run(service.search_foods([("unicorn", "foundation")])) == [{"unicorn": []}]
+    assert asyncio.run(service.search_foods([("unicorn", "foundation")])) == [{"unicorn": []}]
+    assert responses["unicorn"] == []
@@ -0,0 +1,180 @@
+from array import array
+import json
+import math
+import os
+import re
+import threading
+
+UNITS_PATH = os.path.join(os.path.dirname(__file__), "units", "canonical_units.json")
+# the files the registry is built from, part of the version of the parsers using it (see parse_cache.source_version)
+UNIT_SOURCES = [os.path.abspath(__file__), UNITS_PATH]
+# dimensions the conversion matrix covers; count units (clove, can, ...) have no fixed size
+CONVERTIBLE_DIMENSIONS = ["mass", "volume"]
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class UnitRegistry:
+    """
+    The canonical units, their aliases and the conversions between them, loaded from units/canonical_units.json
+    Every mass and volume unit gets an index in a dense conversion matrix, where matrix[i][j] is the number of
+    unit j in one unit i (NaN across dimensions), so converting a quantity is one lookup and one multiplication
+    Volume is converted to mass with the density (g/ml) of the ingredient, falling back to the default density
+    The table also holds the descriptor phrases ("to taste", "juice of", ...) that stand in for a unit in a line
+    """
+
+    def __init__(self, path=UNITS_PATH):
+        """
+        Load the unit table and precompute the conversion matrix
+        :param path: the canonical unit json file
+        """
+        with open(path, 'r', encoding="utf-8") as f:
+            table = json.load(f)
+        self.base_units = table["base_units"]
+        self.default_density = table["default_density"]
+        self.units = list(table["units"])
+        self.dimensions = {unit: spec["dimension"] for unit, spec in table["units"].items()}
+        # canonical unit -> its aliases, in the order of the table
+        self.unit_aliases = {unit: spec["aliases"] for unit, spec in table["units"].items()}
+        # descriptor -> the phrases of it, e.g. juice from -> [juice from, juice of, ...]
+        self.descriptors = table.get("descriptors", {})
+        # alias -> canonical unit, exactly as written ("T" is a tablespoon, "t" a teaspoon)
+        self.aliases = {}
+        # lowercase alias -> canonical unit, for tokens whose case is lost; an all-lowercase alias wins
+        self.lower_aliases = {}
+        for unit, spec in table["units"].items():
+            for alias in [unit] + spec["aliases"]:
+                self.aliases.setdefault(alias, unit)
+                if alias == alias.lower() or alias.lower() not in self.lower_aliases:
+                    self.lower_aliases[alias.lower()] = unit
+        for unit in self.units:
+            self.lower_aliases.setdefault(unit.lower(), unit)
+        self.densities = {self.normalize_name(name): density for name, density in table["densities"].items()}
+        # the conversion matrix, over the mass and volume units only
+        self.matrix_units = [unit for unit in self.units if self.dimensions[unit] in CONVERTIBLE_DIMENSIONS]
+        self.unit_index = {unit: i for i, unit in enumerate(self.matrix_units)}
+        to_base = [table["units"][unit]["to_base"] for unit in self.matrix_units]
+        self.matrix = []
+        for i, unit in enumerate(self.matrix_units):
+            row = array('d', [math.nan]) * len(self.matrix_units)
+            for j, other in enumerate(self.matrix_units):
+                if self.dimensions[unit] == self.dimensions[other]:
+                    row[j] = to_base[i] / to_base[j]
+            self.matrix.append(row)
+        # grams (mass units) or milliliters (volume units) in one unit, the matrix column of the base unit
+        self.to_base = array('d', to_base)
+        # density per ingredient name, filled in as names are looked up
+        self._density_cache = {}
+
+    @staticmethod
+    def normalize_name(name):
+        """
+        Normalize an ingredient name for the density lookup (lowercase, single spaces, letters only)
+        """
+        return ' '.join(re.sub(r'[^a-z ]+', ' ', name.lower()).split())
+
+    def canonical(self, unit):
+        """
+        Get the canonical name of a unit
+        :param unit: a canonical unit or any alias of one (e.g. tbsp, fl. oz)
+        :return: the canonical unit (str), None if the unit is unknown
+        """
+        if not unit:
+            return None
+        unit = unit.strip()
+        if unit in self.aliases:
+            return self.aliases[unit]
+        return self.lower_aliases.get(unit.lower())
+
+    def same_unit(self, unit, other):
+        """
+        Check whether two unit names are the same unit: the same canonical unit, or the same name for units the
+        registry doesn't know (e.g. egg)
+        """
+        canonical = self.canonical(unit)
+        if canonical is not None:
+            return canonical == self.canonical(other)
+        return unit == other
+
+    def dimension(self, unit):
+        """
+        Get the dimension of a unit: mass, volume or count (None if the unit is unknown)
+        """
+        return self.dimensions.get(self.canonical(unit))
+
+    def density(self, ingredient_name=None):
+        """
+        Get the density of an ingredient in g/ml, matching the longest known name ending its name
+          e.g. "extra virgin olive oil" uses the density of "olive oil"
+        :param ingredient_name: the name of the ingredient (None for the default density)
+        :return: the density (float)
+        """
+        if not ingredient_name:
+            return self.default_density
+        if ingredient_name not in self._density_cache:
+            words = self.normalize_name(ingredient_name).split()
+            density = self.default_density
+            for start in range(len(words)):
+                name = ' '.join(words[start:])
+                if name in self.densities:
+                    density = self.densities[name]
+                    break
+            self._density_cache[ingredient_name] = density
+        return self._density_cache[ingredient_name]
+
+    def factor(self, from_unit, to_unit, ingredient_name=None):
+        """
+        Get the number of to_unit in one from_unit
+        :param from_unit: the unit converted from (canonical or alias)
+        :param to_unit: the unit converted to (canonical or alias)
+        :param ingredient_name: the ingredient, whose density converts between volume and mass
+        :return: the conversion factor (float), None if the units can't be converted
+        """
+        i = self.unit_index.get(self.canonical(from_unit))
+        j = self.unit_index.get(self.canonical(to_unit))
+        if i is None or j is None:
+            return None
+        factor = self.matrix[i][j]
+        if not math.isnan(factor):
+            return factor
+        # across dimensions: go through the base units (grams and milliliters) with the density
+        density = self.density(ingredient_name)
+        if self.dimensions[self.matrix_units[i]] == "volume":
+            return self.to_base[i] * density / self.to_base[j]
+        return self.to_base[i] / density / self.to_base[j]
+
+    def convert(self, amount, from_unit, to_unit, ingredient_name=None):
+        """
+        Convert a quantity between units
+        :param amount: the quantity (number)
+        :param from_unit: the unit of the quantity
+        :param to_unit: the unit to convert to
+        :param ingredient_name: the ingredient, whose density converts between volume and mass
+        :return: the converted quantity (float), None if the units can't be converted
+        """
+        factor = self.factor(from_unit, to_unit, ingredient_name)
+        if factor is None or amount is None:
+            return None
+        return float(amount) * factor
+
+    def to_grams(self, amount, unit, ingredient_name=None):
+        """
+        Convert a quantity to grams
+        :param amount: the quantity (number)
+        :param unit: the unit of the quantity
+        :param ingredient_name: the ingredient, whose density converts volumes
+        :return: the quantity in grams (float), None if the unit is a count or unknown
+        """
+        return self.convert(amount, unit, self.base_units["mass"], ingredient_name)
+
+
+def unit_registry():
+    """
+    Get the unit registry of the process, loading it the first time
+    :return: the shared UnitRegistry
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UnitRegistry()
+        return _registry
@@ -1,4 +1,6 @@
+import asyncio
 import json
+import aiohttp
 import requests
 
 
@@ -7,13 +9,21 @@ class USDAService:
     Any operations that interact with the USDA API
     """
 
-    def __init__(self):
+    def __init__(self, nutrient_cache=None, food_index=None):
         """
         Initialize
+        :param nutrient_cache: the NutrientCache to check before calling the API (None to always call it)
+        :param food_index: the FdcFoodIndex of locally imported foods, searched before anything else
         """
+        self.nutrient_cache = nutrient_cache
+        self.food_index = food_index
         self.api_key = json.load(open("api_keys.json", 'r'))["usda"]
         self.base_url = "https://api.nal.usda.gov/fdc/v1"
         self.food_search_endpoint = "/foods/search"
+        self.keys_to_remove = ["nutrientId", "nutrientNumber", "derivationCode", "derivationDescription",
+                               "derivationId", "foodNutrientSourceId", "foodNutrientSourceCode",
+                               "foodNutrientSourceDescription", "rank", "indentLevel", "foodNutrientId",
+                               "dataPoints", "min", "max", "median"]
 
     def search_food(self, food_keywords: str, food_type: str="foundation"):
         """
@@ -23,28 +33,164 @@ class USDAService:
         :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
         :return: list of nutrients in food
         """
-        food_keywords = food_keywords.replace(' ', "%20")
+        foods = self.cached_foods(food_keywords, food_type)
+        if foods is None:
+            r = requests.get(self.base_url + self.food_search_endpoint,
+                             params=self.search_params(food_keywords, food_type))
+            if r.status_code != 200:
+                raise Exception(f"Couldn't get food search response for \"{food_keywords}\"")
+            foods = self.trim_foods(r.json())
+            if self.nutrient_cache:
+                self.nutrient_cache.put(food_keywords, food_type, foods)
+        return self.first_food_nutrients(foods)
+
+    def cached_foods(self, food_keywords: str, food_type: str):
+        """
+        Look for the search result locally, in the imported food index first and then the nutrient cache
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: list of trimmed foods, None if the API has to be called
+        """
+        if self.food_index:
+            foods = self.food_index.search(food_keywords, food_type)
+            if foods:
+                return foods
+        if self.nutrient_cache:
+            return self.nutrient_cache.get(food_keywords, food_type)
+        return None
+
+    def search_params(self, food_keywords: str, food_type: str):
+        """
+        Build the query parameters of a food search
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: dictionary of query parameters
+        """
         if food_type == "branded":
-            url = f"{self.base_url}{self.food_search_endpoint}?query={food_keywords}&api_key={self.api_key}"
+            return {"query": food_keywords, "api_key": self.api_key}
         elif food_type == "foundation":
-            url = f"{self.base_url}{self.food_search_endpoint}?query={food_keywords}&dataType=Foundation&api_key={self.api_key}"
-        else:
-            raise Exception(f"Invalid food type: {food_type} not in [branded, foundation]")
-        r = requests.get(url)
-        if r.status_code != 200:
-            raise Exception(f"Couldn't get food search response for \"{food_keywords}\"")
-        r = r.json()
-        food_info = r["foods"][0]
-        nutrients = food_info["foodNutrients"]
-        keys_to_remove = ["nutrientId", "nutrientNumber", "derivationCode", "derivationDescription", "derivationId",
-                          "foodNutrientSourceId", "foodNutrientSourceCode", "foodNutrientSourceDescription", "rank",
-                          "indentLevel", "foodNutrientId", "dataPoints", "min", "max", "median"]
-        for nut in nutrients:
-            for key in keys_to_remove:
-                nut.pop(key, None)
-        return {food_info["description"]: nutrients}
+            return {"query": food_keywords, "dataType": "Foundation", "api_key": self.api_key}
+        raise Exception(f"Invalid food type: {food_type} not in [branded, foundation]")
+
+    def trim_foods(self, response: dict):
+        """
+        Pull every food out of a food search response, dropping the fields we don't use
+        :param response: the json food search response
+        :return: list of foods (dicts of fdcId, description, dataType, foodNutrients)
+        """
+        foods = []
+        for food_info in response["foods"]:
+            nutrients = food_info["foodNutrients"]
+            for nut in nutrients:
+                for key in self.keys_to_remove:
+                    nut.pop(key, None)
+            foods.append({"fdcId": food_info.get("fdcId"), "description": food_info["description"],
+                          "dataType": food_info.get("dataType"), "foodNutrients": nutrients})
+        return foods
+
+    def first_food_nutrients(self, foods: list):
+        """
+        For now, we'll just pull the first result
+        :param foods: list of trimmed foods
+        :return: {food description: list of nutrients}
+        """
+        if not foods:
+            raise IndexError("Food search returned no results")
+        return {foods[0]["description"]: foods[0]["foodNutrients"]}
+
+
+class AsyncUSDAService(USDAService):
+    """
+    Asynchronous USDA API client, so all of a meal's ingredients can be looked up concurrently
+    Uses one connection-pooled session, caps the number of requests in flight, and retries with
+    exponential backoff when the API rate limits us (429) or has a server error (5xx)
+    Use as an async context manager: async with AsyncUSDAService() as usda: ...
+    """
+
+    def __init__(self, nutrient_cache=None, food_index=None, max_concurrency=8, max_retries=5, backoff=1.0,
+                 timeout=30):
+        """
+        Initialize
+        :param nutrient_cache: the NutrientCache to check before calling the API (None to always call it)
+        :param food_index: the FdcFoodIndex of locally imported foods, searched before anything else
+        :param max_concurrency: maximum number of requests in flight at once
+        :param max_retries: number of times a rate limited / failed request is retried
+        :param backoff: seconds to wait before the first retry, doubled on each retry after that
+        :param timeout: seconds a request may take before it is retried
+        """
+        super().__init__(nutrient_cache, food_index)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def search_food_async(self, food_keywords: str, food_type: str="foundation"):
+        """
+        Search for food nutrient information by keyword(s) provided, pulling the first result (the coroutine
+            version of search_food)
+        The local lookups (psycopg2) run in a worker thread so they don't block the other requests
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: list of nutrients in food
+        """
+        foods = await asyncio.to_thread(self.cached_foods, food_keywords, food_type)
+        if foods is None:
+            foods = await self.fetch_foods(food_keywords, food_type)
+            if self.nutrient_cache:
+                await asyncio.to_thread(self.nutrient_cache.put, food_keywords, food_type, foods)
+        return self.first_food_nutrients(foods)
+
+    async def fetch_foods(self, food_keywords: str, food_type: str):
+        """
+        Call the food search endpoint, retrying on rate limits, server errors and timeouts
+        A request only holds its slot of max_concurrency while it is in flight, not while it backs off
+        :param food_keywords: the keywords to search for food in USDA database
+        :param food_type: foundation (cheddar cheese) vs. branded (kraft cheddar)
+        :return: list of trimmed foods
+        """
+        params = self.search_params(food_keywords, food_type)
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2 ** attempt
+            async with self._semaphore:
+                try:
+                    async with self._session.get(self.base_url + self.food_search_endpoint, params=params) as r:
+                        if r.status == 200:
+                            return self.trim_foods(await r.json())
+                        if r.status != 429 and r.status < 500:
+                            break
+                        if r.headers.get("Retry-After", "").isdigit():
+                            delay = max(delay, int(r.headers["Retry-After"]))
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        raise Exception(f"Couldn't get food search response for \"{food_keywords}\"")
+
+    async def search_foods(self, queries):
+        """
+        Look up several foods concurrently; a query that fails (no results, API errors) doesn't stop the others
+        :param queries: list of (food keywords, food type) tuples
+        :return: list of search_food results, in the same order as the queries (None for the failed queries)
+        """
+        results = await asyncio.gather(
+            *(self.search_food_async(keywords, food_type) for keywords, food_type in queries), return_exceptions=True)
+        for (keywords, _), result in zip(queries, results):
+            if isinstance(result, Exception):
+                print(f"Couldn't look up \"{keywords}\": {result}")
+        return [None if isinstance(result, Exception) else result for result in results]
 
 if __name__ == "__main__":
     usda_service = USDAService()
     nut = usda_service.search_food("kraft shredded cheese", "branded")
-    print(nut)
\ No newline at end of file
+    print(nut)
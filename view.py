@@ -1,11 +1,10 @@
-from ingredient_editor import IngredientEditor
-from PyQt6.QtWidgets import QApplication
 import sys
 
 
 class View:
     """
     The "view" of the Model View Controller (MVC) paradigm
+    PyQt6 is imported when the ingredient editor is first shown, so asking for a meal starts without it
     """
 
     def __init__(self):
@@ -27,6 +26,8 @@ class View:
         :param ingredients_list: list of ingredients found by the web scraper
         :return: the edited list of ingredients
         """
+        from PyQt6.QtWidgets import QApplication
+        from ingredient_editor import IngredientEditor
         app = QApplication(sys.argv)
         window = IngredientEditor(ingredients_list)
         window.bring_to_front()